@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+'''
+Compares the procfs and psutil capture backends on a synthetic fake /proc tree.
+
+usage:
+python benchmarks/bench_capture.py [num_processes] [repeat]
+'''
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import psutil
+from capture import ProcfsBackend, PsutilBackend
+from tests.proc_helper import build_proc
+
+ATTRS = ['pid', 'ppid', 'username', 'name', 'cmdline']
+
+
+def build_fake_proc(root: Path, count: int):
+    '''Write a /proc look-alike with stat, status and cmdline files for count processes.'''
+    (root / "stat").write_text("cpu  0 0 0 0 0 0 0 0 0 0\nbtime 1700000000\n")
+    uid = os.getuid()
+    for pid in range(1, count + 1):
+        ppid = 0 if pid == 1 else max(1, pid // 8)
+        name = f"worker-{pid % 50}"
+        build_proc(root, pid, ppid, name, f"/usr/bin/{name}\0--id\0{pid}\0--config\0/etc/app/{pid}.conf\0".encode(),
+                   uid=uid, rss_kb=1024, threads=1,
+                   stat=f"{pid} ({name}) S {ppid} {pid} {pid} 0 -1 4194560 0 0 0 0 1 1 0 0 20 0 1 0 {pid} 0 0" + " 0" * 30 + "\n")
+
+
+def bench(label, func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in func())
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<8} {count:>8} procs  best of {repeat}: {best * 1000:9.1f} ms")
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        build_fake_proc(root, count)
+        psutil.PROCFS_PATH = str(root)
+        procfs = bench("procfs", lambda: ProcfsBackend(str(root)).process_iter(ATTRS), repeat)
+        ps = bench("psutil", lambda: PsutilBackend().process_iter(ATTRS), repeat)
+    print(f"speedup: {ps / procfs:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
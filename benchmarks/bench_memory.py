@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+'''
+Memory used by a loaded snapshot pair and by diffing it: Process records against per-row dicts
+with their own username/name strings (the row layout before records).
+
+usage:
+python benchmarks/bench_memory.py [num_processes] [churn]
+'''
+import gc
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from synth import generate_series
+from psdiff import Psdiff
+
+
+def _own_strings(value):
+    '''A private copy of a string, like every parsed row used to have.'''
+    return (value + ".")[:-1] if isinstance(value, str) else value
+
+
+def measure(build, diff):
+    '''(MB held by build(), MB peak above that while diff(rows) runs, seconds for build and diff).'''
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = build()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    diff(rows)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - held
+    tracemalloc.stop()
+    return held / 2**20, peak / 2**20, seconds
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    churn = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    with tempfile.TemporaryDirectory() as tmp:
+        for snapshot_format in ('text', 'binary'):
+            psdiff = Psdiff(Path(tmp), f'.psdiff-{snapshot_format}', 'ps', snapshot_format=snapshot_format)
+            for ps_list in generate_series(count, 2, churn): psdiff._Psdiff__save_snapshot(ps_list)
+            load, get_diff = psdiff._Psdiff__load_saved_snapshot, psdiff._Psdiff__get_diff
+
+            def _records(): return [list(load(0)), list(load(1))]
+            def _dicts(): return [[{key: _own_strings(value) for key, value in proc.items()} for proc in load(num)] for num in (0, 1)]
+            def _diff(pair): return sum(1 for _ in get_diff(*pair))
+
+            for label, build in (('records', _records), ('dicts', _dicts)):
+                held, peak, seconds = measure(build, _diff)
+                print(f"{count:>8} procs {snapshot_format:<7} {label:<8} pair held {held:8.1f} MB   "
+                      f"diff peak +{peak:6.1f} MB   load+diff {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+'''
+Offline benchmark suite for every psdiff pipeline stage, on synthetic data.
+
+stages: capture (fake backend), write (text/binary), read (text/binary), diff and render.
+
+usage:
+python benchmarks/run.py --sizes 1000,10000,100000 --output baseline.json
+python benchmarks/run.py --sizes 1000,10000,100000 --compare baseline.json --threshold 0.25
+'''
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from synth import FakeBackend, generate_series
+from psdiff import Psdiff
+
+
+def _best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_size(size, churn=0.01, cmdline_len=80, repeat=3):
+    '''Time each stage for one process count. Returns {stage: seconds}.'''
+    old, new = generate_series(size, 2, churn, cmdline_len)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        psdiff = Psdiff(Path(tmp), '.psdiff', 'ps', backend=FakeBackend(new))
+        text_path, binary_path = Path(tmp) / 'text', Path(tmp) / 'binary'
+        write = psdiff._Psdiff__write_snapshot_to_file
+        read = psdiff._Psdiff__read_snapshot_from_file
+
+        results['capture'] = _best_of(lambda: psdiff._Psdiff__create_ps_snapshot(), repeat)
+        results['write_text'] = _best_of(lambda: write(old, text_path, 'text'), repeat)
+        results['write_binary'] = _best_of(lambda: write(old, binary_path, 'binary'), repeat)
+        results['read_text'] = _best_of(lambda: read(text_path), repeat)
+        results['read_binary'] = _best_of(lambda: list(read(binary_path)), repeat)
+        results['diff'] = _best_of(lambda: list(psdiff._Psdiff__get_diff(old, new)), repeat)
+        entries = list(psdiff._Psdiff__get_diff(old, new))
+        for output_format in ('text', 'ndjson'):
+            psdiff.output_format = output_format
+            def _render():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    psdiff._Psdiff__write_lines(psdiff._Psdiff__render_snapshot(new))
+                    psdiff._Psdiff__write_lines(psdiff._Psdiff__render_diff(entries))
+            results[f'render_{output_format}'] = _best_of(_render, repeat)
+    return results
+
+
+def run(sizes, churn=0.01, cmdline_len=80, repeat=3):
+    '''Run every stage for every size. Returns the baseline document.'''
+    results = {}
+    for size in sizes:
+        results[str(size)] = bench_size(size, churn, cmdline_len, repeat)
+        for stage, seconds in results[str(size)].items(): print(f"{size:>8} {stage:<14} {seconds * 1000:10.2f} ms")
+    return {'python': platform.python_version(), 'churn': churn, 'cmdline_len': cmdline_len, 'results': results}
+
+
+def compare(baseline, current, threshold=0.25):
+    '''Return [(size, stage, baseline seconds, current seconds)] for stages slower than baseline * (1 + threshold).'''
+    regressions = []
+    for size, stages in current['results'].items():
+        for stage, seconds in stages.items():
+            before = baseline['results'].get(size, {}).get(stage)
+            if before is not None and seconds > before * (1 + threshold):
+                regressions.append((size, stage, before, seconds))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="psdiff benchmark suite")
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Comma separated process counts (up to 1000000)')
+    parser.add_argument('--churn', type=float, default=0.01, help='Fraction of processes replaced/changed between snapshots')
+    parser.add_argument('--cmdline-len', type=int, default=80, help='Minimum length of non-empty cmdlines')
+    parser.add_argument('--repeat', type=int, default=3, help='Best of N runs per stage')
+    parser.add_argument('--output', help='Write results to this JSON baseline file')
+    parser.add_argument('--compare', help='Compare with this JSON baseline file and exit 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown before a stage is flagged')
+    args = parser.parse_args()
+
+    current = run([int(size) for size in args.sizes.split(',')], args.churn, args.cmdline_len, args.repeat)
+    if args.output:
+        Path(args.output).write_text(json.dumps(current, indent=2) + "\n")
+    if args.compare:
+        regressions = compare(json.loads(Path(args.compare).read_text()), current, args.threshold)
+        for size, stage, before, after in regressions:
+            print(f"REGRESSION {size:>8} {stage:<14} {before * 1000:.2f} ms -> {after * 1000:.2f} ms ({after / before - 1:+.0%})")
+        if regressions: sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
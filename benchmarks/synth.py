@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+'''
+Synthetic process lists for benchmarks: realistic looking process trees, snapshot series with
+configurable churn and cmdline length, ps.N files and a fake capture backend.
+'''
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+USERS = ['root'] * 6 + ['www-data', 'postgres', 'systemd-resolve', 'messagebus', 'alice', 'bob']
+PROGRAMS = [
+    ('kworker/{n}:1', '', 'root'),
+    ('nginx', 'nginx: worker process', 'www-data'),
+    ('postgres', 'postgres: {user} {db} 10.0.{a}.{b}({port}) idle', 'postgres'),
+    ('python3', '/usr/bin/python3 -m gunicorn app.wsgi:application --workers 8 --bind 0.0.0.0:{port}', 'www-data'),
+    ('java', '/usr/lib/jvm/java-17/bin/java -Xms{mem}m -Xmx{mem}m -cp {classpath} com.example.Main', 'alice'),
+    ('bash', '-bash', 'bob'),
+    ('sshd', 'sshd: {user}@pts/{n}', 'root'),
+    ('containerd-shim', '/usr/bin/containerd-shim-runc-v2 -namespace moby -id {hex} -address /run/containerd/containerd.sock', 'root'),
+]
+
+
+def generate_process(pid, rand, ppids, cmdline_len=80):
+    '''One synthetic process dict in the snapshot format. Non-empty cmdlines are padded to cmdline_len.'''
+    name, cmdline, user = rand.choice(PROGRAMS)
+    fields = {'n': rand.randrange(64), 'user': rand.choice(USERS), 'db': f"db{rand.randrange(20)}",
+              'a': rand.randrange(256), 'b': rand.randrange(256), 'port': rand.randrange(1024, 65535),
+              'mem': rand.choice([512, 1024, 4096]), 'hex': f"{rand.getrandbits(128):032x}",
+              'classpath': ":".join(f"/opt/app/lib/dep{i}.jar" for i in range(rand.randrange(1, 40)))}
+    cmdline = cmdline.format(**fields)
+    if cmdline and len(cmdline) < cmdline_len: cmdline += " --opt=" + "x" * (cmdline_len - len(cmdline))
+    return {'pid': pid, 'ppid': rand.choice(ppids) if ppids else 0, 'username': user,
+            'name': name.format(**fields), 'cmdline': cmdline}
+
+
+def generate_processes(count, cmdline_len=80, seed=0):
+    '''A pid sorted list of count synthetic processes forming a shallow process tree.'''
+    rand = random.Random(seed)
+    ps_list = []
+    ppids = [1]
+    for pid in range(1, count + 1):
+        ps_list.append(generate_process(pid, rand, ppids if pid > 1 else [], cmdline_len))
+        if rand.random() < 0.05: ppids.append(pid)
+    return ps_list
+
+
+def generate_series(count, snapshots, churn=0.01, cmdline_len=80, seed=0):
+    '''
+    A list of snapshots (pid sorted process lists) where each one replaces, adds and changes about
+    churn * count processes of the previous one.
+    '''
+    rand = random.Random(seed)
+    procs = {proc['pid']: proc for proc in generate_processes(count, cmdline_len, seed)}
+    next_pid = count + 1
+    series = [[procs[pid] for pid in sorted(procs)]]
+    for _ in range(snapshots - 1):
+        changes = max(1, int(count * churn))
+        for pid in rand.sample(sorted(procs), min(changes, len(procs))): del procs[pid]
+        parents = sorted(procs)[:max(1, len(procs) // 20)]
+        for _ in range(changes):
+            procs[next_pid] = generate_process(next_pid, rand, parents, cmdline_len)
+            next_pid += 1
+        for pid in rand.sample(sorted(procs), min(changes, len(procs))):
+            procs[pid] = dict(procs[pid], cmdline=procs[pid]['cmdline'] + " --reloaded")
+        series.append([procs[pid] for pid in sorted(procs)])
+    return series
+
+
+def write_snapshot_files(psdiff, series):
+    '''Save a series as ps.0 .. ps.N through Psdiff's snapshot path. Returns the written paths.'''
+    return [psdiff._Psdiff__save_snapshot(ps_list) for ps_list in series]
+
+
+class FakeBackend():
+    '''Capture backend that replays synthetic processes as proc.info dicts (cmdline as an argv list).'''
+    name = 'fake'
+
+    def __init__(self, ps_list):
+        self.infos = {proc['pid']: {'pid': proc['pid'], 'ppid': proc['ppid'], 'username': proc['username'],
+                                    'name': proc['name'], 'cmdline': proc['cmdline'].split(' ')}
+                      for proc in ps_list}
+
+    def process_iter(self, attrs):
+        for info in self.infos.values(): yield {attr: info[attr] for attr in attrs if attr in info}
+
+    def pids(self):
+        return list(self.infos)
+
+    def read(self, pid, attrs):
+        info = self.infos.get(pid)
+        return None if info is None else {attr: info[attr] for attr in attrs if attr in info}
+
+
+def main():
+    import argparse
+    from psdiff import Psdiff
+    parser = argparse.ArgumentParser(description="Write a synthetic series of ps.N snapshot files")
+    parser.add_argument('directory', help='Snapshot directory to create/extend')
+    parser.add_argument('--size', type=int, default=10000, help='Processes per snapshot (1k to 1M)')
+    parser.add_argument('--snapshots', type=int, default=10, help='Number of snapshots')
+    parser.add_argument('--churn', type=float, default=0.01, help='Fraction of processes replaced/changed per snapshot')
+    parser.add_argument('--cmdline-len', type=int, default=80, help='Minimum length of non-empty cmdlines')
+    parser.add_argument('--snapshot-format', choices=['text', 'binary'], default='text')
+    args = parser.parse_args()
+
+    directory = Path(args.directory).resolve()
+    psdiff = Psdiff(directory.parent, directory.name, snapshot_format=args.snapshot_format)
+    for path in write_snapshot_files(psdiff, generate_series(args.size, args.snapshots, args.churn, args.cmdline_len)):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+'''
+Atomic snapshot file writes for concurrent writers.
+
+A file is written to a hidden temp file next to its target (".ps.7.<pid>.<n>.tmp", outside the ps.*
+glob) and only then moved into place, so readers never open a partial file. Rewrites of an existing
+snapshot replace it with os.replace. A new snapshot number is reserved by hard-linking the finished
+temp file to ps.N: the link fails if ps.N already exists, so writers racing for the next number each end
+up with their own without any lock. Filesystems without hard links fall back to reserving ps.N by
+exclusive create and then replacing it.
+
+Durability is optional: SyncBatch fsyncs written files (and their directory) in batches.
+'''
+import atexit
+import errno
+import itertools
+import os
+
+_counter = itertools.count()
+
+
+def temp_path(path):
+    '''A temp file path for path, unique across processes and threads.'''
+    return path.with_name(f".{path.name}.{os.getpid()}.{next(_counter)}.tmp")
+
+
+def publish_new(tmp, path_of, num):
+    '''
+    Move the finished file tmp to path_of(n) for the first n >= num that does not exist yet.
+    :return: (n, path_of(n)).
+    '''
+    try:
+        while True:
+            path = path_of(num)
+            try:
+                os.link(tmp, path)
+                return num, path
+            except FileExistsError:
+                num += 1
+            except OSError as e:
+                if e.errno not in (errno.EPERM, errno.EOPNOTSUPP, errno.EXDEV): raise
+                return _publish_exclusive(tmp, path_of, num)
+    finally:
+        if os.path.exists(tmp): os.unlink(tmp)
+
+
+def _publish_exclusive(tmp, path_of, num):
+    '''publish_new without hard links: reserve the name by exclusive create, then replace the empty placeholder.'''
+    while True:
+        path = path_of(num)
+        try: os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        except FileExistsError:
+            num += 1
+            continue
+        os.replace(tmp, path)
+        return num, path
+
+
+def append_line(path, line):
+    '''Append one line with a single O_APPEND write, so lines of concurrent writers never interleave.'''
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try: os.write(fd, (line + "\n").encode())
+    finally: os.close(fd)
+
+
+class SyncBatch():
+    '''
+    fsync written files in batches: on every `every`-th add() the files added since the last sync and their
+    directories are synced together (every=1 syncs on each add, 0 never syncs). Files still pending are synced by
+    flush() or at interpreter exit. A crash can lose the files of an unsynced batch, never corrupt older ones.
+    '''
+    def __init__(self, every=0):
+        self.every = every
+        self._pending = {}     # path -> None, insertion ordered set
+        self._adds = 0
+        self._registered = False
+
+    def add(self, *paths):
+        '''Register the files written by one operation (e.g. a snapshot and the catalog).'''
+        if not self.every: return
+        for path in paths: self._pending[path] = None
+        if not self._registered:
+            atexit.register(self.flush)
+            self._registered = True
+        self._adds += 1
+        if self._adds >= self.every: self.flush()
+
+    def flush(self):
+        '''Sync the pending files and their directories.'''
+        directories = {}
+        for path in self._pending:
+            try: fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError: continue    # replaced or deleted since, its successor is pending or synced
+            try: os.fsync(fd)
+            finally: os.close(fd)
+            directories[os.path.dirname(os.path.abspath(path))] = None
+        for directory in directories:
+            fd = os.open(directory, os.O_RDONLY)
+            try: os.fsync(fd)
+            finally: os.close(fd)
+        self._pending, self._adds = {}, 0
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+'''
+Versioned binary snapshot format.
+
+layout (little endian):
+  header   : magic b"PSDB", version u16, field mask u16, record count u32, string section offset u32
+  records  : count fixed-width rows sorted by pid -> pid i32, ppid i32, gid i32,
+             then (offset u32, length u32) into the string section for username, name and cmdline,
+             then one value per extra field set in the field mask (version 2)
+  strings  : utf-8 (surrogateescape) bytes, identical strings are stored once
+
+The field mask has a bit per entry of OPTIONAL_FIELDS. Version 1 files have no mask: their gid column
+is a 0 placeholder and they are read without a gid field. Files without optional fields are still
+written as version 1.
+
+Files are read through mmap, so looking up a pid or iterating part of a snapshot only touches those records.
+'''
+import mmap
+import struct
+from fields import fields_of
+
+MAGIC = b"PSDB"
+VERSION = 2
+HEADER = struct.Struct('<4sHHII')
+RECORD = struct.Struct('<iiiIIIIII')
+PID = struct.Struct('<i')
+# (field, struct code of its extra column) in field mask bit order. gid lives in the fixed record.
+OPTIONAL_FIELDS = (('gid', ''), ('rss', 'q'), ('cpu', 'd'), ('threads', 'q'), ('fds', 'q'))
+
+
+def _layout(mask):
+    '''Return (optional fields present, record struct) for a field mask.'''
+    present = [(field, code) for bit, (field, code) in enumerate(OPTIONAL_FIELDS) if mask & (1 << bit)]
+    return [field for field, _ in present], struct.Struct(RECORD.format + ''.join(code for _, code in present))
+
+
+def is_binary_snapshot(path):
+    '''True if the file starts with the binary snapshot magic.'''
+    with open(path, 'rb') as f: return f.read(len(MAGIC)) == MAGIC
+
+
+def write_binary_snapshot(ps_list, output_file):
+    '''Write a list of process dicts to output_file in the binary format.'''
+    ps_list = sorted(ps_list, key=lambda proc: proc['pid'])
+    fields = fields_of(ps_list[0] if ps_list else None)
+    mask = sum(1 << bit for bit, (field, _) in enumerate(OPTIONAL_FIELDS) if field in fields)
+    optional, record = _layout(mask)
+    extras = [field for field in optional if field != 'gid']
+    strings = bytearray()
+    offsets = {}
+
+    def _intern(string):
+        data = string.encode('utf-8', 'surrogateescape')
+        if data not in offsets:
+            offsets[data] = len(strings)
+            strings.extend(data)
+        return offsets[data], len(data)
+
+    records = bytearray(record.size * len(ps_list))
+    for i, proc in enumerate(ps_list):
+        record.pack_into(records, i * record.size, proc['pid'], proc['ppid'], proc.get('gid', 0),
+                         *_intern(proc['username']), *_intern(proc['name']), *_intern(proc['cmdline']),
+                         *(proc[field] for field in extras))
+
+    with open(output_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION if mask else 1, mask, len(ps_list), HEADER.size + len(records)))
+        f.write(records)
+        f.write(strings)
+    return output_file
+
+
+class BinarySnapshot():
+    '''Read-only, mmap backed sequence of process records stored in the binary format.'''
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, mask, self._count, self._strings = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC: raise ValueError(f"not a binary snapshot: {path}")
+        if version not in (1, VERSION): raise ValueError(f"unsupported binary snapshot version {version}: {path}")
+        optional, self._record = _layout(mask if version > 1 else 0)
+        self._has_gid = 'gid' in optional
+        self.fields = fields_of(dict.fromkeys(['pid', 'ppid', 'username', 'name', 'cmdline', *optional]))
+        from records import record_type
+        self._type = record_type(self.fields)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0: index += self._count
+        if not 0 <= index < self._count: raise IndexError(index)
+        pid, ppid, gid, *values = self._record.unpack_from(self._mmap, HEADER.size + index * self._record.size)
+        strings = (self.__string(values[0], values[1]), self.__string(values[2], values[3]), self.__string(values[4], values[5]))
+        if self._has_gid: return self._type(pid, ppid, gid, *strings, *values[6:])
+        return self._type(pid, ppid, *strings, *values[6:])
+
+    def __iter__(self):
+        for index in range(self._count): yield self[index]
+
+    def find(self, pid):
+        '''Binary search the record table for pid. Returns the process record or None.'''
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if PID.unpack_from(self._mmap, HEADER.size + mid * self._record.size)[0] < pid: low = mid + 1
+            else: high = mid
+        if low < self._count and PID.unpack_from(self._mmap, HEADER.size + low * self._record.size)[0] == pid:
+            return self[low]
+        return None
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __string(self, offset, length):
+        start = self._strings + offset
+        return self._mmap[start:start + length].decode('utf-8', 'surrogateescape')
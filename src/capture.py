@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import os
+import pwd
+import sys
+from fields import FIELDS, sources
+
+
+class PsutilBackend():
+    '''
+    Capture backend built on psutil.process_iter. Portable, but builds a Process object per pid.
+    psutil is imported on first use so that code paths which never capture do not pay for it.
+    '''
+    name = 'psutil'
+    filters_capture = True  # process_iter applies a ProcessFilter itself
+
+    def process_iter(self, attrs, proc_filter=None):
+        '''
+        Yield a proc.info style dict for every running process.
+        With a ProcessFilter, the cmdline and extra fields are only fetched for processes the filter has not
+        already excluded.
+        '''
+        import psutil
+        if proc_filter is None:
+            for proc in psutil.process_iter(self.__psutil_attrs(attrs)):
+                yield self.__convert(proc.info, attrs)
+            return
+        procs = list(psutil.process_iter(['pid', 'ppid', 'username', 'name']))
+        subtree = proc_filter.subtree({proc.info['pid']: proc.info['ppid'] for proc in procs}) if proc_filter.needs_tree else frozenset()
+        rest = self.__psutil_attrs([attr for attr in attrs if attr not in ('pid', 'ppid', 'username', 'name')])
+        for proc in procs:
+            info = proc.info
+            if not proc_filter.early(info['pid'], info['ppid'], info['username'], info['name'], subtree): continue
+            try: info.update(proc.as_dict(rest))
+            except (psutil.NoSuchProcess, psutil.ZombieProcess): continue
+            info = self.__convert(info, attrs)
+            if not proc_filter.keep(info['pid'], info['ppid'], info['username'], info['name'], " ".join(info.get('cmdline') or []), subtree): continue
+            yield info
+
+    def pids(self):
+        '''Return the currently running pids.'''
+        import psutil
+        return psutil.pids()
+
+    def read(self, pid, attrs):
+        '''Return the proc.info style dict of a single pid, or None if it went away.'''
+        import psutil
+        try: return self.__convert(psutil.Process(pid).as_dict(self.__psutil_attrs(attrs)), attrs)
+        except (psutil.NoSuchProcess, psutil.ZombieProcess): return None
+
+    def __psutil_attrs(self, attrs):
+        return [FIELDS[attr].psutil_attr for attr in attrs]
+
+    def __convert(self, info, attrs):
+        '''Map psutil attribute values to field values. Values psutil could not read (None) get the field default.'''
+        result = {}
+        for attr in attrs:
+            field = FIELDS[attr]
+            value = info.get(field.psutil_attr)
+            result[attr] = field.missing if value is None else field.psutil_value(value)
+        return result
+
+
+class ProcfsBackend():
+    '''
+    Linux capture backend that walks /proc directly with os.scandir.
+    Each /proc/<pid> source needed for the requested fields is read once (see fields.FIELDS), uid -> username
+    is cached, and processes that exit mid-scan are skipped.
+    '''
+    name = 'procfs'
+    filters_capture = True  # process_iter applies a ProcessFilter itself
+
+    # status line key -> field it provides ('username' comes from the real Uid)
+    _STATUS_LINES = {b'Name': 'name', b'PPid': 'ppid', b'Uid': 'username', b'Gid': 'gid', b'VmRSS': 'rss', b'Threads': 'threads'}
+    _FILTER_FIELDS = ('pid', 'ppid', 'username', 'name')
+
+    def __init__(self, proc_root: str = '/proc'):
+        self.proc_root = proc_root
+        self._usernames = {}
+        self._clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+    def process_iter(self, attrs, proc_filter=None):
+        '''
+        Yield a proc.info style dict for every pid directory under proc_root.
+        With a ProcessFilter, status is read for every process first and the other sources only for processes
+        the filter has not already excluded.
+        '''
+        if proc_filter is not None:
+            yield from self.__filtered_iter(attrs, proc_filter)
+            return
+        with os.scandir(self.proc_root) as entries:
+            for entry in entries:
+                if not entry.name.isdigit(): continue
+                info = self.__read_process(entry.path, int(entry.name), attrs)
+                if info is not None: yield info
+
+    def pids(self):
+        '''Return the currently running pids. Only lists /proc, no per-process files are opened.'''
+        with os.scandir(self.proc_root) as entries:
+            return [int(entry.name) for entry in entries if entry.name.isdigit()]
+
+    def read(self, pid, attrs):
+        '''Return the proc.info style dict of a single pid, or None if it went away.'''
+        return self.__read_process(f"{self.proc_root}/{pid}", pid, attrs)
+
+    # --- Internal methods -> /proc parsing ---
+    def __filtered_iter(self, attrs, proc_filter):
+        '''Two pass capture: status of every process, then the remaining sources of the survivors only.'''
+        status_attrs = set(attrs) | set(self._FILTER_FIELDS)
+        # cmdline is always needed for the final keep() decision
+        other_attrs = [attr for attr in {*attrs, 'cmdline'} if FIELDS[attr].source not in (None, 'status')]
+        statuses = []
+        with os.scandir(self.proc_root) as entries:
+            for entry in entries:
+                if not entry.name.isdigit(): continue
+                try: status = self.__read_status(entry.path, status_attrs)
+                except (FileNotFoundError, ProcessLookupError, NotADirectoryError): continue
+                status['pid'] = int(entry.name)
+                statuses.append((entry.path, status))
+        subtree = proc_filter.subtree({status['pid']: status['ppid'] for _, status in statuses}) if proc_filter.needs_tree else frozenset()
+        for path, info in statuses:
+            pid, ppid, username, name = (info[attr] for attr in self._FILTER_FIELDS)
+            # names of 15+ chars are truncated comm values, decide those once the full name is known
+            if len(name) < 15 and not proc_filter.early(pid, ppid, username, name, subtree): continue
+            try: info.update(self.__read_other_sources(path, other_attrs))
+            except (FileNotFoundError, ProcessLookupError, NotADirectoryError): continue
+            self.__extend_name(info)
+            if not proc_filter.keep(pid, ppid, username, info['name'], " ".join(info['cmdline']), subtree): continue
+            yield {attr: info[attr] for attr in attrs}
+
+    def __read_process(self, path, pid, attrs):
+        '''Read the requested attrs of one process. Returns None if the process went away.'''
+        try:
+            info = self.__read_status(path, attrs) if 'status' in sources(attrs) else {}
+            info.update(self.__read_other_sources(path, [attr for attr in attrs if FIELDS[attr].source not in (None, 'status')]))
+        except (FileNotFoundError, ProcessLookupError, NotADirectoryError): return None
+        info['pid'] = pid
+        self.__extend_name(info)
+        return {attr: info[attr] for attr in attrs}
+
+    def __read_other_sources(self, path, attrs):
+        '''Read the non-status fields in attrs, one read per source.'''
+        info = {}
+        needed = sources(attrs)
+        if 'cmdline' in needed: info['cmdline'] = self.__read_cmdline(path)
+        if 'stat' in needed: info['cpu'] = self.__read_cpu(path)
+        if 'fd' in needed: info['fds'] = self.__count_fds(path)
+        return info
+
+    def __extend_name(self, info):
+        '''comm is truncated to 15 chars; extend it from argv[0] the same way psutil does.'''
+        name, cmdline = info.get('name'), info.get('cmdline')
+        if name is not None and len(name) >= 15 and cmdline:
+            exe = os.path.basename(cmdline[0])
+            if exe.startswith(name): info['name'] = exe
+
+    def __read_status(self, path, attrs):
+        '''Parse the status fields in attrs out of /proc/<pid>/status. Missing memory fields (kernel threads) read as 0.'''
+        wanted = {field for field in self._STATUS_LINES.values() if field in attrs} | {'username'}
+        with open(f"{path}/status", 'rb') as f: data = f.read()
+        status = {}
+        for line in data.split(b'\n'):
+            key, _, value = line.partition(b':')
+            field = self._STATUS_LINES.get(key)
+            if field not in wanted: continue
+            if field == 'name':
+                name = os.fsdecode(value.strip(b'\t'))
+                if '\\' in name: name = name.encode('latin-1', 'backslashreplace').decode('unicode_escape')
+                status['name'] = name
+            elif field == 'username': status['uid'] = int(value.split()[0])
+            elif field == 'gid': status['gid'] = int(value.split()[0])
+            elif field == 'rss': status['rss'] = int(value.split()[0]) * 1024
+            else: status[field] = int(value)
+            if len(status) == len(wanted): break
+        if 'uid' not in status: raise ProcessLookupError(path)
+        status['username'] = self.__get_username(status.pop('uid'))
+        for field in wanted - status.keys(): status[field] = FIELDS[field].missing
+        return status
+
+    def __read_cmdline(self, path):
+        '''Split /proc/<pid>/cmdline into argv, handling processes that rewrote it with spaces.'''
+        try:
+            with open(f"{path}/cmdline", 'rb') as f: data = os.fsdecode(f.read())
+        except PermissionError: return []
+        if not data: return []
+        sep = '\x00' if data.endswith('\x00') else ' '
+        if data.endswith(sep): data = data[:-1]
+        cmdline = data.split(sep)
+        if sep == '\x00' and len(cmdline) == 1 and ' ' in data: cmdline = data.split(' ')
+        return cmdline
+
+    def __read_cpu(self, path):
+        '''User + system cpu seconds from /proc/<pid>/stat (utime and stime are fields 14 and 15).'''
+        with open(f"{path}/stat", 'rb') as f: data = f.read()
+        rest = data[data.rindex(b')') + 2:].split()
+        return round((int(rest[11]) + int(rest[12])) / self._clock_ticks, 2)
+
+    def __count_fds(self, path):
+        '''Number of open file descriptors, -1 if /proc/<pid>/fd is not readable.'''
+        try: return len(os.listdir(f"{path}/fd"))
+        except PermissionError: return -1
+
+    def __get_username(self, uid):
+        '''Resolve a uid to a username through a per-backend cache.'''
+        username = self._usernames.get(uid)
+        if username is None:
+            try: username = pwd.getpwuid(uid).pw_name
+            except KeyError: username = str(uid)
+            self._usernames[uid] = username
+        return username
+
+
+def get_backend(name: str = 'auto'):
+    '''Return a capture backend by name. 'auto' picks procfs on Linux and falls back to psutil.'''
+    if name == 'auto':
+        name = 'procfs' if sys.platform.startswith('linux') and os.path.isdir('/proc') else 'psutil'
+    if name == 'procfs': return ProcfsBackend()
+    if name == 'psutil': return PsutilBackend()
+    raise ValueError(f"Unknown capture backend: {name}")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+'''
+Snapshot catalog: an append-only manifest of the snapshots in a snapshot directory.
+
+Each line is a JSON object describing one snapshot {num, time, size, records, format} or a removal
+{num, deleted}. Snapshots whose field set is not the default one also list their fields. Adding a
+snapshot appends one line, so bookkeeping no longer globs or stats the directory. The latest snapshot
+number and the total directory size are kept up to date in memory.
+Lines are appended with a single O_APPEND write, so several processes can add snapshots concurrently.
+
+The catalog is never compacted, so replaying it grows with every rewrite and removal. The summary file
+.<prefix>.catalog.summary records the latest number and total size as of a byte offset of the catalog:
+latest() and total_size() read it plus the lines appended after it, and adding a new highest number
+updates it, so a run that only saves or reads snapshot N never replays the whole catalog.
+'''
+import json
+import os
+import time
+from pathlib import Path
+from binformat import HEADER, MAGIC, BinarySnapshot
+from deltastore import DELTA_HEADER, read_delta_header
+from fields import DEFAULT_FIELDS, FIELDS_HEADER
+
+
+class Catalog():
+    def __init__(self, snapshot_dir: Path, snapshot_prefix: str):
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_prefix = snapshot_prefix
+        self.path = snapshot_dir / f".{snapshot_prefix}.catalog"
+        self._entries = None    # num -> entry dict, loaded on first use
+        self._latest = -1
+        self._total_size = 0
+        self._stat = None       # (inode, size, mtime) of the catalog file as last read or written by this instance
+        self.summary_path = snapshot_dir / f".{snapshot_prefix}.catalog.summary"
+        self._summarized = False    # _latest and _total_size are known up to _stat without _entries
+
+    # --- Public methods ---
+    def latest(self):
+        '''Highest snapshot number, -1 if there are none.'''
+        self.__ensure_summary()
+        return self._latest
+
+    def total_size(self):
+        '''Total size in bytes of the cataloged snapshots.'''
+        self.__ensure_summary()
+        return self._total_size
+
+    def nums(self):
+        '''All snapshot numbers in ascending order.'''
+        self.__ensure_loaded()
+        return sorted(self._entries)
+
+    def get(self, num):
+        '''The catalog entry of snapshot num, or None.'''
+        self.__ensure_loaded()
+        return self._entries.get(num)
+
+    def __contains__(self, num):
+        return self.get(num) is not None
+
+    def add(self, num, size, records, snapshot_format, timestamp=None, **extra):
+        '''Record a written (or rewritten) snapshot.'''
+        entry = {'num': num, 'time': timestamp if timestamp is not None else time.time(),
+                 'size': size, 'records': records, 'format': snapshot_format, **extra}
+        self.__ensure_summary()
+        if self._entries is None and num > self._latest:
+            # a new highest number replaces no entry: the summary accounts for it without loading the catalog
+            self._latest, self._total_size = num, self._total_size + size
+        else:
+            self.__ensure_loaded()
+            self.__apply(entry)
+        self.__append(entry)
+        return entry
+
+    def remove(self, num):
+        '''Record that snapshot num was deleted.'''
+        self.__ensure_loaded()
+        if num not in self._entries: return
+        entry = {'num': num, 'deleted': True}
+        self.__apply(entry)
+        self.__append(entry)
+
+    def clear(self):
+        '''Forget every snapshot.'''
+        if self.path.exists(): self.path.unlink()
+        if self.summary_path.exists(): self.summary_path.unlink()
+        self._entries, self._latest, self._total_size = {}, -1, 0
+        self._stat, self._summarized = None, False
+
+    def refresh(self):
+        '''Reload on next use if another process changed the catalog file since this instance read or wrote it.'''
+        if (self._entries is not None or self._summarized) and self.__file_stat() != self._stat:
+            self._entries, self._summarized = None, False
+
+    def reindex(self, replace=True):
+        '''
+        Rebuild the catalog from the files in the snapshot directory. Returns the number of snapshots found.
+        replace=False only creates a missing catalog: if another process created one meanwhile, that one is loaded.
+        '''
+        known = self._entries or {}
+        self._entries, self._latest, self._total_size = {}, -1, 0
+        if not self.snapshot_dir.exists(): return 0
+        entries = {}
+        for file in self.snapshot_dir.glob(f"{self.snapshot_prefix}.*"):
+            try: num = int(file.name.split('.')[-1])
+            except ValueError: continue
+            if not file.is_file(): continue
+            stat = file.stat()
+            previous = {key: value for key, value in known.get(num, {}).items() if key != 'fields'}
+            entries[num] = {**previous, 'num': num, 'time': stat.st_mtime, 'size': stat.st_size,
+                            **self.__inspect_file(file)}
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        from atomicio import temp_path   # writers only, like append_line below
+        tmp_path = temp_path(self.path)
+        with open(tmp_path, 'w') as f:
+            for num in sorted(entries):
+                f.write(json.dumps(entries[num]) + "\n")
+                self.__apply(entries[num])
+        if replace:
+            os.replace(tmp_path, self.path)
+        else:
+            # replacing would drop the lines other writers appended to a catalog they just created
+            try: os.link(tmp_path, self.path)
+            except FileExistsError:
+                self._entries = None
+                self.__ensure_loaded()
+                return len(self._entries)
+            finally: tmp_path.unlink(missing_ok=True)
+        self._stat = self.__file_stat()
+        self.__write_summary()
+        return len(entries)
+
+    # --- Internal methods ---
+    def __ensure_loaded(self):
+        if self._entries is not None: return
+        self._entries, self._latest, self._total_size = {}, -1, 0
+        self._summarized = False
+        try:
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                data = f.read(stat.st_size)     # exactly the bytes _stat (and so the summary) accounts for
+        except FileNotFoundError:
+            # first use of an existing directory: build the catalog once from the files
+            self._stat = None
+            if self.snapshot_dir.exists(): self.reindex(replace=False)
+            return
+        self._stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        for line in data.splitlines():
+            try: self.__apply(json.loads(line))
+            except ValueError: continue     # torn trailing line from an interrupted append
+        self.__write_summary()
+
+    def __ensure_summary(self):
+        '''Latest number and total size from the summary and the catalog lines after it, or from the whole catalog.'''
+        if self._entries is not None or self._summarized: return
+        try:
+            with open(self.summary_path, 'r') as f: summary = json.load(f)
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                # rewritten by reindex (another inode) or shorter than the summary: not the catalog it summarizes
+                if stat.st_ino != summary['inode'] or stat.st_size < summary['offset']: raise ValueError
+                f.seek(summary['offset'])
+                tail = f.read(stat.st_size - summary['offset'])
+            latest, total_size = summary['latest'], summary['total_size']
+            for line in tail.splitlines(keepends=True):
+                entry = json.loads(line) if line.endswith(b"\n") else None
+                # anything but a new highest number needs the previous entries
+                if entry is None or entry.get('deleted') or entry['num'] <= latest: raise ValueError
+                latest, total_size = entry['num'], total_size + entry['size']
+        except (OSError, ValueError, KeyError, TypeError):
+            return self.__ensure_loaded()
+        self._latest, self._total_size, self._summarized = latest, total_size, True
+        self._stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def __apply(self, entry):
+        num = entry['num']
+        previous = self._entries.pop(num, None)
+        if previous is not None: self._total_size -= previous['size']
+        if entry.get('deleted'):
+            if num == self._latest: self._latest = max(self._entries, default=-1)
+            return
+        self._entries[num] = entry
+        self._total_size += entry['size']
+        self._latest = max(self._latest, num)
+
+    def __append(self, entry):
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(entry)
+        from atomicio import append_line
+        append_line(self.path, line)
+        # only trust the new stat if the file grew by exactly this line; otherwise another writer appended
+        # too, and leaving _stat stale makes refresh() reload their entries
+        expected = (0 if self._stat is None else self._stat[1]) + len(line.encode()) + 1
+        stat = self.__file_stat()
+        if stat is not None and stat[1] == expected:
+            self._stat = stat
+            self.__write_summary()
+        elif self._entries is None: self._summarized = False
+
+    def __write_summary(self):
+        '''Record latest and total size as of the catalog bytes this instance has read or written.'''
+        if self._stat is None: return
+        from atomicio import temp_path
+        tmp = temp_path(self.summary_path)
+        with open(tmp, 'w') as f:
+            json.dump({'inode': self._stat[0], 'offset': self._stat[1], 'latest': self._latest, 'total_size': self._total_size}, f)
+        os.replace(tmp, self.summary_path)
+
+    def __file_stat(self):
+        try: stat = self.path.stat()
+        except FileNotFoundError: return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def __inspect_file(self, file):
+        '''Find the format, record count and field set of a snapshot file.'''
+        with open(file, 'rb') as f:
+            head = f.read(HEADER.size)
+            if head[:len(MAGIC)] == MAGIC:
+                with BinarySnapshot(file) as snapshot: fields = snapshot.fields
+                return {'records': HEADER.unpack(head)[3], 'format': 'binary', **self.__fields_entry(fields)}
+            lines = head.count(b'\n') + sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 16), b''))
+        if head.startswith(DELTA_HEADER):
+            base, fields = read_delta_header(file)
+            # one record per removed, added or changed process: a change is a < and a > line
+            with open(file, 'rb') as f: records = sum(1 for line in f if line[:1] in (b'-', b'+', b'>'))
+            return {'records': records, 'format': 'delta', 'base': base, **self.__fields_entry(fields)}
+        headers, fields = 0, None
+        if head.startswith(b'#'):   # fields and/or cmdline refs header lines
+            with open(file, 'r') as f:
+                for line in f:
+                    if not line.startswith('#'): break
+                    headers += 1
+                    if line.startswith(FIELDS_HEADER): fields = line[len(FIELDS_HEADER):].strip().split(',')
+        return {'records': lines - headers, 'format': 'text', **self.__fields_entry(fields)}
+
+    def __fields_entry(self, fields):
+        return {'fields': fields} if fields and fields != DEFAULT_FIELDS else {}
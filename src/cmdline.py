@@ -1,16 +1,10 @@
 #!/usr/bin/env python3
 import argparse
-import psdiff
 import sys
-from psdiff import Psdiff
 from pathlib import Path
 
 
 def main():
-    psdiff = Psdiff(Path(__file__).resolve().parent)
-    psdiff.snapshot_dir.mkdir(parents=True, exist_ok=True)
-
-    
     parser = argparse.ArgumentParser()
     group = parser.add_mutually_exclusive_group()
     NOVALUE = object()
@@ -18,6 +12,40 @@ def main():
     group.add_argument("-p", type=int, nargs='?', const=NOVALUE, help="Print snapshot")
     group.add_argument("-c", type=int, nargs='*', help="Print snapshot diff")
     group.add_argument('--delete', action='store_true', help='Deletes all previous checkpoints')
+    group.add_argument('--convert', type=int, nargs='*', help='Convert snapshots (default: all) to --snapshot-format')
+    group.add_argument('--reindex', action='store_true', help='Rebuild the snapshot catalog from the snapshot directory')
+    group.add_argument('--history', nargs='?', const=NOVALUE, metavar='PID|TEXT', help='Lifetimes of matching processes, or churn per snapshot')
+    group.add_argument('--range', type=int, nargs=2, metavar=('A', 'B'), help='Processes that appeared or went away between snapshots A and B')
+    group.add_argument('--series', type=int, nargs=2, metavar=('A', 'B'), help='Diff each consecutive pair of snapshots from A to B in parallel')
+    group.add_argument('--compact', action='store_true', help='Rebase delta snapshots onto their keyframes')
+    group.add_argument('--serve', type=float, nargs='?', const=5.0, metavar='INTERVAL',
+                       help='Run the daemon: keep snapshots in memory, capture every INTERVAL seconds (default 5)')
+    group.add_argument('--list-fields', action='store_true', help='List the fields that can be captured with --fields')
+    group.add_argument('--watch', type=float, metavar='INTERVAL', help='Print process changes every INTERVAL seconds')
+    group.add_argument('--remove', type=int, nargs='+', metavar='N', help='Delete snapshots N... and the cmdlines only they used')
+    parser.add_argument('--persist-every', type=int, metavar='N', help='With --watch, save a snapshot every N ticks')
+    parser.add_argument('--full-every', type=int, default=0, metavar='N',
+                        help='With --watch, capture every process each N ticks to catch in-place changes (exec, setuid); '
+                             'costs a full capture per N ticks instead of following churn only (default 0: never)')
+    parser.add_argument('--tree', action='store_true', help='Group the diff by process subtree, one summary line per group')
+    parser.add_argument('--details', action='store_true', help='With --tree, list the changed processes under each summary')
+    parser.add_argument('--restarts', action='store_true', help='Report a removed and an added process of the same program as restarted')
+    parser.add_argument('--identity-config', metavar='FILE', help='JSON cmdline normalization rules for --restarts (default: .psdiff/identity.json)')
+    parser.add_argument('--format', choices=['text', 'tsv', 'ndjson'], default='text', help='Output format of print and diff')
+    parser.add_argument('--timings', action='store_true', help='Print a per-stage wall/CPU breakdown to stderr')
+    parser.add_argument('--profile', metavar='FILE', help='Write cProfile stats of the run to FILE')
+    parser.add_argument('--workers', type=int, default=None, metavar='N', help='Worker processes for --series (default: cpu count)')
+    parser.add_argument('--chunksize', type=int, default=1, metavar='N', help='Snapshot pairs per worker task for --series')
+    parser.add_argument('--keyframe-every', type=int, default=0, metavar='N', help='Save a full keyframe every N snapshots and deltas in between')
+    parser.add_argument('--fsync-every', type=int, default=0, metavar='N', help='fsync snapshot files and the catalog every N writes')
+    parser.add_argument('--cmdline-store', action='store_true', help='Save cmdlines once in a shared store, snapshots reference them by hash')
+    parser.add_argument('--snapshot-format', choices=['text', 'binary'], default=None, help='Format used to save snapshots')
+    parser.add_argument('--backend', choices=['auto', 'procfs', 'psutil'], default='auto', help='Process capture backend')
+    parser.add_argument('--fields', type=lambda value: value.split(','), default=None, metavar='F1,F2',
+                        help='Extra fields to capture, e.g. rss,cpu,threads,fds,gid (see --list-fields)')
+    parser.add_argument('--cache-size', type=int, default=16, metavar='N', help='With --serve, older parsed snapshots kept in memory')
+    parser.add_argument('--no-daemon', action='store_true', help='Do not forward -p/-c/-s to a running daemon')
+    parser.add_argument('--filter-config', metavar='FILE', help='JSON include/exclude rules applied during capture (default: .psdiff/filters.json)')
 
     try: args = parser.parse_args()
     except SystemExit:
@@ -25,6 +53,52 @@ def main():
         usage()
         sys.exit(1)
 
+    status = forward_to_daemon(args, NOVALUE)
+    if status is not None: sys.exit(status)
+
+    # imported after parsing so --help and usage errors stay cheap; capture modules load only when capturing
+    from psdiff import Psdiff
+    try:
+        psdiff = Psdiff(Path(__file__).resolve().parent, backend=args.backend, snapshot_format=args.snapshot_format or 'text',
+                        keyframe_every=args.keyframe_every, output_format=args.format,
+                        filter_config=args.filter_config, fields=args.fields, identity_config=args.identity_config,
+                        fsync_every=args.fsync_every, cmdline_store=args.cmdline_store)
+    except ValueError as e: parser.error(str(e))
+    if args.timings: psdiff.timings.enabled = True
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try: run(psdiff, parser, args, NOVALUE)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.timings: psdiff.timings.report()
+
+def forward_to_daemon(args, NOVALUE):
+    '''
+    Send print/diff/save to a running daemon. Returns its exit status, or None to run psdiff directly:
+    no daemon is listening, or an option the daemon does not apply was given.
+    '''
+    direct = (args.no_daemon or args.timings or args.profile or args.fields or args.filter_config or args.identity_config or
+              args.snapshot_format or args.keyframe_every or args.fsync_every or args.cmdline_store or args.backend != 'auto')
+    if args.s is not None: op, nums = 'save', ([] if args.s is NOVALUE else [args.s])
+    elif args.c is not None: op, nums = 'diff', args.c
+    elif args.p is not None: op, nums = 'print', ([] if args.p is NOVALUE else [args.p])
+    elif not any(getattr(args, option) not in (None, False) for option in
+                 ('delete', 'convert', 'reindex', 'history', 'range', 'series', 'compact', 'serve', 'list_fields', 'watch', 'remove')):
+        op, nums = 'diff', []
+    else: return None
+    if direct or len(nums) > 2: return None
+    from daemon import run_client, socket_path
+    return run_client(socket_path(Path(__file__).resolve().parent / ".psdiff"), op, nums, args.format,
+                      tree=args.tree, details=args.details, restarts=args.restarts)
+
+def run(psdiff, parser, args, NOVALUE):
+    '''Dispatch the parsed command line to psdiff.'''
     if (args.c is not None) and (len(args.c) > 2 or len(args.c) < 0):
         parser.error("Too many arguments: max 2 allowed per flag.")
     elif (args.s is not None):
@@ -33,10 +107,35 @@ def main():
     elif (args.c is not None):
         arg1 = None if len(args.c) < 1 else args.c[0]
         arg2 = None if len(args.c) < 2 else args.c[1]
-        psdiff.print_diff(arg1, arg2)
+        psdiff.print_diff(arg1, arg2, tree=args.tree, details=args.details, restarts=args.restarts)
     elif (args.p is not None):
         if (args.p is NOVALUE): psdiff.print_snapshot()
         else: psdiff.print_snapshot(args.p)
+    elif (args.history is not None):
+        if (args.history is NOVALUE): psdiff.print_churn()
+        elif args.history.isdigit(): psdiff.print_history(pid=int(args.history))
+        else: psdiff.print_history(text=args.history)
+    elif (args.range is not None):
+        psdiff.print_range(*args.range)
+    elif (args.series is not None):
+        psdiff.print_series(*args.series, workers=args.workers, chunksize=args.chunksize)
+    elif args.compact:
+        psdiff.compact()
+    elif args.reindex:
+        psdiff.reindex()
+    elif (args.serve is not None):
+        try: psdiff.serve(args.serve, args.cache_size)
+        except KeyboardInterrupt: pass
+    elif args.list_fields:
+        psdiff.print_fields()
+    elif (args.watch is not None):
+        try: psdiff.print_watch(args.watch, persist_every=args.persist_every, full_every=args.full_every)
+        except KeyboardInterrupt: pass
+    elif (args.convert is not None):
+        for num in (args.convert or psdiff.list_snapshots()):
+            psdiff.convert_snapshot(num, args.snapshot_format or 'binary')
+    elif (args.remove is not None):
+        for num in args.remove: psdiff.remove_snapshot(num)
     elif args.delete:
         response = input("Delete all snapshots? [y/N]: ").strip().lower()
         if response == 'y':
@@ -45,7 +144,7 @@ def main():
         else:
             print("Cancelled.")
     else:
-        psdiff.print_diff()
+        psdiff.print_diff(tree=args.tree, details=args.details, restarts=args.restarts)
         pass
 
 def usage():
@@ -53,7 +152,10 @@ def usage():
     print(f"""Usage:
   psdiff          # compare with latest snapshot
   psdiff -s        # saves a new ps snapshot
-  psdiff -c N      # compare with snapshot N""")
+  psdiff -c N      # compare with snapshot N
+  psdiff --tree    # compare, summarized per process subtree
+  psdiff --convert # convert snapshots to binary
+  psdiff --watch 1 # print process changes every second""")
     
 
 if __name__ == "__main__":
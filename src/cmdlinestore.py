@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+'''
+Content addressed cmdline store shared by the snapshots of a directory.
+
+file .<prefix>.cmdlines: one line per distinct cmdline, "<hash> <cmdline as a JSON string>", where hash is
+the 16 hex digit blake2b digest of the cmdline. Lines are only ever appended (one O_APPEND write per
+snapshot), so concurrent writers at worst store a cmdline twice.
+
+Snapshots written with the store hold "@<hash>" in their cmdline column instead of the text: text
+snapshots start with a "#cmdline-refs" line, delta headers carry "cmdlines=refs". Every hash resolves
+to one shared str object, so equal cmdlines of different snapshots are the same object and comparing
+them in a diff is an identity check instead of a character by character compare.
+
+gc(live) rewrites the store with only the hashes that remaining snapshots still reference. A writer
+whose snapshot is not cataloged yet can lose hashes it reuses to a concurrent gc, so both sides check
+for the other: the writer re-appends every hash it referenced when the store was rewritten between
+refresh() and flush() or between flush() and confirm() (called once the snapshot is cataloged), and gc
+asks for the live hashes again after its rewrite and appends back those it dropped.
+'''
+import json
+import os
+from atomicio import append_line, temp_path
+from fields import REFS_HEADER
+REF_PREFIX = "@"
+
+
+class CmdlineStore():
+    def __init__(self, snapshot_dir, snapshot_prefix="ps"):
+        self.path = snapshot_dir / f".{snapshot_prefix}.cmdlines"
+        self._texts = {}       # hash -> cmdline, filled from the store file up to _offset
+        self._hashes = {}      # cmdline -> hash of the cmdlines this instance has referenced
+        self._pending = []     # store lines not yet appended
+        self._referenced = set()   # hashes referenced since refresh(), by the snapshot being written
+        self._flushed = None   # inode of the store file flush() appended to
+        self._offset = 0       # bytes of the store file (inode _inode) read so far
+        self._inode = None
+
+    # --- Public methods ---
+    def refresh(self):
+        '''Catch up with the store file before writing: read what other writers appended, start over after a gc.'''
+        if self.__file_inode() != self._inode: self._texts, self._hashes, self._offset, self._inode = {}, {}, 0, None
+        self._referenced = set()
+        self.__load()
+
+    def ref(self, cmdline):
+        '''The "@<hash>" reference of cmdline. New cmdlines are added to the store on flush().'''
+        digest = self._hashes.get(cmdline)
+        if digest is None:
+            import hashlib   # only writers need it
+            digest = hashlib.blake2b(cmdline.encode('utf-8', 'surrogateescape'), digest_size=8).hexdigest()
+            self._hashes[cmdline] = digest
+            if digest not in self._texts:
+                self._texts[digest] = cmdline
+                self._pending.append(f"{digest} {json.dumps(cmdline)}")
+        self._referenced.add(digest)
+        return REF_PREFIX + digest
+
+    def flush(self):
+        '''Append the cmdlines referenced since refresh() that the store lacks. Must happen before the snapshot using them is published.'''
+        # a gc since refresh() may have dropped hashes this snapshot reuses
+        self._flushed = self.__file_inode()
+        if self._flushed != self._inode: self._pending = [self.__line(digest) for digest in self._referenced]
+        if not self._pending: return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        append_line(self.path, "\n".join(self._pending))
+        self._pending = []
+        if self._flushed is None: self._flushed = self.__file_inode()   # this append created the store
+
+    def confirm(self):
+        '''Once the snapshot is cataloged (visible to gc): re-append its cmdlines if a gc rewrote the store since flush().'''
+        if self._referenced and self.__file_inode() != self._flushed:
+            append_line(self.path, "\n".join(self.__line(digest) for digest in self._referenced))
+        self._referenced = set()
+
+    def resolve(self, ref):
+        '''The cmdline of an "@<hash>" reference (one shared object per hash).'''
+        digest = ref[len(REF_PREFIX):]
+        text = self._texts.get(digest)
+        if text is None:
+            self.__load()    # written by another process since
+            text = self._texts.get(digest)
+            if text is None: raise LookupError(f"cmdline {ref} is not in {self.path}")
+        return text
+
+    def gc(self, live):
+        '''
+        Rewrite the store with only the hashes the live() callable returns. live() is asked again after the
+        rewrite and the hashes it dropped that are live by then are appended back. Returns the number of cmdlines dropped.
+        '''
+        if not self.path.exists(): return 0
+        self.__load()
+        known = set(self._texts)
+        referenced = live()
+        kept = {digest: text for digest, text in self._texts.items() if digest in referenced}
+        dropped = len(self._texts) - len(kept)
+        if not dropped: return 0
+        tmp = temp_path(self.path)
+        with open(tmp, 'w') as f:
+            for digest, text in kept.items(): f.write(f"{digest} {json.dumps(text)}\n")
+            # cmdlines appended meanwhile belong to snapshots being written: keep them
+            self.__load()
+            for digest in self._texts.keys() - known:
+                kept[digest] = self._texts[digest]
+                f.write(f"{digest} {json.dumps(kept[digest])}\n")
+        os.replace(tmp, self.path)
+        # snapshots cataloged while the store was rewritten: their writers may have checked the inode too early
+        restored = [self.__line(digest) for digest in live() & known - kept.keys()]
+        if restored: append_line(self.path, "\n".join(restored))
+        self._texts, self._hashes, self._offset, self._inode = kept, {}, 0, None
+        self.__load()
+        return dropped - len(restored)
+
+    def clear(self):
+        '''Forget every cmdline.'''
+        if self.path.exists(): self.path.unlink()
+        self._texts, self._hashes, self._pending, self._offset, self._inode = {}, {}, [], 0, None
+        self._referenced, self._flushed = set(), None
+
+    # --- Internal methods ---
+    def __file_inode(self):
+        try: return self.path.stat().st_ino
+        except FileNotFoundError: return None
+
+    def __line(self, digest):
+        return f"{digest} {json.dumps(self._texts[digest])}"
+
+    def __load(self):
+        '''Read the store lines appended since the last read (all of it if the file was rewritten).'''
+        try:
+            with open(self.path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != self._inode: self._offset, self._inode = 0, inode   # rewritten by gc
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            digest, _, text = line.decode('utf-8', 'surrogateescape').partition(" ")
+            self._texts.setdefault(digest, json.loads(text))
+        self._offset += len(complete)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+'''
+psdiff daemon: keeps parsed snapshots in memory and answers print, diff and save requests on a Unix socket.
+
+protocol (one request per connection):
+  request  : one JSON line {"op": "print" | "diff" | "save", "nums": [...], "format": "text" | "tsv" | "ndjson",
+                            "exclude": [client pid], "tree": bool, "details": bool,
+                            "restarts": bool}
+             nums holds the snapshot numbers of the command line (-p N, -c N M, -s N), empty for the defaults.
+             tree, details and restarts are the print_diff options of the command line.
+             exclude lists pids left out of live captures, like a direct run leaves out its own process.
+  response : one JSON line {"status": exit code, "stderr": text}, then the command's stdout until EOF
+
+The daemon captures the live process list every interval seconds, so requests against the live list
+(psdiff, -c N, -p) are answered from a capture at most interval seconds old instead of a fresh /proc scan.
+Saves always capture fresh. Importing this module is cheap (socket is only imported once a socket file
+exists), so the CLI can try the daemon before loading psdiff.
+'''
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+OPS = ('print', 'diff', 'save')
+DIFF_OPTIONS = ('tree', 'details', 'restarts')   # print_diff keyword flags a diff request may set
+
+
+def socket_path(snapshot_dir, snapshot_prefix="ps"):
+    '''Path of the daemon socket for a snapshot directory.'''
+    return os.path.join(snapshot_dir, f".{snapshot_prefix}.sock")
+
+
+# --- Client ---
+def request(path, op, nums=(), output_format='text', timeout=30.0, **options):
+    '''
+    Send one request to the daemon listening on path. Returns (status, stderr text, stdout bytes), or None
+    if no daemon is listening or it answered without a status line, so the caller can fall back to running
+    psdiff directly.
+    '''
+    if not os.path.exists(path): return None
+    import socket
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError, PermissionError, socket.timeout):
+        client.close()
+        return None
+    with client:
+        message = {'op': op, 'nums': list(nums), 'format': output_format, 'exclude': [os.getpid()], **options}
+        response = bytearray()
+        try:
+            client.sendall(json.dumps(message).encode() + b"\n")
+            for chunk in iter(lambda: client.recv(1 << 16), b''): response.extend(chunk)
+        except (socket.timeout, ConnectionResetError, BrokenPipeError): pass   # the status line decides below
+    header, _, body = bytes(response).partition(b"\n")
+    try:
+        status = json.loads(header)
+        return status['status'], status['stderr'], body
+    except (ValueError, KeyError, TypeError): return None    # daemon died or hung before answering
+
+
+def run_client(path, op, nums=(), output_format='text', **options):
+    '''Forward a request and replay the daemon's output. Returns the exit status, or None if no daemon answered.'''
+    result = request(path, op, nums, output_format, **options)
+    if result is None: return None
+    status, stderr, body = result
+    sys.stdout.buffer.write(body)
+    sys.stdout.flush()
+    if stderr: sys.stderr.write(stderr)
+    return status
+
+
+# --- Server ---
+class SnapshotCache():
+    '''
+    Parsed snapshots kept by the daemon: the recent newest snapshots are always kept, older ones in an LRU of
+    capacity entries. Entries are keyed on the catalog entry too, so snapshots rewritten on disk (convert,
+    compact, another writer) are parsed again.
+    '''
+    def __init__(self, catalog, capacity=16, recent=4):
+        self.catalog = catalog
+        self.capacity = capacity
+        self.recent = recent
+        self._snapshots = OrderedDict()    # num -> (entry key, process list), least recently used first
+        self.live = None                   # (capture time, process list) used instead of a fresh capture
+        self.hits = self.misses = 0
+
+    def get(self, num):
+        '''The cached process list of snapshot num, or None.'''
+        cached = self._snapshots.get(num)
+        if cached is None or cached[0] != self.__key(num):
+            self.misses += 1
+            return None
+        self._snapshots.move_to_end(num)
+        self.hits += 1
+        return cached[1]
+
+    def put(self, num, ps_list):
+        self._snapshots[num] = (self.__key(num), ps_list)
+        self._snapshots.move_to_end(num)
+        self.__evict()
+
+    def __key(self, num):
+        entry = self.catalog.get(num)
+        return None if entry is None else (entry['time'], entry['size'])
+
+    def __evict(self):
+        recent = set(self.catalog.nums()[-self.recent:]) if self.recent else set()
+        older = [num for num in self._snapshots if num not in recent]
+        for num in older[:max(0, len(older) - self.capacity)]: del self._snapshots[num]
+
+
+class PsdiffDaemon():
+    def __init__(self, psdiff, interval=5.0, capacity=16, recent=4):
+        self.psdiff = psdiff
+        self.interval = interval
+        self.path = socket_path(psdiff.snapshot_dir, psdiff.snapshot_prefix)
+        self.cache = SnapshotCache(psdiff.catalog, capacity, recent)
+        self._scheduled = None     # (capture time, process list) of the last scheduled capture
+        self._next_capture = 0.0
+
+    def serve(self, count=None):
+        '''Listen on the socket until interrupted (or until count requests were answered).'''
+        import socketserver   # only the daemon needs it (and socket)
+        daemon = self
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                daemon.handle(self.rfile, self.wfile)
+
+        class _Server(socketserver.UnixStreamServer):
+            def service_actions(self):
+                daemon.tick()
+
+        import signal
+        try: signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))   # unlink the socket on kill as well
+        except ValueError: pass     # not the main thread
+        self.psdiff.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self.__remove_stale_socket()
+        self.psdiff.snapshot_cache = self.cache
+        with _Server(self.path, _Handler) as server:
+            print(f"psdiff daemon listening on {self.path}", file=sys.stderr)
+            try:
+                if count is None: server.serve_forever(poll_interval=min(0.5, self.interval or 0.5))
+                else:
+                    for _ in range(count): server.handle_request()
+            finally:
+                if os.path.exists(self.path): os.unlink(self.path)
+
+    def tick(self):
+        '''Take the scheduled capture when it is due.'''
+        if not self.interval or time.monotonic() < self._next_capture: return
+        self._scheduled = (time.monotonic(), self.psdiff.capture())
+        self._next_capture = time.monotonic() + self.interval
+
+    def handle(self, rfile, wfile):
+        '''Answer one request: read the JSON line, run the command with stdout/stderr captured, reply.'''
+        import contextlib
+        import io
+        line = rfile.readline()
+        if not line: return     # connection probe (see __remove_stale_socket)
+        stdout, stderr, status = io.StringIO(), io.StringIO(), 0
+        try:
+            message = json.loads(line)
+            op, nums = message['op'], [int(num) for num in message.get('nums', [])]
+            exclude = {int(pid) for pid in message.get('exclude', [])}
+            options = {option: bool(message.get(option)) for option in DIFF_OPTIONS}
+            if op not in OPS: raise ValueError(f"unknown op {op!r}")
+        except (ValueError, KeyError, TypeError) as e:
+            status = 2
+            stderr.write(f"bad request: {e}\n")
+        else:
+            self.psdiff.catalog.refresh()
+            self.psdiff.output_format = message.get('format', 'text')
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try: self.__run(op, nums, exclude, options)
+                except SystemExit as e:
+                    if isinstance(e.code, str): print(e.code, file=sys.stderr)
+                    status = 0 if e.code is None else (e.code if isinstance(e.code, int) else 1)
+                except Exception as e:   # e.g. a truncated snapshot: answer it, the daemon keeps serving
+                    print(f"psdiff daemon: {type(e).__name__}: {e}", file=sys.stderr)
+                    status = 1
+                finally: self.cache.live = None
+        wfile.write(json.dumps({'status': status, 'stderr': stderr.getvalue()}).encode() + b"\n")
+        wfile.write(stdout.getvalue().encode('utf-8', 'surrogateescape'))
+
+    def __run(self, op, nums, exclude, options):
+        if (op == 'print' and not nums) or (op == 'diff' and len(nums) < 2) or op == 'save':
+            # saves, and every request when there is no schedule, capture fresh; that also renews the scheduled capture
+            if op == 'save' or not self.interval or self._scheduled is None:
+                self._scheduled = (time.monotonic(), self.psdiff.capture())
+            self._scheduled = (self._scheduled[0], [proc for proc in self._scheduled[1] if proc['pid'] not in exclude])
+            self.cache.live = self._scheduled
+        if op == 'print': self.psdiff.print_snapshot(*nums[:1])
+        elif op == 'diff': self.psdiff.print_diff(*nums[:2], **options)
+        else: self.psdiff.create_snapshot(*nums[:1])
+
+    def __remove_stale_socket(self):
+        '''Remove a socket left by a daemon that exited uncleanly. Exits if another daemon is still listening.'''
+        if not os.path.exists(self.path): return
+        import socket
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        sys.exit(f"a psdiff daemon is already listening on {self.path}")
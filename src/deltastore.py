@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+'''
+Delta snapshot files.
+
+A delta snapshot stores only the differences from a base snapshot:
+  #psdiff-delta base=<num> [fields=<field>,<field>,...] [cmdlines=refs]
+  -<row>   removed process (row as it was in the base)
+  +<row>   added process
+  <<row>   changed process, row as it was in the base
+  ><row>   changed process, row as it is now (always follows its < line)
+
+Rows use the regular snapshot line format, with the columns of the listed fields (the default field set
+when there is no fields= part). With cmdlines=refs the cmdline column holds cmdline store references
+(see cmdlinestore). Because removed and changed rows keep their old values,
+deltas can be composed and diffed against each other without reconstructing the full process list.
+'''
+from diffengine import DiffEntry, field_deltas, REMOVED, ADDED, CHANGED
+
+DELTA_HEADER = b"#psdiff-delta"
+
+
+def is_delta_snapshot(path):
+    '''True if the file starts with the delta header.'''
+    with open(path, 'rb') as f: return f.read(len(DELTA_HEADER)) == DELTA_HEADER
+
+
+def read_delta_header(path):
+    '''Return (base snapshot number, field list or None) from a delta file header.'''
+    with open(path, 'r') as f: return _parse_header(f.readline())[:2]
+
+
+def write_delta(entries, base, output_file, format_row, fields=None, cmdline_refs=False):
+    '''
+    Write DiffEntry records as a delta of snapshot base. Returns the number of entries written.
+    :param fields: field list of the rows, recorded in the header. None for the default field set.
+    :param cmdline_refs: format_row writes cmdline store references, recorded in the header.
+    '''
+    count = 0
+    with open(output_file, 'w') as f:
+        f.write(f"{DELTA_HEADER.decode()} base={base}" + (f" fields={','.join(fields)}" if fields else "") +
+                (" cmdlines=refs" if cmdline_refs else "") + "\n")
+        for entry in entries:
+            if entry.kind == REMOVED: f.write("-" + format_row(entry.old) + "\n")
+            elif entry.kind == ADDED: f.write("+" + format_row(entry.new) + "\n")
+            else: f.write("<" + format_row(entry.old) + "\n>" + format_row(entry.new) + "\n")
+            count += 1
+    return count
+
+
+def read_delta(path, parse_row):
+    '''
+    Read a delta file. parse_row(row, fields, cmdline_refs) parses one row.
+    Returns (base, list of DiffEntry in pid order).
+    '''
+    entries = []
+    with open(path, 'r') as f:
+        base, fields, cmdline_refs = _parse_header(f.readline())
+        old = None
+        for line in f:
+            kind, row = line[0], parse_row(line[1:], fields, cmdline_refs)
+            if kind == '-': entries.append(DiffEntry(REMOVED, row, None, {}))
+            elif kind == '+': entries.append(DiffEntry(ADDED, None, row, {}))
+            elif kind == '<': old = row
+            elif kind == '>': entries.append(DiffEntry(CHANGED, old, row, field_deltas(old, row)))
+    return base, entries
+
+
+def apply_delta(procs, entries):
+    '''Apply delta entries to a pid -> process dict in place.'''
+    for entry in entries:
+        if entry.kind == REMOVED: procs.pop(entry.old['pid'], None)
+        else: procs[entry.new['pid']] = entry.new
+    return procs
+
+
+def compose(deltas):
+    '''
+    Fold a chain of delta entry lists (oldest first) into pid -> (row at start, row at end).
+    None means the process does not exist at that end of the chain.
+    '''
+    composed = {}
+    for entries in deltas:
+        for entry in entries:
+            pid = (entry.old or entry.new)['pid']
+            start = composed[pid][0] if pid in composed else entry.old
+            composed[pid] = (start, entry.new)
+    return composed
+
+
+def diff_composed(to_a, to_b):
+    '''
+    Diff snapshot a against snapshot b given both composed from a common ancestor.
+    Only processes touched by either chain are visited. Yields DiffEntry in pid order.
+    '''
+    for pid in sorted(to_a.keys() | to_b.keys()):
+        old = to_a[pid][1] if pid in to_a else to_b[pid][0]
+        new = to_b[pid][1] if pid in to_b else to_a[pid][0]
+        if old is None and new is None: continue
+        if old is None: yield DiffEntry(ADDED, None, new, {})
+        elif new is None: yield DiffEntry(REMOVED, old, None, {})
+        else:
+            deltas = field_deltas(old, new)
+            if deltas: yield DiffEntry(CHANGED, old, new, deltas)
+
+
+def _parse_header(header):
+    '''Split a '#psdiff-delta base=N [fields=a,b] [cmdlines=refs]' line into (N, [a, b] or None, cmdline refs).'''
+    options = dict(part.split('=', 1) for part in header.split()[1:])
+    return int(options['base']), (options['fields'].split(',') if 'fields' in options else None), options.get('cmdlines') == 'refs'
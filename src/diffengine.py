@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+'''
+Streaming, pid keyed merge-join diff of two process lists.
+
+Both inputs must be sorted by pid (snapshots are written and loaded that way). They are walked once,
+in lockstep, so the diff is linear in the combined length and holds only the current row of each side.
+'''
+from collections import namedtuple
+
+REMOVED = '-'
+ADDED = '+'
+CHANGED = '~'
+RESTARTED = '>'   # a removed and an added process of the same program, see identity
+
+# kind is REMOVED, ADDED, CHANGED or RESTARTED. old/new are the process dicts (None on the side where it is missing).
+# deltas maps field -> (old value, new value) for CHANGED entries and is empty otherwise.
+DiffEntry = namedtuple('DiffEntry', ['kind', 'old', 'new', 'deltas'])
+
+_END = object()
+
+
+def merge_diff(old_procs, new_procs, key='pid', fields=None):
+    '''
+    Yield a DiffEntry for every process that was removed, added or changed between two pid sorted iterables.
+    :param fields: fields to compare. Defaults to every field the two rows have in common.
+    '''
+    old_iter, new_iter = iter(old_procs), iter(new_procs)
+    old = _next_sorted(old_iter, key, None)
+    new = _next_sorted(new_iter, key, None)
+    while old is not _END or new is not _END:
+        if new is _END or (old is not _END and old[key] < new[key]):
+            yield DiffEntry(REMOVED, old, None, {})
+            old = _next_sorted(old_iter, key, old)
+        elif old is _END or new[key] < old[key]:
+            yield DiffEntry(ADDED, None, new, {})
+            new = _next_sorted(new_iter, key, new)
+        else:
+            deltas = field_deltas(old, new, key, fields)
+            if deltas: yield DiffEntry(CHANGED, old, new, deltas)
+            old = _next_sorted(old_iter, key, old)
+            new = _next_sorted(new_iter, key, new)
+
+
+def field_deltas(old, new, key='pid', fields=None):
+    '''Return {field: (old value, new value)} for the fields that differ between two rows of the same process.'''
+    if fields is None:
+        if old == new: return {}    # one C-level tuple (records) or dict comparison for the common unchanged row
+        fields = [field for field in old if field != key and field in new]
+    return {field: (old[field], new[field]) for field in fields if old[field] != new[field]}
+
+
+def _next_sorted(iterator, key, previous):
+    '''Advance iterator, checking the pid ordering the merge depends on.'''
+    row = next(iterator, _END)
+    if row is not _END and previous is not None and row[key] <= previous[key]:
+        raise ValueError(f"diff input is not sorted by {key}: {previous[key]} then {row[key]}")
+    return row
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+'''
+Process field registry.
+
+Every field a snapshot can hold declares the /proc/<pid> source it is read from, a relative cost,
+the psutil attribute that provides it on other platforms and the value used when it cannot be read.
+Capture reads each source once per process for all requested fields sharing it.
+
+A snapshot's field set is the keys of its rows. pid, ppid, username, name and cmdline are always
+captured. gid has a column in the text and binary layouts, but it only counts as present (and is only
+compared in diffs) when it was requested; files without a field header hold a 0 placeholder.
+'''
+from collections import namedtuple
+
+# source: /proc/<pid> entry ('status', 'cmdline', 'stat' or the 'fd' directory), None for the pid itself.
+# cost: relative cost of reading the source (1 = one small file read). psutil_value: psutil value -> field value.
+Field = namedtuple('Field', ['name', 'source', 'cost', 'psutil_attr', 'psutil_value', 'missing', 'description'])
+
+def _same(value): return value
+
+FIELDS = {field.name: field for field in [
+    Field('pid', None, 0, 'pid', _same, -1, 'process id'),
+    Field('ppid', 'status', 1, 'ppid', _same, -1, 'parent process id'),
+    Field('gid', 'status', 1, 'gids', lambda gids: gids.real, 0, 'real group id'),
+    Field('username', 'status', 1, 'username', _same, '', 'user name of the real uid'),
+    Field('name', 'status', 1, 'name', _same, '', 'process name'),
+    Field('cmdline', 'cmdline', 1, 'cmdline', _same, '', 'command line'),
+    Field('rss', 'status', 1, 'memory_info', lambda mem: mem.rss, 0, 'resident set size in bytes'),
+    Field('cpu', 'stat', 1, 'cpu_times', lambda times: round(times.user + times.system, 2), 0.0, 'user + system cpu seconds'),
+    Field('threads', 'status', 1, 'num_threads', _same, 0, 'number of threads'),
+    Field('fds', 'fd', 5, 'num_fds', _same, -1, 'open file descriptors (-1 if not permitted)'),
+]}
+
+# fields captured when none are requested, and the columns every text/binary row has
+DEFAULT_FIELDS = ['pid', 'ppid', 'username', 'name', 'cmdline']
+LAYOUT_FIELDS = ['pid', 'ppid', 'gid', 'username', 'name', 'cmdline']
+EXTRA_FIELDS = [name for name in FIELDS if name not in LAYOUT_FIELDS]
+# first line of text snapshots whose field set is not DEFAULT_FIELDS: "#fields pid,ppid,...,rss"
+FIELDS_HEADER = "#fields "
+# line of text snapshots whose cmdline column holds cmdline store references (see cmdlinestore)
+REFS_HEADER = "#cmdline-refs"
+
+
+def resolve(requested=None):
+    '''Return the captured field list for requested field names: the defaults plus requested, in registry order.'''
+    requested = set(requested or [])
+    unknown = requested - FIELDS.keys()
+    if unknown: raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))} (available: {', '.join(FIELDS)})")
+    return [name for name in FIELDS if name in requested or name in DEFAULT_FIELDS]
+
+
+def fields_of(row):
+    '''The field list of a snapshot, from one of its rows (DEFAULT_FIELDS for an empty snapshot).'''
+    if row is None: return list(DEFAULT_FIELDS)
+    return [name for name in FIELDS if name in row]
+
+
+def sources(fields):
+    '''The /proc/<pid> sources that have to be read for fields.'''
+    return {FIELDS[name].source for name in fields if FIELDS[name].source is not None}
+
+
+def cost(fields):
+    '''Relative per-process capture cost of fields: each source is paid once, however many fields it provides.'''
+    costs = {}
+    for name in fields:
+        field = FIELDS[name]
+        if field.source is not None: costs[field.source] = max(costs.get(field.source, 0), field.cost)
+    return sum(costs.values())
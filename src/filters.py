@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+'''
+Process filter rules compiled into one matcher.
+
+config (dict or JSON file):
+  {"include": [rule, ...], "exclude": [rule, ...]}
+A process is kept if it matches any include rule (or there are none) and no exclude rule.
+A rule matches when all of its conditions match:
+  user           "root" or ["root", "daemon"]
+  name           "sshd", "kworker/*" (prefix) or a list of those
+  name_regex     regular expression searched in the name
+  cmdline_regex  regular expression searched in the cmdline
+  kernel_thread  true/false, kthreadd (pid 2) and its children
+  pid            pid, list of pids or "self" (the running psdiff)
+  subtree        pid whose whole process subtree (itself and all descendants) matches
+
+Rules without cmdline_regex are decided from pid, ppid, user and name alone, so capture backends can
+drop those processes before their cmdline is read.
+'''
+import json
+import os
+import re
+from operator import attrgetter, itemgetter
+
+DEFAULT_CONFIG = {'exclude': [{'user': 'root', 'name': 'kworker/*'}, {'pid': 'self'}]}
+
+KTHREADD_PID = 2
+
+# the fields early() decides on, and the ones keep() needs
+EARLY_FIELDS = ('pid', 'ppid', 'username', 'name')
+KEEP_FIELDS = EARLY_FIELDS + ('cmdline',)
+
+
+class ProcessFilter():
+    def __init__(self, config=None):
+        config = DEFAULT_CONFIG if config is None else config
+        self.subtree_roots = set()
+        self._include = [self.__compile_rule(rule) for rule in config.get('include', [])]
+        self._exclude = [self.__compile_rule(rule) for rule in config.get('exclude', [])]
+        # exclude rules that are decidable before the cmdline is known
+        self._early_exclude = [checks for checks, regex in self._exclude if regex is None]
+        self.needs_tree = bool(self.subtree_roots)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r') as f: return cls(json.load(f))
+
+    # --- Public methods ---
+    def subtree(self, parent_of):
+        '''Return the set of pids inside any configured subtree, given a pid -> ppid mapping.'''
+        if not self.subtree_roots: return frozenset()
+        inside = {}
+        for pid in parent_of:
+            chain = []
+            current = pid
+            while current not in inside:
+                if current in self.subtree_roots:
+                    inside[current] = True
+                    break
+                parent = parent_of.get(current)
+                if parent is None or parent == current or parent in chain or len(chain) > len(parent_of):
+                    inside[current] = False
+                    break
+                chain.append(current)
+                current = parent
+            for member in chain: inside[member] = inside[current]
+        return {pid for pid, member in inside.items() if member}
+
+    def early(self, pid, ppid, username, name, subtree=frozenset()):
+        '''False if the process is excluded whatever its cmdline is. True means it may be kept.'''
+        args = (pid, ppid, username, name, subtree)
+        for checks in self._early_exclude:
+            if all(check(*args) for check in checks): return False
+        if self._include:
+            return any(all(check(*args) for check in checks) for checks, _ in self._include)
+        return True
+
+    def keep(self, pid, ppid, username, name, cmdline, subtree=frozenset()):
+        '''Full decision for a process whose cmdline is known.'''
+        args = (pid, ppid, username, name, subtree)
+        def _matches(rule):
+            checks, regex = rule
+            return all(check(*args) for check in checks) and (regex is None or regex.search(cmdline) is not None)
+        if self._include and not any(_matches(rule) for rule in self._include): return False
+        return not any(_matches(rule) for rule in self._exclude)
+
+    def filter(self, ps_list, parent_of=None):
+        '''Filter a list of process rows (records.Process or dicts). parent_of defaults to the ppids of ps_list itself.'''
+        if not ps_list: return []
+        if parent_of is None and self.needs_tree: parent_of = {proc['pid']: proc['ppid'] for proc in ps_list}
+        subtree = self.subtree(parent_of) if self.needs_tree else frozenset()
+        # records are read by attribute: row['pid'] on a record is a Python level Mapping lookup
+        columns = (itemgetter if isinstance(ps_list[0], dict) else attrgetter)(*KEEP_FIELDS)
+        keep = self.keep
+        return [proc for proc in ps_list if keep(*columns(proc), subtree)]
+
+    # --- Internal methods ---
+    def __compile_rule(self, rule):
+        '''Turn a rule dict into (list of checks on pid/ppid/user/name/subtree, compiled cmdline regex or None).'''
+        def _as_list(value): return value if isinstance(value, list) else [value]
+        checks = []
+        if 'user' in rule:
+            users = frozenset(_as_list(rule['user']))
+            checks.append(lambda pid, ppid, username, name, subtree: username in users)
+        if 'name' in rule:
+            names = _as_list(rule['name'])
+            exact = frozenset(name for name in names if not name.endswith('*'))
+            prefixes = tuple(name[:-1] for name in names if name.endswith('*'))
+            checks.append(lambda pid, ppid, username, name, subtree: name in exact or name.startswith(prefixes))
+        if 'name_regex' in rule:
+            name_regex = re.compile(rule['name_regex'])
+            checks.append(lambda pid, ppid, username, name, subtree: name_regex.search(name) is not None)
+        if 'kernel_thread' in rule:
+            wanted = bool(rule['kernel_thread'])
+            checks.append(lambda pid, ppid, username, name, subtree: (pid == KTHREADD_PID or ppid == KTHREADD_PID) == wanted)
+        if 'pid' in rule:
+            pids = frozenset(os.getpid() if pid == 'self' else int(pid) for pid in _as_list(rule['pid']))
+            checks.append(lambda pid, ppid, username, name, subtree: pid in pids)
+        if 'subtree' in rule:
+            root = int(rule['subtree'])
+            self.subtree_roots.add(root)
+            checks.append(lambda pid, ppid, username, name, subtree: pid == root or pid in subtree)
+        unknown = set(rule) - {'user', 'name', 'name_regex', 'cmdline_regex', 'kernel_thread', 'pid', 'subtree'}
+        if unknown: raise ValueError(f"Unknown filter rule condition(s): {', '.join(sorted(unknown))}")
+        regex = re.compile(rule['cmdline_regex']) if 'cmdline_regex' in rule else None
+        return (checks, regex)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+'''
+Process lifetime index: an inverted index from process identity (pid, cmdline) to the snapshot
+intervals in which that process exists.
+
+It is persisted as an append-only event log. Each indexed snapshot appends the identities that
+appeared (+) or went away (-) compared with the previous indexed snapshot, followed by a marker line:
+  [num, "+", pid, cmdline]
+  [num, "-", pid, cmdline]
+  [num]
+Lifetime, range and churn queries are answered from these events without reading snapshot files.
+With the cmdline store enabled the cmdline of an event is written as {"ref": "@<hash>"} and resolved
+through the store when the log is loaded.
+'''
+import bisect
+import json
+from pathlib import Path
+
+
+class HistoryIndex():
+    def __init__(self, snapshot_dir: Path, snapshot_prefix: str, resolve=None):
+        self.path = snapshot_dir / f".{snapshot_prefix}.history"
+        self._resolve = resolve     # cmdline store reference -> cmdline, for events written with refs
+        self._events = None     # list of (num, kind, pid, cmdline) in snapshot order, loaded on first use
+        self._indexed = None    # snapshot numbers indexed so far, ascending
+        self._lifetimes = None  # (pid, cmdline) -> [[first, last], ...], built on the first lifetime query
+
+    # --- Public methods ---
+    def last(self):
+        '''Number of the last indexed snapshot, -1 if none.'''
+        self.__ensure_loaded()
+        return self._indexed[-1] if self._indexed else -1
+
+    def append(self, num, events, refs=None):
+        '''
+        Index snapshot num. events are (kind, pid, cmdline) tuples relative to the previous indexed snapshot.
+        refs: cmdline store references of the events' cmdlines, written instead of the text.
+        '''
+        self.__ensure_loaded()
+        stored = ({'ref': ref} for ref in refs) if refs is not None else (cmdline for _, _, cmdline in events)
+        lines = [json.dumps([num, kind, pid, cmdline]) for (kind, pid, _), cmdline in zip(events, stored)]
+        lines.append(json.dumps([num]))
+        with open(self.path, 'a') as f: f.write("\n".join(lines) + "\n")
+        self._events.extend((num, kind, pid, cmdline) for kind, pid, cmdline in events)
+        self._indexed.append(num)
+        self._lifetimes = None
+
+    def clear(self):
+        if self.path.exists(): self.path.unlink()
+        self._events, self._indexed, self._lifetimes = [], [], None
+
+    def lifetimes(self, pid=None, text=None):
+        '''
+        Return [(pid, cmdline, [(first, last), ...])] for the identities matching pid and/or a cmdline substring.
+        last is None while the process still exists in the last indexed snapshot.
+        '''
+        self.__ensure_loaded()
+        if self._lifetimes is None: self._lifetimes = self.__build_lifetimes()
+        return [(key[0], key[1], [tuple(span) for span in spans]) for key, spans in sorted(self._lifetimes.items())
+                if (pid is None or key[0] == pid) and (text is None or text in key[1])]
+
+    def changes(self, first, last):
+        '''
+        Net changes between snapshots first and last: [(kind, pid, cmdline, num)] in pid order, where num is the
+        snapshot in which the identity appeared (+) or the first snapshot it was missing from (-).
+        '''
+        self.__ensure_loaded()
+        low, high = min(first, last), max(first, last)
+        touched = {}
+        begin = bisect.bisect_right(self._events, low, key=lambda event: event[0])
+        end = bisect.bisect_right(self._events, high, key=lambda event: event[0])
+        for num, kind, pid, cmdline in self._events[begin:end]:
+            start = touched[(pid, cmdline)][0] if (pid, cmdline) in touched else kind
+            touched[(pid, cmdline)] = (start, kind, num)
+        result = []
+        for (pid, cmdline), (start, end, num) in sorted(touched.items()):
+            if start != end: continue   # appeared and went away again (or the reverse) inside the range
+            kind = end if first <= last else ('-' if end == '+' else '+')
+            result.append((kind, pid, cmdline, num))
+        return result
+
+    def churn(self, first=None, last=None):
+        '''Return [(num, added, removed)] for every indexed snapshot in [first, last].'''
+        self.__ensure_loaded()
+        counts = {num: [0, 0] for num in self._indexed
+                  if (first is None or num >= first) and (last is None or num <= last)}
+        for num, kind, pid, cmdline in self._events:
+            if num in counts: counts[num][0 if kind == '+' else 1] += 1
+        return [(num, added, removed) for num, (added, removed) in counts.items()]
+
+    # --- Internal methods ---
+    def __build_lifetimes(self):
+        '''Fold the event log into (pid, cmdline) -> [[first, last], ...] intervals.'''
+        lifetimes = {}
+        previous = {num: (self._indexed[i - 1] if i else None) for i, num in enumerate(self._indexed)}
+        for num, kind, pid, cmdline in self._events:
+            spans = lifetimes.setdefault((pid, cmdline), [])
+            if kind == '+': spans.append([num, None])
+            elif spans and spans[-1][1] is None: spans[-1][1] = previous[num]
+        return lifetimes
+
+    def __ensure_loaded(self):
+        if self._events is not None: return
+        self._events, self._indexed = [], []
+        if not self.path.exists(): return
+        pending = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try: record = json.loads(line)
+                except ValueError: continue     # torn line from an interrupted append
+                if len(record) > 1:
+                    if type(record[3]) is dict: record[3] = self._resolve(record[3]['ref'])
+                    pending.append(tuple(record))
+                    continue
+                # marker: commit the events of this snapshot, dropping leftovers of an interrupted append
+                self._events.extend(event for event in pending if event[0] == record[0])
+                self._indexed.append(record[0])
+                pending = []
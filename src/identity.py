@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+'''
+Restart detection: pairs removed and added processes that are the same program under a new pid.
+
+A process's identity is (username, name, normalized cmdline). The removals of a diff are indexed in a
+multimap identity -> removals (pid order), and each addition takes the first removal with its identity,
+so matching is one pass over the entries with no pairwise comparison. A matched pair becomes a single
+RESTARTED entry.
+
+config (dict or JSON file):
+  {"normalize": [{"pattern": regex, "replace": replacement}, ...]}
+The rules are applied in order (re.sub) to the cmdline before it is compared, e.g. to blank out temp
+paths or port numbers that change on every start. The default rules do both.
+'''
+import json
+import re
+from collections import deque
+from diffengine import DiffEntry, REMOVED, ADDED, RESTARTED, field_deltas
+
+DEFAULT_CONFIG = {'normalize': [
+    {'pattern': r'(/tmp|/var/tmp|/dev/shm)/\S*', 'replace': r'\1/*'},   # temp files and sockets
+    {'pattern': r'(--?port[= ]?|(?<!\S)-p ?)\d+', 'replace': r'\1*'},   # --port 8080, --port=8080, -p8080, -p 8080
+]}
+
+
+class IdentityMatcher():
+    def __init__(self, config=None):
+        config = DEFAULT_CONFIG if config is None else config
+        unknown = set(config) - {'normalize'}
+        if unknown: raise ValueError(f"unknown identity config key(s): {', '.join(sorted(unknown))}")
+        self._rules = []
+        for rule in config.get('normalize', []):
+            if set(rule) != {'pattern', 'replace'}: raise ValueError(f"normalize rules need pattern and replace: {rule!r}")
+            try: self._rules.append((re.compile(rule['pattern']), rule['replace']))
+            except re.error as e: raise ValueError(f"bad normalize pattern {rule['pattern']!r}: {e}")
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r') as f: return cls(json.load(f))
+
+    # --- Public methods ---
+    def normalize(self, cmdline):
+        '''The cmdline with every normalize rule applied.'''
+        for pattern, replace in self._rules: cmdline = pattern.sub(replace, cmdline)
+        return cmdline
+
+    def identity(self, proc):
+        '''Hashable identity of a process: (username, name, normalized cmdline).'''
+        return (proc['username'], proc['name'], self.normalize(proc['cmdline']))
+
+    def match(self, entries):
+        '''
+        Replace each removal/addition pair with the same identity by one RESTARTED entry, placed where the
+        addition was. Its deltas hold every field that differs, pid included. Other entries pass through in order.
+        '''
+        entries = list(entries)
+        removals = {}
+        for index, entry in enumerate(entries):
+            if entry.kind == REMOVED: removals.setdefault(self.identity(entry.old), deque()).append(index)
+        matched = set()
+        for index, entry in enumerate(entries):
+            if entry.kind != ADDED: continue
+            candidates = removals.get(self.identity(entry.new))
+            if not candidates: continue
+            removal = candidates.popleft()
+            matched.add(removal)
+            old = entries[removal].old
+            entries[index] = DiffEntry(RESTARTED, old, entry.new, field_deltas(old, entry.new, key=None))
+        return [entry for index, entry in enumerate(entries) if index not in matched]
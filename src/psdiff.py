@@ -1,59 +1,337 @@
 #!/usr/bin/env python3
 import json
-import logging
 import os
 import sys
-import argparse
-import psutil
+import time
+import functools
+from operator import itemgetter
 from pathlib import Path
 import shlex
-from collections import OrderedDict
-from urllib.parse import quote, unquote
-
-import urllib
+from binformat import BinarySnapshot, is_binary_snapshot, write_binary_snapshot
+from catalog import Catalog
+from history import HistoryIndex
+from timings import Timings
+from diffengine import merge_diff, DiffEntry, REMOVED, ADDED, RESTARTED
+from deltastore import write_delta, read_delta, apply_delta, compose, diff_composed, is_delta_snapshot
+from fields import DEFAULT_FIELDS, EXTRA_FIELDS, FIELDS, FIELDS_HEADER, REFS_HEADER, cost, fields_of, resolve
 
 def DEBUG(string):
     print(string)
 
 
+_decode_json = json.JSONDecoder().raw_decode
+
+# --- Process pool workers (load_many / diff_series) ---
+_worker_psdiff = None
+
+def _init_worker(script_dir, snapshot_dir_name, snapshot_prefix):
+    '''Give each pool process its own Psdiff on the same snapshot directory.'''
+    global _worker_psdiff
+    _worker_psdiff = Psdiff(script_dir, snapshot_dir_name, snapshot_prefix)
+
+def _load_worker(num, psdiff=None):
+    return (psdiff or _worker_psdiff)._Psdiff__load_list(num)
+
+def _diff_worker(pair, psdiff=None):
+    return list((psdiff or _worker_psdiff)._Psdiff__get_saved_diff(*pair))
+
+
 class Psdiff():
     def __init__(self, 
                  script_dir: Path, 
                  snapshot_dir_name: str =".psdiff", 
                  snapshot_prefix: str = "ps", 
-                 max_bytes: int = 10*1024*1024):   
+                 max_bytes: int = 10*1024*1024,
+                 backend = 'auto',
+                 snapshot_format: str = 'text',
+                 keyframe_every: int = 0,
+                 output_format: str = 'text',
+                 filter_config = None,
+                 fields = None,
+                 identity_config = None,
+                 fsync_every: int = 0,
+                 cmdline_store: bool = False):   
             
         self.script_dir = script_dir if script_dir is not None else Path(__file__).resolve().parent
         self.snapshot_dir = self.script_dir / snapshot_dir_name
         self.snapshot_prefix = snapshot_prefix
         self.max_bytes = max_bytes  # 10MB default. Generates a warning if snapshot dir exceeds this size.
-        if not self.snapshot_dir.exists(): self.snapshot_dir.mkdir()
+        self._backend = backend  # backend name or instance, resolved on first capture
+        self.snapshot_format = snapshot_format  # 'text' (legacy ps.N lines) or 'binary'. Reads auto-detect either.
+        self.keyframe_every = keyframe_every  # 0 saves full snapshots. N saves a full keyframe every N snapshots, deltas between.
+        self._last_saved = None  # (num, ps_list) of the last snapshot this instance saved, base for the next delta
+        self.output_format = output_format  # 'text' (padded columns), 'tsv' or 'ndjson' for print/diff output
+        self._filter_config = filter_config  # rules dict, path of a JSON rules file, or None for <snapshot_dir>/filters.json / defaults
+        self._process_filter = None  # ProcessFilter compiled from _filter_config on first capture
+        self._identity_config = identity_config  # restart matching rules dict, JSON file path, or None for <snapshot_dir>/identity.json / defaults
+        self._identity_matcher = None  # IdentityMatcher compiled from _identity_config on first use
+        self.fields = resolve(fields)  # captured fields: DEFAULT_FIELDS plus requested ones (rss, cpu, ...), registry order
+        self._record_type = None  # records.Process class of captured rows, see record_type
+        self._defaults = [(field, FIELDS[field].missing) for field in self.fields]  # (field, value when not captured)
+        self.snapshot_cache = None  # daemon.SnapshotCache of parsed snapshots and the scheduled live capture, set by serve()
+        self.timings = Timings()  # per-stage wall/CPU measurements, disabled until enabled or a hook is added
+        self.catalog = Catalog(self.snapshot_dir, snapshot_prefix)  # manifest of saved snapshots
+        self._fsync_every = fsync_every  # 0 leaves flushing to the OS, N fsyncs snapshot files and the catalog every N writes
+        self._sync = None  # atomicio.SyncBatch built from _fsync_every on the first write
+        self.history = HistoryIndex(self.snapshot_dir, snapshot_prefix, self.__resolve_cmdline)  # process lifetimes, caught up on query
+        if cmdline_store and snapshot_format == 'binary': raise ValueError("the cmdline store works with text snapshots and deltas, not binary")
+        self.cmdline_store = cmdline_store  # True writes cmdlines once into the shared store and references them from snapshots
+        self._cmdlines = None  # cmdlinestore.CmdlineStore, opened on first use
        
+    @property
+    def backend(self):
+        '''The capture backend. Resolved lazily so file-only operations never load a capture module.'''
+        if isinstance(self._backend, str):
+            from capture import get_backend
+            self._backend = get_backend(self._backend)
+        return self._backend
+
+    @property
+    def process_filter(self):
+        '''The compiled capture filter. Built on first use from filter_config, <snapshot_dir>/filters.json or the defaults.'''
+        if self._process_filter is None:
+            from filters import ProcessFilter
+            config = self._filter_config
+            if config is None and (self.snapshot_dir / "filters.json").exists(): config = self.snapshot_dir / "filters.json"
+            if isinstance(config, (str, Path)):
+                try: self._process_filter = ProcessFilter.from_file(config)
+                except (OSError, ValueError) as e: sys.exit(f"Error reading filter config {config}: {e}")
+            else:
+                self._process_filter = ProcessFilter(config)
+        return self._process_filter
+
+    @property
+    def identity_matcher(self):
+        '''The restart matcher. Built on first use from identity_config, <snapshot_dir>/identity.json or the defaults.'''
+        if self._identity_matcher is None:
+            config = self._identity_config
+            if config is None and (self.snapshot_dir / "identity.json").exists(): config = self.snapshot_dir / "identity.json"
+            from identity import IdentityMatcher
+            try:
+                if isinstance(config, (str, Path)): self._identity_matcher = IdentityMatcher.from_file(config)
+                else: self._identity_matcher = IdentityMatcher(config)
+            except (OSError, ValueError) as e: sys.exit(f"Error reading identity config {config}: {e}")
+        return self._identity_matcher
+
+    @property
+    def record_type(self):
+        '''The records.Process class of captured rows (self.fields).'''
+        if self._record_type is None:
+            from records import record_type
+            self._record_type = record_type(self.fields)
+        return self._record_type
+
+    @property
+    def sync(self):
+        '''The fsync batch of written snapshot files and the catalog.'''
+        if self._sync is None:
+            from atomicio import SyncBatch
+            self._sync = SyncBatch(self._fsync_every)
+        return self._sync
+
+    @property
+    def cmdlines(self):
+        '''The cmdline store of the snapshot directory. Opened on first use, read only as snapshots need it.'''
+        if self._cmdlines is None:
+            from cmdlinestore import CmdlineStore
+            self._cmdlines = CmdlineStore(self.snapshot_dir, self.snapshot_prefix)
+        return self._cmdlines
+
     # --- Public methods ---
+    def capture(self):
+        '''Capture, filter and sort the current process list.'''
+        return self.__create_ps_snapshot()
+
     def create_snapshot(self, num=None):
         '''Create a new snapshot of the current process list.'''
-        outfile = self.__create_snapshot_path(num) 
-        self.__write_snapshot_to_file(self.__create_ps_snapshot(), outfile)
+        outfile = self.__save_snapshot(self.__create_ps_snapshot(), num)
         print(f"snapshot created: {outfile}")
         return outfile
     
     def print_snapshot(self, num=None):
         '''Prints a snapshot that was saved or the current snapshot'''       
         ps_list = self.__create_ps_snapshot() if (num is None) else self.__load_saved_snapshot(num)
-        print("\n")
-        for proc in ps_list: print( self.__line_formatter_display(proc) )
+        try:
+            with self.timings.stage('output') as stage:
+                stage.records = self.__write_lines(self.__render_snapshot(ps_list))
+        finally: self.__close(ps_list)
 
-    def print_diff(self, num1 = None, num2 = None):
-        list1 = self.__load_saved_snapshot(num1) 
-        list2 = self.__load_saved_snapshot(num2) if (num2 != None) else self.__create_ps_snapshot()
+    def print_diff(self, num1 = None, num2 = None, tree=False, details=False, restarts=False):
+        '''
+        Print a diff. tree groups it by subtree into one summary per group, details adds the diff lines of each group.
+        restarts reports removed/added pairs of the same program (see identity_matcher) as one restarted entry.
+        '''
+        if tree:
+            from treediff import tree_diff
+            old = self.__load_list(num1)
+            new = self.__create_ps_snapshot() if num2 is None else self.__load_list(num2)
+            with self.timings.stage('diff+output') as stage:
+                changes = tree_diff(self.__get_diff(old, new), {proc['pid']: proc for proc in old}, {proc['pid']: proc for proc in new})
+                stage.records = lines = self.__write_lines(self.__render_tree(changes, details))
+        else:
+            if (num2 != None):
+                entries = self.__get_saved_diff(num1, num2)
+            else:
+                entries = self.__closing_diff(self.__load_saved_snapshot(num1), self.__create_ps_snapshot())
+            if restarts: entries = self.identity_matcher.match(entries)
 
-        (diff1,diff2) = self.__get_diff(list1, list2)
-        if not diff1 and not diff2: 
+            with self.timings.stage('diff+output') as stage:
+                stage.records = lines = self.__write_lines(self.__render_diff(entries))
+        if not lines and self.output_format == 'text':
             print ("No differences found.")
-        else:
-            for proc in diff1: print( "-" + self.__line_formatter_display(proc) )
-            for proc in diff2: print( "+" + self.__line_formatter_display(proc) )
 
+    def watch(self, interval: float = 1.0, count=None, persist_every=None, full_every: int = 0):
+        '''
+        Sample the process list every interval seconds and yield the DiffEntry list of each tick.
+        The previous sample is kept in memory: a tick lists the running pids and only reads processes that
+        appeared, so its cost follows the churn. Every full_every ticks (0: never) a full capture also catches
+        processes that changed in place (exec, setuid), at the cost of reading every process on that tick.
+        Every persist_every ticks the sample is saved.
+        :param count: number of ticks to run, None runs forever.
+        '''
+        sample = {proc['pid']: proc for proc in self.__create_ps_snapshot()}
+        rejected = set()  # running pids the filter excluded, skipped by the incremental ticks
+        tick = 0
+        while count is None or tick < count:
+            time.sleep(interval)
+            tick += 1
+            if full_every and tick % full_every == 0:
+                current = self.__create_ps_snapshot()
+                entries = list(self.__get_diff([sample[pid] for pid in sorted(sample)], current))
+                sample = {proc['pid']: proc for proc in current}
+                rejected.clear()   # decided again in case they changed in place
+            else:
+                entries = self.__watch_tick(sample, rejected)
+            if persist_every and tick % persist_every == 0:
+                self.__save_snapshot([sample[pid] for pid in sorted(sample)])
+            yield entries
+
+    def print_watch(self, interval: float = 1.0, count=None, persist_every=None, full_every=0):
+        '''Print the deltas produced by watch() as they happen.'''
+        for entries in self.watch(interval, count, persist_every, full_every):
+            self.__write_lines(self.__render_diff(entries))
+
+    def convert_snapshot(self, num, snapshot_format='binary'):
+        '''Rewrite a saved snapshot in another format ('text' or 'binary').'''
+        path = self.__get_snapshot_path(num)
+        ps_list = self.__load_list(num)
+        self.__write_atomic(num, lambda tmp: self.__write_snapshot_to_file(ps_list, tmp, snapshot_format))
+        self.catalog.add(num, path.stat().st_size, len(ps_list), snapshot_format, **self.__catalog_fields(ps_list))
+        if self.cmdline_store: self.cmdlines.confirm()
+        self.sync.add(path, self.catalog.path)
+        print(f"snapshot {num} converted to {snapshot_format}: {path}")
+        return path
+
+    def find_process(self, num, pid):
+        '''Look up a single pid in a saved snapshot. Binary snapshots only touch the matching record.'''
+        ps_list = self.__load_saved_snapshot(num)
+        if isinstance(ps_list, BinarySnapshot):
+            with ps_list: return ps_list.find(pid)
+        return next((proc for proc in ps_list if proc['pid'] == pid), None)
+
+    def compact(self, before=None):
+        '''
+        Rebase delta snapshots (numbered below before, default all) directly onto their keyframe so they
+        reconstruct from two files. A delta that has grown to half the size of its snapshot is merged
+        into a new keyframe instead.
+        '''
+        rebased = merged = 0
+        for num in self.catalog.nums():
+            if before is not None and num >= before: break
+            chain = self.__delta_chain(num)
+            if len(chain) <= 2: continue
+            composed = compose(read_delta(self.__get_snapshot_path(n), self.__line_formatter_read_file)[1] for n in chain[1:])
+            entry = self.catalog.get(num)
+            path = self.__get_snapshot_path(num)
+            fields = {'fields': entry['fields']} if 'fields' in entry else {}
+            if len(composed) * 2 >= self.catalog.get(chain[0])['records']:
+                ps_list = self.__load_list(num)
+                self.__write_atomic(num, lambda tmp: self.__write_snapshot_to_file(ps_list, tmp))
+                self.catalog.add(num, path.stat().st_size, len(ps_list), self.snapshot_format, timestamp=entry['time'], **fields)
+                merged += 1
+            else:
+                _, _, count = self.__write_atomic(num, lambda tmp: write_delta(diff_composed({}, composed), chain[0], tmp,
+                                                                          self.__line_formatter_write_file, fields.get('fields'), self.cmdline_store))
+                self.catalog.add(num, path.stat().st_size, count, 'delta', timestamp=entry['time'], base=chain[0], **fields)
+                rebased += 1
+            self.sync.add(path, self.catalog.path)
+        print(f"compacted: {rebased} deltas rebased, {merged} merged into keyframes")
+        return (rebased, merged)
+
+    def list_snapshots(self):
+        '''Return the numbers of all saved snapshots in ascending order.'''
+        return self.catalog.nums()
+
+    def reindex(self):
+        '''Rebuild the snapshot catalog from the snapshot directory, e.g. after files were copied or removed by hand.'''
+        count = self.catalog.reindex()
+        self.history.clear()
+        self.__update_history()
+        print(f"catalog rebuilt: {count} snapshots")
+        return count
+
+    def print_history(self, pid=None, text=None):
+        '''Print when the processes matching pid and/or cmdline text existed, as snapshot intervals.'''
+        self.__update_history()
+        lifetimes = self.history.lifetimes(pid, text)
+        if not lifetimes: print("No matching processes found.")
+        for proc_pid, cmdline, spans in lifetimes:
+            intervals = ", ".join(f"{first}-{'' if last is None else last}" for first, last in spans)
+            print(f"{proc_pid:>6} {intervals:<16} {cmdline or repr(cmdline)}")
+
+    def print_range(self, num1, num2):
+        '''Print the processes that appeared (+) or went away (-) between two snapshots, from the lifetime index.'''
+        self.__update_history()
+        changes = self.history.changes(num1, num2)
+        if not changes: print ("No differences found.")
+        for kind, pid, cmdline, num in changes: print(f"{kind}{pid:>6} {num:>6} {cmdline or repr(cmdline)}")
+
+    def load_many(self, nums, workers=None, chunksize=1):
+        '''
+        Load several saved snapshots in parallel with a process pool.
+        :return: list of process lists, in the order of nums.
+        '''
+        nums = list(nums)
+        for num in nums: self.__get_snapshot_path(num)
+        return list(self.__map_parallel(_load_worker, nums, workers, chunksize))
+
+    def diff_series(self, nums, workers=None, chunksize=1):
+        '''
+        Diff each consecutive pair of saved snapshots in nums in parallel with a process pool.
+        :return: generator of ((num1, num2), DiffEntry list), in the order of nums.
+        '''
+        nums = list(nums)
+        for num in nums: self.__get_snapshot_path(num)
+        pairs = list(zip(nums, nums[1:]))
+        return zip(pairs, self.__map_parallel(_diff_worker, pairs, workers, chunksize))
+
+    def print_series(self, first, last, workers=None, chunksize=1):
+        '''Print the diffs between consecutive saved snapshots numbered first..last.'''
+        nums = [num for num in self.catalog.nums() if first <= num <= last]
+        text = self.output_format == 'text'
+        for (num1, num2), entries in self.diff_series(nums, workers, chunksize):
+            if text: print(f"=== {num1} -> {num2} ===")
+            if not self.__write_lines(self.__render_diff(entries)) and text: print ("No differences found.")
+
+    def serve(self, interval: float = 5.0, cache_size: int = 16, count=None):
+        '''
+        Run the psdiff daemon on <snapshot_dir>/.<prefix>.sock: parsed snapshots stay in memory, the live process
+        list is captured every interval seconds, and print/diff/save requests from the CLI are answered from them.
+        '''
+        from daemon import PsdiffDaemon
+        PsdiffDaemon(self, interval, cache_size).serve(count)
+
+    def print_fields(self):
+        '''Print the field registry: source, relative capture cost and whether the field is captured.'''
+        for field in FIELDS.values():
+            captured = '*' if field.name in self.fields else ' '
+            print(f"{captured} {field.name:<10} {field.source or '-':<8} {field.cost:>4}  {field.description}")
+        print(f"capture cost per process: {cost(self.fields)}")
+
+    def print_churn(self, first=None, last=None):
+        '''Print how many processes appeared and went away in each snapshot.'''
+        self.__update_history()
+        for num, added, removed in self.history.churn(first, last): print(f"{num:>6} +{added:<6} -{removed:<6}")
 
     def delete_snapshots(self):
         '''
@@ -61,87 +339,299 @@ class Psdiff():
         '''
         for file in self.snapshot_dir.glob(f"{self.snapshot_prefix}.*"):
             if file.is_file(): file.unlink()
+        for file in self.snapshot_dir.glob(f".{self.snapshot_prefix}.*.tmp"): file.unlink()   # left by interrupted writers
+        self.catalog.clear()
+        self.history.clear()
+        self.cmdlines.clear()
+
+    def remove_snapshot(self, num):
+        '''
+        Delete one saved snapshot and drop the cmdlines no remaining snapshot references from the cmdline store.
+        A snapshot that deltas are based on is kept (run compact or remove the deltas first).
+        '''
+        self.catalog.refresh()
+        path = self.__get_snapshot_path(num)
+        dependents = self.__delta_dependents(num)
+        if dependents: sys.exit(f"Snapshot {num} is the base of delta snapshots {', '.join(map(str, dependents))}, not removed.")
+        path.unlink(missing_ok=True)
+        self.catalog.remove(num)
+        if num <= self.history.last(): self.history.clear()   # rebuilt from the remaining snapshots on the next query
+        if self._last_saved and self._last_saved[0] == num: self._last_saved = None
+        dropped = self.cmdlines.gc(self.__live_cmdline_refs)
+        print(f"snapshot {num} removed" + (f", {dropped} unreferenced cmdlines dropped" if dropped else ""))
 
      # --- Internal Method -> Print diff ---
     def __get_diff(self, lista, listb):
         '''
-        Find symmetric difference between two lists of dicts by converting dicts to tuples of sorted items.
+        Merge-join two pid sorted process lists. Yields DiffEntry(kind, old, new, deltas) for removed,
+        added and changed processes in pid order.
         '''
-        def _dict_to_tuple(d): return tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in d.items())
-        #def _dict_to_tuple(d): return tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in d.items()))
-        def _tuple_to_dict(t): return {k: list(v) if isinstance(v, tuple) else v for k, v in t}
-        
-        #region body
-        set_a = set(_dict_to_tuple(d) for d in lista)
-        set_b = set(_dict_to_tuple(d) for d in listb)
+        return merge_diff(lista, listb)
 
-        only_in_a_tuples = set_a - set_b
-        only_in_b_tuples = set_b - set_a
-            
-        only_in_a = sorted( (_tuple_to_dict(t) for t in only_in_a_tuples), key=lambda d: d['pid'])
-        only_in_b = sorted((_tuple_to_dict(t) for t in only_in_b_tuples), key=lambda d: d['pid'] )
+    def __get_saved_diff(self, num1, num2):
+        '''
+        Diff two saved snapshots. When both belong to the same keyframe chain only the deltas after their
+        common ancestor are read, otherwise both are reconstructed and merge-joined.
+        '''
+        if num1 is None: num1 = self.__get_last_snapshot_number()
+        self.__get_snapshot_path(num1)
+        self.__get_snapshot_path(num2)
+        chain1, chain2 = self.__delta_chain(num1), self.__delta_chain(num2)
+        if chain1[0] != chain2[0]:
+            return self.__closing_diff(self.__load_saved_snapshot(num1), self.__load_saved_snapshot(num2))
+        common = 0
+        while common < min(len(chain1), len(chain2)) and chain1[common] == chain2[common]: common += 1
+        def _compose(chain): return compose(read_delta(self.__get_snapshot_path(n), self.__line_formatter_read_file)[1] for n in chain[common:])
+        return diff_composed(_compose(chain1), _compose(chain2))
 
-        return (only_in_a, only_in_b)
+    def __map_parallel(self, func, items, workers=None, chunksize=1):
+        '''Run a pool worker over items, preserving order. workers=1 runs in this process.'''
+        if workers == 1 or len(items) < 2: return map(functools.partial(func, psdiff=self), items)
+        initargs = (self.snapshot_dir.parent, self.snapshot_dir.name, self.snapshot_prefix)
+        from concurrent.futures import ProcessPoolExecutor   # pulls in multiprocessing, only needed here
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            return list(pool.map(func, items, chunksize=chunksize))
 
     # --- Internal methods -> snapshot generation ---
     def __create_ps_snapshot(self):
         '''
-        Get a snapshot of current processes, filtering out kworker and the current process itself.
-        :return: List of dicts with keys: pid, ppid, username, name, cmdline.
+        Get a snapshot of current processes, filtered by process_filter (kworker and psdiff itself by default).
+        :return: List of records.Process rows with the fields in self.fields.
         '''       
         # Body
-        self.__maintenance_check()
-        ps_list = self.__get_ps()
-        ps_list = self.__snapshot_filter(ps_list)
-        ps_list.sort(key=lambda x: x["pid"])
+        if self.snapshot_cache is not None and self.snapshot_cache.live is not None:
+            return list(self.snapshot_cache.live[1])   # daemon: the scheduled capture stands in for a fresh one
+        with self.timings.stage('maintenance'):
+            self.__maintenance_check()
+        with self.timings.stage('capture') as stage:
+            ps_list = self.__get_ps()
+            stage.records = len(ps_list)
+        with self.timings.stage('filter') as stage:
+            ps_list = self.__snapshot_filter(ps_list)
+            stage.records = len(ps_list)
+        with self.timings.stage('sort'):
+            ps_list.sort(key=itemgetter("pid"))
         return ps_list
     
     def __get_ps(self):
-        ps_list = []
-        for proc in psutil.process_iter(['pid', 'ppid', 'username', 'name', 'cmdline']):
-            try:
-                proc.info['gid'] = 0
-                #proc.info['gid'] = psutil.Process(proc.info.get('pid')).gids()                    
-                ps_list.append(self.__line_formatter_import(proc.info)) 
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess): continue
-        return ps_list
+        '''Capture the running processes. Backends with filters_capture apply process_filter while reading /proc.'''
+        if self.__filters_capture(): infos = self.backend.process_iter(self.fields, self.process_filter)
+        else: infos = self.backend.process_iter(self.fields)
+        from records import gc_paused
+        # __line_formatter_import inlined: one call per process adds up at 100k processes
+        make, defaults = self.record_type, self._defaults
+        with gc_paused():
+            return [make(*[' '.join(value) if type(value := info.get(field, missing)) is list else value for field, missing in defaults])
+                    for info in infos]
+
+    def __watch_tick(self, sample, rejected):
+        '''
+        Update sample in place from the running pid list and return the removed/added DiffEntry list.
+        rejected holds the running pids the filter excluded: they are read once, not on every tick.
+        '''
+        from filters import EARLY_FIELDS
+        running = set(self.backend.pids())
+        entries = [DiffEntry(REMOVED, sample.pop(pid), None, {}) for pid in sample.keys() - running]
+        rejected &= running
+        heads = [info for info in (self.backend.read(pid, EARLY_FIELDS) for pid in running - sample.keys() - rejected) if info is not None]
+        if heads:
+            proc_filter = self.process_filter
+            parent_of = None
+            if proc_filter.needs_tree:
+                parent_of = {pid: proc['ppid'] for pid, proc in sample.items()}
+                parent_of.update((info['pid'], info['ppid']) for info in heads)
+            subtree = proc_filter.subtree(parent_of) if proc_filter.needs_tree else frozenset()
+            added = []
+            for head in heads:
+                # names of 15+ chars are truncated comm values, decide those once the full name is known
+                if len(head['name']) < 15 and not proc_filter.early(head['pid'], head['ppid'], head['username'], head['name'], subtree):
+                    rejected.add(head['pid'])
+                    continue
+                info = self.backend.read(head['pid'], self.fields)
+                if info is not None: added.append(self.__line_formatter_import(info))
+            rejected.update(proc['pid'] for proc in added)
+            for proc in proc_filter.filter(added, parent_of):
+                pid = proc['pid']
+                rejected.discard(pid)
+                sample[pid] = proc
+                entries.append(DiffEntry(ADDED, None, proc, {}))
+        entries.sort(key=lambda entry: (entry.old or entry.new)['pid'])
+        return entries
 
      # --- Internal methods -> File I/O ---
+    def __save_snapshot(self, ps_list, num=None):
+        '''
+        Write a captured process list as snapshot num (next in sequence by default). Without num, the number
+        is reserved when the finished file is linked into place, so concurrent writers never share one.
+        '''
+        self.catalog.refresh()   # other writers may have added snapshots since
+        last = self.__get_last_snapshot_number()
+        reserve = num is None
+        if not reserve and num in self.catalog:
+            dependents = self.__delta_dependents(num)
+            if dependents: sys.exit(f"Snapshot {num} is the base of delta snapshots {', '.join(map(str, dependents))}, not overwritten.")
+        num = num if num is not None else (last + 1)
+        self.__create_snapshot_path(num)
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        fields = self.__catalog_fields(ps_list)
+        # a delta needs a base with the same field set, otherwise a new keyframe is written. An explicit number
+        # always gets a keyframe: a delta there could be based on a later snapshot and form a base cycle.
+        if (self.keyframe_every and reserve and last >= 0 and len(self.__delta_chain(last)) < self.keyframe_every and
+                self.catalog.get(last).get('fields') == fields.get('fields')):
+            previous = self._last_saved[1] if self._last_saved and self._last_saved[0] == last else self.__load_saved_snapshot(last)
+            with self.timings.stage('write delta') as stage:
+                try:
+                    num, outfile, records = self.__write_atomic(num, lambda tmp: write_delta(
+                        self.__get_diff(previous, ps_list), last, tmp, self.__line_formatter_write_file, fields.get('fields'), self.cmdline_store), reserve)
+                finally: self.__close(previous)
+                self.catalog.add(num, outfile.stat().st_size, records, 'delta', base=last, **fields)
+                stage.records = records
+        else:
+            with self.timings.stage('write') as stage:
+                num, outfile, _ = self.__write_atomic(num, lambda tmp: self.__write_snapshot_to_file(ps_list, tmp), reserve)
+                self.catalog.add(num, outfile.stat().st_size, len(ps_list), self.snapshot_format, **fields)
+                stage.records = len(ps_list)
+        if self.cmdline_store: self.cmdlines.confirm()   # cataloged: a gc from now on sees its cmdlines as live
+        # an explicit number may land below or on an indexed snapshot: rebuilt from the snapshots on the next query
+        if not reserve and num <= self.history.last(): self.history.clear()
+        self.sync.add(outfile, self.catalog.path, *([self.cmdlines.path] if self.cmdline_store else []))
+        self._last_saved = (num, ps_list)
+        return outfile
+
+
     def __load_saved_snapshot(self,num=None):
         '''Get the formatted process list object from a snapshot.'''
         if (num is None): num = self.__get_last_snapshot_number()
         if (num < 0):
             print("There are no saved snapshots.")
             sys.exit(1)
-        path = Path(self.__get_snapshot_path(num))
-        if not path.exists():
-            print(f"snapshot {num} does not exist: {path}", file=sys.stderr)
+        path = self.__get_snapshot_path(num)
+        if self.snapshot_cache is not None:
+            cached = self.snapshot_cache.get(num)
+            if cached is not None: return cached
+        try:
+            with self.timings.stage(f'load {num}') as stage:
+                if is_delta_snapshot(path): ps_list = self.__reconstruct(num)
+                else: ps_list = self.__read_snapshot_from_file(path)
+                stage.records = len(ps_list)
+            if self.snapshot_cache is not None:
+                snapshot, ps_list = ps_list, list(ps_list)
+                self.__close(snapshot)
+                self.snapshot_cache.put(num, ps_list)
+            return ps_list
+        except FileNotFoundError:
+            print(f"snapshot {num} is in the catalog but missing on disk: {path} (run psdiff --reindex)", file=sys.stderr)
             sys.exit(1)
-        return self.__read_snapshot_from_file(path)
     
     
+    def __load_list(self, num):
+        '''A saved snapshot as a list of records. A binary snapshot is read out and its mmap closed.'''
+        snapshot = self.__load_saved_snapshot(num)
+        try: return list(snapshot)
+        finally: self.__close(snapshot)
+
+    def __close(self, *snapshots):
+        '''Close the mmap of the binary snapshots among snapshots. Lists need nothing.'''
+        for snapshot in snapshots:
+            if isinstance(snapshot, BinarySnapshot): snapshot.close()
+
+    def __closing_diff(self, old, new):
+        '''merge_diff of two loaded snapshots that closes binary ones once the diff is consumed or discarded.'''
+        try: yield from self.__get_diff(old, new)
+        finally: self.__close(old, new)
+
     def __read_snapshot_from_file(self,input_file):
-        '''Read a process snapshot from a file and return a list of process.'''
+        '''Read a process snapshot from a file and return a list of process. Binary files are returned as an mmap view.'''
+        if is_binary_snapshot(input_file): return BinarySnapshot(input_file)
+        from records import gc_paused
         ps_list = []  
-        with open(input_file, 'r') as file:
+        fields = None
+        cmdline_refs = False
+        with open(input_file, 'r') as file, gc_paused():
             for line in file:
+                if line.startswith(FIELDS_HEADER):
+                    fields = line[len(FIELDS_HEADER):].strip().split(',')
+                    continue
+                if line.startswith(REFS_HEADER):
+                    cmdline_refs = True
+                    continue
                 try:
-                    ps_list.append(self.__line_formatter_read_file(line))        
+                    ps_list.append(self.__line_formatter_read_file(line, fields, cmdline_refs))        
                 except Exception as e: 
                     print (f"Error in snapshot file: {e}" )
                     continue               
-        ps_list.sort(key=lambda x: x["pid"])
+        ps_list.sort(key=itemgetter("pid"))
         return ps_list
 
-    def __write_snapshot_to_file(self, ps_list, output_file):
+    def __update_history(self):
+        '''Index the snapshots saved since the lifetime index was last updated.'''
+        last = self.history.last()
+        if last >= 0 and last not in self.catalog: self.history.clear()   # indexed snapshot was removed, start over
+        previous = self.history.last()
+        for num in self.catalog.nums():
+            if num <= previous: continue
+            if previous < 0:
+                events = [('+', proc['pid'], proc['cmdline']) for proc in self.__load_list(num)]
+            else:
+                events = []
+                for entry in self.__get_saved_diff(previous, num):
+                    if entry.kind == ADDED: events.append(('+', entry.new['pid'], entry.new['cmdline']))
+                    elif entry.kind == REMOVED: events.append(('-', entry.old['pid'], entry.old['cmdline']))
+                    elif 'cmdline' in entry.deltas:
+                        events.append(('-', entry.old['pid'], entry.old['cmdline']))
+                        events.append(('+', entry.new['pid'], entry.new['cmdline']))
+            refs = None
+            if self.cmdline_store:
+                self.cmdlines.refresh()
+                refs = [self.cmdlines.ref(cmdline) for _, _, cmdline in events]
+                self.cmdlines.flush()   # stored before the history references them, as for snapshots
+            self.history.append(num, events, refs)
+            if self.cmdline_store: self.cmdlines.confirm()
+            previous = num
+
+    def __reconstruct(self, num):
+        '''Rebuild a delta snapshot by applying its chain of deltas to the keyframe.'''
+        chain = self.__delta_chain(num)
+        keyframe = self.__read_snapshot_from_file(self.__get_snapshot_path(chain[0]))
+        try: procs = {proc['pid']: proc for proc in keyframe}
+        finally: self.__close(keyframe)
+        for n in chain[1:]:
+            apply_delta(procs, read_delta(self.__get_snapshot_path(n), self.__line_formatter_read_file)[1])
+        return [procs[pid] for pid in sorted(procs)]
+
+    def __write_snapshot_to_file(self, ps_list, output_file, snapshot_format=None):
         '''Write the process list to a file in a readable format.'''
+        snapshot_format = snapshot_format or self.snapshot_format
+        if snapshot_format == 'binary': return write_binary_snapshot(ps_list, output_file)
         with open(output_file, 'w') as f:
+            if self.cmdline_store: f.write(REFS_HEADER + "\n")
+            fields = self.__catalog_fields(ps_list).get('fields')
+            if fields: f.write(FIELDS_HEADER + ",".join(fields) + "\n")
             for proc in ps_list:
                 f.write(self.__line_formatter_write_file(proc) + "\n")
         return output_file
 
     
    
+    def __write_atomic(self, num, write, reserve=False):
+        '''
+        Write snapshot num through write(temp path), then move the file into place so readers never see it
+        half written. reserve links it to the first free number from num instead of replacing ps.num.
+        :return: (num, path, result of write).
+        '''
+        from atomicio import publish_new, temp_path
+        path = self.__create_snapshot_path(num)
+        tmp = temp_path(path)
+        try:
+            if self.cmdline_store: self.cmdlines.refresh()
+            result = write(tmp)
+            if self.cmdline_store: self.cmdlines.flush()   # the cmdlines a snapshot references are stored before it is published
+            if reserve: num, path = publish_new(tmp, self.__create_snapshot_path, num)
+            else: os.replace(tmp, path)
+        finally:
+            if tmp.exists(): tmp.unlink()
+        return num, path, result
+
     # --- Internal method -> snapshot management --- 
     def __create_snapshot_path(self,num = None):
         num = num if num is not None else (self.__get_last_snapshot_number() + 1)
@@ -153,95 +643,248 @@ class Psdiff():
 
     def __get_snapshot_path(self,num):
         path = self.snapshot_dir / f"{self.snapshot_prefix}.{num}"
-        if not path.exists():
+        if not path.is_file():   # one stat instead of loading the catalog
             print(f"snapshot {num} does not exist: {path}", file=sys.stderr)
             sys.exit(1)
         return path
 
+    def __delta_chain(self, num):
+        '''Snapshot numbers from num's keyframe to num, keyframe first. A keyframe's chain is [num].'''
+        chain = [num]
+        try:
+            if not is_delta_snapshot(self.snapshot_dir / f"{self.snapshot_prefix}.{num}"): return chain   # keyframes need no catalog
+        except FileNotFoundError: pass
+        entry = self.catalog.get(num)
+        while entry is not None and entry['format'] == 'delta':
+            if entry['base'] in chain:
+                print(f"snapshot {num} has a delta base cycle: {' -> '.join(map(str, chain + [entry['base']]))}", file=sys.stderr)
+                sys.exit(1)
+            chain.append(entry['base'])
+            entry = self.catalog.get(entry['base'])
+        if entry is None:
+            print(f"snapshot {chain[-1]} is missing from the delta chain of snapshot {num}", file=sys.stderr)
+            sys.exit(1)
+        return chain[::-1]
+
+    def __delta_dependents(self, num):
+        '''Numbers of the delta snapshots based on snapshot num.'''
+        return [n for n in self.catalog.nums() if self.catalog.get(n).get('base') == num]
+
     def __get_last_snapshot_number(self):
-        '''Calculate the next snapshot number by finding the highest existing snapshot number.'''
-        last = -1
-        for file in Path(self.snapshot_dir).glob(f"{self.snapshot_prefix}.*"):
-            try:
-                num = int(file.name.split('.')[-1])
-                last = max(last, num)
-            except ValueError:
-                continue
-        return last
+        '''Highest existing snapshot number, -1 if there are none. Read from the catalog.'''
+        return self.catalog.latest()
     
      
+    # --- Internal methods -> Output ---
+    def __render_snapshot(self, ps_list):
+        '''Generate the output lines of a process list in the configured output format.'''
+        if self.output_format == 'ndjson': return (self.__line_formatter_ndjson(proc) for proc in ps_list)
+        if self.output_format == 'tsv': return (self.__line_formatter_tsv(proc) for proc in ps_list)
+        def _text():
+            yield "\n"
+            for proc in ps_list: yield self.__line_formatter_display(proc)
+        return _text()
+
+    def __render_diff(self, entries):
+        '''Generate the output lines of DiffEntry records in the configured output format.'''
+        for entry in entries:
+            if self.output_format == 'ndjson': yield self.__line_formatter_diff_ndjson(entry)
+            elif self.output_format == 'tsv': yield self.__line_formatter_diff_tsv(entry)
+            else: yield from self.__line_formatter_diff(entry)
+
+    def __render_tree(self, changes, details=False):
+        '''Generate the output lines of SubtreeChange groups, each followed by its diff lines when details is set.'''
+        from treediff import summarize
+        for change in changes:
+            entries = change.removed + change.added + change.changed
+            if self.output_format == 'ndjson':
+                yield self.__line_formatter_tree_ndjson(change, entries if details else None)
+                continue
+            yield self.__line_formatter_tree_tsv(change) if self.output_format == 'tsv' else summarize(change)
+            if details:
+                for line in self.__render_diff(entries): yield line if self.output_format == 'tsv' else "    " + line
+
+    def __write_lines(self, lines, chunk_bytes=64*1024):
+        '''Write lines to stdout in large chunks as they are generated. Returns the number of lines written.'''
+        out = sys.stdout
+        buffer, size, count = [], 0, 0
+        for line in lines:
+            buffer.append(line)
+            size += len(line) + 1
+            count += 1
+            if size >= chunk_bytes:
+                out.write("\n".join(buffer) + "\n")
+                buffer, size = [], 0
+        if buffer: out.write("\n".join(buffer) + "\n")
+        out.flush()
+        return count
+
     # --- Internal methods -> Text Rendering ---  
     def __line_formatter_import(self, proc_info):
-        '''Formats a string based process dictionary from the proc.info format'''
-        def _reformat_string_list(param): return ' '.join(param) if isinstance(param,list) else param
-        
-        return {
-                'pid': proc_info.get('pid', -1),
-                'ppid':  proc_info.get('ppid', -1),
-                'gid': proc_info.get('gid').real,
-                'username':  _reformat_string_list(proc_info.get('username','')),
-                'name':_reformat_string_list(proc_info.get('name','')),
-                'cmdline':_reformat_string_list(proc_info.get('cmdline',''))
-            }
+        '''Formats a string based process dictionary with the captured fields from the proc.info format'''
+        return self.record_type(*[' '.join(value) if type(value := proc_info.get(field, missing)) is list else value
+                                  for field, missing in self._defaults])
 
     def __line_formatter_display(self, ps_dict ):
         '''Render a single line of ps output for display.'''
         pid = ps_dict['pid']
         ppid = ps_dict['ppid']
-        gid = ps_dict['gid']
+        gid = ps_dict.get('gid', 0)
         username = ps_dict['username']
         name = ps_dict['name']
         cmdline = ps_dict['cmdline']
+        extras = "".join(f"{ps_dict[field]:>10} " for field in EXTRA_FIELDS if field in ps_dict)
 
         if (username == ""): username = "''"
         if (name == ""): name = "''"
         if (cmdline == ""): cmdline = "''"
 
-        return f"{pid:>6} {ppid:>6} {gid:>6} {username:<8} {name:<24} {cmdline}"
+        return f"{pid:>6} {ppid:>6} {gid:>6} {username:<8} {name:<24} {extras}{cmdline}"
     
 
-    def __line_formatter_read_file(self, ps_line):
-        '''Parses a single line of ps from a file input'''
-        parts = shlex.split(ps_line)
-        return { 
-            'pid':int(parts[0]),
-            'ppid':int(parts[1]),
-            'gid':int(parts[2]),
-            'username': parts[3],
-            'name': parts[4],     
-            'cmdline': parts[5] 
-        }
+    def __line_formatter_diff(self, entry):
+        '''Render a DiffEntry as display lines: -/+ for removed/added, ~ (> for restarted) plus one line per changed field.'''
+        if entry.kind == REMOVED: return ["-" + self.__line_formatter_display(entry.old)]
+        if entry.kind == ADDED: return ["+" + self.__line_formatter_display(entry.new)]
+        lines = [entry.kind + self.__line_formatter_display(entry.new)]
+        if entry.kind == RESTARTED: lines.append(f"{'':>8}restarted ({entry.old['pid']} -> {entry.new['pid']})")
+        for field, (old, new) in entry.deltas.items():
+            if field != 'pid': lines.append(f"{'':>8}{field}: {old!r} -> {new!r}")
+        return lines
+
+    def __line_formatter_ndjson(self, ps_dict):
+        '''Render a process as one JSON object.'''
+        return json.dumps(dict(ps_dict))
+
+    def __line_formatter_diff_ndjson(self, entry):
+        '''Render a DiffEntry as one JSON object.'''
+        kind = {REMOVED: 'removed', ADDED: 'added', RESTARTED: 'restarted'}.get(entry.kind, 'changed')
+        old, new = (None if proc is None else dict(proc) for proc in (entry.old, entry.new))
+        return json.dumps({'kind': kind, 'old': old, 'new': new, 'deltas': entry.deltas})
+
+    def __line_formatter_tree_ndjson(self, change, entries=None):
+        '''Render a SubtreeChange as one JSON object, with its entries as diff objects when given.'''
+        replaced = min(len(change.removed), len(change.added))
+        record = {'anchor': None if change.anchor is None else {'pid': change.anchor['pid'], 'name': change.anchor['name']},
+                  'name': change.name, 'replaced': replaced, 'added': len(change.added) - replaced,
+                  'removed': len(change.removed) - replaced, 'changed': len(change.changed)}
+        if entries is not None: record['entries'] = [json.loads(self.__line_formatter_diff_ndjson(entry)) for entry in entries]
+        return json.dumps(record)
+
+    def __line_formatter_tree_tsv(self, change):
+        '''Render a SubtreeChange as =, the anchor pid and name, the grouped name and the replaced/added/removed/changed counts.'''
+        replaced = min(len(change.removed), len(change.added))
+        anchor = change.anchor or {'pid': '', 'name': ''}
+        columns = [anchor['pid'], anchor['name'], change.name, replaced, len(change.added) - replaced,
+                   len(change.removed) - replaced, len(change.changed)]
+        return "=\t" + "\t".join(self.__escape_tsv(column) for column in columns)
+
+    def __line_formatter_tsv(self, ps_dict):
+        '''Render a process as tab separated columns, with backslash, tab and newline escaped.'''
+        columns = [ps_dict['pid'], ps_dict['ppid'], ps_dict.get('gid', 0), ps_dict['username'], ps_dict['name'], ps_dict['cmdline']]
+        columns.extend(ps_dict[field] for field in EXTRA_FIELDS if field in ps_dict)
+        return "\t".join(self.__escape_tsv(column) for column in columns)
+
+    def __escape_tsv(self, value):
+        return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+    def __line_formatter_diff_tsv(self, entry):
+        '''Render a DiffEntry as kind, the process columns (new values for ~) and the changed field names.'''
+        return f"{entry.kind}\t{self.__line_formatter_tsv(entry.new or entry.old)}\t{','.join(entry.deltas)}"
+
+    def __line_formatter_read_file(self, ps_line, fields=None, cmdline_refs=False):
+        '''
+        Parses a single line of ps from a file input. fields is the file's field list, None for DEFAULT_FIELDS.
+        cmdline_refs: the cmdline column is a cmdline store reference.
+        '''
+        parts = ps_line.split(None, 3)
+        # the string columns are written with json.dumps: shlex would keep escapes like \n and \uXXXX literally
+        try: parts[3:] = self.__json_columns(parts[3], cmdline_refs)
+        except ValueError:   # hand written line in shell quoting
+            parts[3:] = shlex.split(parts[3])
+            parts[6:] = [json.loads(value) for value in parts[6:]]
+        if cmdline_refs: parts[5] = self.__resolve_cmdline(parts[5])
+        fields = fields or DEFAULT_FIELDS
+        values = [int(parts[0]), int(parts[1])]
+        if 'gid' in fields: values.append(int(parts[2]))   # otherwise the column is a 0 placeholder
+        values.extend(parts[3:6])
+        values.extend(parts[6:6 + len(fields) - len(values)])
+        from records import record_type   # a dict lookup once imported, next to the column decoding it is noise
+        return record_type(fields)(*values)
     
+    def __resolve_cmdline(self, ref):
+        '''The cmdline of a cmdline store reference. A missing one is a broken store, not a bad line: never drop the process silently.'''
+        try: return self.cmdlines.resolve(ref)
+        except LookupError as e: sys.exit(f"Error in cmdline store: {e}")
+
+    def __json_columns(self, text, cmdline_refs=False):
+        '''Decode the whitespace separated JSON values of a file line after its number columns. A cmdline reference is a bare @hash.'''
+        from json.decoder import WHITESPACE
+        columns, end = [], len(text)
+        pos = WHITESPACE.match(text).end()
+        while pos < end:
+            if cmdline_refs and len(columns) == 2:
+                value = text[pos:].split(None, 1)[0]
+                pos += len(value)
+            else:
+                value, pos = _decode_json(text, pos)
+            columns.append(value)
+            pos = WHITESPACE.match(text, pos).end()
+        return columns
+
     def __line_formatter_write_file(self, ps_dict): #urllib.parse
         '''Render a single line of ps output for file output.'''
         pid = ps_dict['pid']
         ppid = ps_dict['ppid']
-        gid = ps_dict['gid']
+        gid = ps_dict.get('gid', 0)
         username = json.dumps(ps_dict['username'])
         name = json.dumps(ps_dict['name'])
-        cmdline = json.dumps(ps_dict['cmdline'])
+        cmdline = self.cmdlines.ref(ps_dict['cmdline']) if self.cmdline_store else json.dumps(ps_dict['cmdline'])
+        extras = "".join(f" {json.dumps(ps_dict[field])}" for field in EXTRA_FIELDS if field in ps_dict)
         '''Render a single line of ps output for display.'''
               
-        return (f"{pid:>6} {ppid:>6} {gid:>6} {username:<8} {name:<24} {cmdline}")
+        return (f"{pid:>6} {ppid:>6} {gid:>6} {username:<8} {name:<24} {cmdline}{extras}")
     
 
      # --- Internal methods -> Helpers ---  
-     #make abstract in the future
     def __snapshot_filter(self, ps_list):
-        '''Filter out kworker and the current running process itself.'''
-        current_pid = os.getpid()
-        return [
-            proc for proc in ps_list
-            if not (
-                (proc['name'].startswith('kworker/') and proc['username'] == 'root') or
-                proc['pid'] == current_pid
-            )
-        ]     
+        '''Apply process_filter to captured processes, unless the backend already did while capturing.'''
+        if self.__filters_capture(): return ps_list
+        from records import gc_paused
+        with gc_paused(): return self.process_filter.filter(ps_list)   # keep() allocates; a collection would walk every record
+
+    def __catalog_fields(self, ps_list):
+        '''{'fields': [...]} for snapshots whose field set (the keys of their rows) is not DEFAULT_FIELDS, else {}.'''
+        fields = getattr(ps_list, 'fields', None) or fields_of(ps_list[0] if len(ps_list) else None)
+        return {'fields': fields} if fields != DEFAULT_FIELDS else {}
+
+    def __live_cmdline_refs(self):
+        '''Hashes of the cmdline store referenced by the saved text and delta snapshots and the history index.'''
+        import re
+        self.catalog.refresh()   # gc asks again after rewriting the store, for snapshots other writers cataloged meanwhile
+        live = set()
+        for num in self.catalog.nums():
+            if self.catalog.get(num)['format'] == 'binary': continue
+            try:
+                with open(self.snapshot_dir / f"{self.snapshot_prefix}.{num}", 'r') as f:
+                    # may also match a quoted cmdline containing " @<hash>", which only keeps that hash longer
+                    live.update(re.findall(r' @([0-9a-f]{16})\b', f.read()))
+            except FileNotFoundError: continue   # removed by another process
+        try: live.update(re.findall(r'"ref": "@([0-9a-f]{16})"', self.history.path.read_text()))
+        except FileNotFoundError: pass
+        return live
+
+    def __filters_capture(self):
+        '''True if the backend applies a ProcessFilter itself, before reading cmdlines.'''
+        return getattr(self.backend, 'filters_capture', False) is True
     
     
     def __maintenance_check(self):
         '''Check the size of the snapshot directory and warn if it exceeds MAX_BYTES.'''
-        size_bytes = sum(f.stat().st_size for f in self.snapshot_dir.glob('*') if f.is_file())
+        size_bytes = self.catalog.total_size()
+        for path in (self.cmdlines.path, self.history.path):   # shared files that grow with the snapshots
+            try: size_bytes += path.stat().st_size
+            except FileNotFoundError: pass
         if size_bytes > self.max_bytes:
             print("Warning: snapshot directory size exceeds 10MB. Consider cleaning up old snapshots.", file=sys.stderr)
 
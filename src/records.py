@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+'''
+Compact process records.
+
+Every process row that psdiff captures, loads or diffs is a Process record: an object with one __slots__
+entry per field instead of a per-row dict, a fraction of the memory. Records still read like the dicts
+they replace (row['pid'], row.get('gid', 0), 'rss' in row, dict(row), == against dicts), and
+as_dict() gives a plain dict for JSON and other consumers that need one. username and name are
+interned: the few distinct values are stored once, not once per row.
+
+Unlike dicts of plain values, records are tracked by the cyclic garbage collector. Records never form
+cycles, so code building a whole snapshot of them pauses the collector (gc_paused) instead of letting it
+walk every record built so far, again and again.
+
+One record class exists per field set (record_type), all subclasses of Process.
+'''
+import gc
+import sys
+from contextlib import contextmanager
+from collections.abc import Mapping
+from operator import attrgetter
+
+_INTERNED = ('username', 'name')
+_types = {}
+
+
+class Process(Mapping):
+    __slots__ = ()
+    _fields = ()
+    _fieldset = frozenset()
+
+    def __getitem__(self, key):
+        if key in self._fieldset: return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fieldset: raise KeyError(f"{key!r} is not a field of this record ({', '.join(self._fields)})")
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fieldset
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fieldset else default
+
+    def __eq__(self, other):
+        if type(other) is type(self): return self._values(self) == self._values(other)
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.as_dict())
+
+    def __reduce__(self):
+        return (make_record, (self._fields, self._values(self)))
+
+    def as_dict(self):
+        '''A plain dict copy of the record.'''
+        return dict(zip(self._fields, self._values(self)))
+
+
+def record_type(fields):
+    '''The Process subclass with fields as its slots (in that order). Cached per field set.'''
+    fields = tuple(fields)
+    cls = _types.get(fields)
+    if cls is None:
+        # the field names come from the fields registry, so they are plain identifiers
+        args = ", ".join(fields)
+        body = "\n".join(f"    self.{field} = _intern({field}) if type({field}) is str else {field}" if field in _INTERNED
+                         else f"    self.{field} = {field}" for field in fields)
+        namespace = {'_intern': sys.intern}
+        exec(f"def __init__(self, {args}):\n{body}", namespace)
+        # _values(row) -> tuple of the field values (records always have pid, ppid and more, so attrgetter returns a tuple)
+        cls = type('Process', (Process,), {'__slots__': fields, '__init__': namespace['__init__'], '_fields': fields,
+                                           '_fieldset': frozenset(fields), '_values': staticmethod(attrgetter(*fields))})
+        _types[fields] = cls
+    return cls
+
+
+def make_record(fields, values):
+    '''Build a record from a field list and its values (also used to unpickle records).'''
+    return record_type(fields)(*values)
+
+
+@contextmanager
+def gc_paused():
+    '''Disable the cyclic garbage collector while building many records (nested use is fine).'''
+    enabled = gc.isenabled()
+    gc.disable()
+    try: yield
+    finally:
+        if enabled: gc.enable()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+'''
+Stage timing for psdiff operations.
+
+Psdiff wraps each stage (capture, filter, sort, write, load, diff, output) in timings.stage(name).
+While disabled, stage() returns a shared no-op context manager, so instrumentation costs one call.
+Enable it to collect wall/CPU time and record counts, or register hooks to export each measurement.
+'''
+import sys
+import time
+
+
+class _Stage():
+    '''A running stage measurement. Set .records inside the with block to report a record count.'''
+    __slots__ = ('timings', 'name', 'records', '_wall', '_cpu')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+        self.records = None
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings._record({'stage': self.name, 'wall': time.perf_counter() - self._wall,
+                              'cpu': time.process_time() - self._cpu, 'records': self.records})
+
+
+class _NullStage():
+    '''Stage used while timing is disabled. Shared by every stage, so .records writes are dropped.'''
+    __slots__ = ()
+    records = None
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Timings():
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.records = []   # {'stage', 'wall', 'cpu', 'records'} dicts in completion order
+        self._hooks = []
+
+    def stage(self, name):
+        '''Context manager measuring one stage.'''
+        return _Stage(self, name) if self.enabled else _NULL_STAGE
+
+    def add_hook(self, callback):
+        '''Call callback(record) after every measured stage. Adding a hook enables timing.'''
+        self._hooks.append(callback)
+        self.enabled = True
+
+    def remove_hook(self, callback):
+        self._hooks.remove(callback)
+
+    def report(self, file=None):
+        '''Print a per-stage wall/CPU breakdown with record counts (to stderr by default).'''
+        file = file or sys.stderr
+        print(f"{'stage':<16} {'wall ms':>10} {'cpu ms':>10} {'records':>9}", file=file)
+        for record in self.records:
+            records = '' if record['records'] is None else record['records']
+            print(f"{record['stage']:<16} {record['wall'] * 1000:>10.2f} {record['cpu'] * 1000:>10.2f} {records:>9}", file=file)
+        total_wall = sum(record['wall'] for record in self.records)
+        total_cpu = sum(record['cpu'] for record in self.records)
+        print(f"{'total':<16} {total_wall * 1000:>10.2f} {total_cpu * 1000:>10.2f}", file=file)
+
+    def _record(self, record):
+        self.records.append(record)
+        for hook in self._hooks: hook(record)
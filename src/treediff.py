@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+'''
+Process tree aware grouping of diff entries.
+
+Processes that exist in both snapshots are stable. Every process that appeared or went away is attached
+to its nearest stable ancestor (its anchor), found by walking down from the stable processes through a
+ppid -> children index built once per snapshot. Entries are grouped by (anchor, process name), so a
+prefork server recycling its workers becomes one group, e.g. "nginx[1234]: 48 workers replaced".
+Index, anchors and grouping are each a single pass over the processes.
+'''
+from collections import namedtuple
+from diffengine import REMOVED, ADDED
+
+# anchor: process dict of the nearest stable ancestor (None for processes without one), name: process name
+# of the grouped entries, removed/added/changed: their DiffEntry lists
+SubtreeChange = namedtuple('SubtreeChange', ['anchor', 'name', 'removed', 'added', 'changed'])
+
+
+def children_index(procs):
+    '''ppid -> [pid, ...] for a pid -> process mapping.'''
+    children = {}
+    for pid, proc in procs.items():
+        if proc['ppid'] != pid: children.setdefault(proc['ppid'], []).append(pid)
+    return children
+
+
+def subtree_anchors(procs, stable):
+    '''Map every pid of procs that is not in stable to its nearest stable ancestor pid (None if there is none).'''
+    children = children_index(procs)
+    anchors = {}
+    stack = [(child, pid) for pid in stable for child in children.get(pid, ()) if child not in stable]
+    stack.extend((pid, None) for pid, proc in procs.items() if pid not in stable and proc['ppid'] not in procs)
+    while stack:
+        pid, anchor = stack.pop()
+        if pid in anchors: continue
+        anchors[pid] = anchor
+        stack.extend((child, anchor) for child in children.get(pid, ()) if child not in stable)
+    return anchors
+
+
+def tree_diff(entries, old_procs, new_procs):
+    '''
+    Group DiffEntry records by subtree. old_procs/new_procs map pid -> process for both snapshots.
+    :return: list of SubtreeChange sorted by anchor pid and name.
+    '''
+    stable = old_procs.keys() & new_procs.keys()
+    old_anchors = subtree_anchors(old_procs, stable)
+    new_anchors = subtree_anchors(new_procs, stable)
+    groups = {}
+    for entry in entries:
+        if entry.kind == REMOVED: proc, anchor, slot = entry.old, old_anchors.get(entry.old['pid']), 2
+        elif entry.kind == ADDED: proc, anchor, slot = entry.new, new_anchors.get(entry.new['pid']), 3
+        else:
+            # a changed process is stable itself: group it under its parent's subtree
+            proc, slot = entry.new, 4
+            parent = proc['ppid']
+            anchor = parent if parent in stable else new_anchors.get(parent)
+        key = (-1 if anchor is None else anchor, proc['name'])
+        if key not in groups: groups[key] = SubtreeChange(None if anchor is None else new_procs[anchor], proc['name'], [], [], [])
+        groups[key][slot].append(entry)
+    return [groups[key] for key in sorted(groups)]
+
+
+def summarize(change):
+    '''One line summary of a SubtreeChange, e.g. "nginx[1234]: 48 workers replaced, 2 added".'''
+    anchor = "(no parent)" if change.anchor is None else f"{change.anchor['name']}[{change.anchor['pid']}]"
+    what = "workers" if change.anchor is not None and change.name == change.anchor['name'] else (change.name or "''")
+    replaced = min(len(change.removed), len(change.added))
+    counts = [(count, label) for count, label in ((replaced, "replaced"), (len(change.added) - replaced, "added"),
+                                                (len(change.removed) - replaced, "removed"), (len(change.changed), "changed")) if count]
+    parts = [f"{count} {what} {label}" if i == 0 else f"{count} {label}" for i, (count, label) in enumerate(counts)]
+    return f"{anchor}: " + ", ".join(parts)
@@ -0,0 +1,22 @@
+from pathlib import Path
+
+
+def build_proc(root: Path, pid, ppid=1, name="worker", cmdline: bytes = b"", uid=0, gid=0,
+               rss_kb=None, threads=None, stat=None, fds=None):
+    '''
+    Write a fake /proc/<pid> under root: status and cmdline, plus VmRSS/Threads status lines, a stat
+    file (its full text) and an fd directory with fds entries when given.
+    '''
+    proc_dir = root / str(pid)
+    proc_dir.mkdir()
+    status = (f"Name:\t{name}\nState:\tS (sleeping)\nPPid:\t{ppid}\n"
+              f"Uid:\t{uid}\t{uid}\t{uid}\t{uid}\nGid:\t{gid}\t{gid}\t{gid}\t{gid}\n")
+    if rss_kb is not None: status += f"VmRSS:\t    {rss_kb} kB\n"
+    if threads is not None: status += f"Threads:\t{threads}\n"
+    (proc_dir / "status").write_text(status)
+    (proc_dir / "cmdline").write_bytes(cmdline)
+    if stat is not None: (proc_dir / "stat").write_text(stat)
+    if fds is not None:
+        (proc_dir / "fd").mkdir()
+        for fd in range(fds): (proc_dir / "fd" / str(fd)).touch()
+    return proc_dir
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import textwrap
+import pytest
+from pathlib import Path
+from psdiff import Psdiff
+from tests.aspect_helper import weave_aspect
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# one writer process: saves count snapshots whose 50 rows all carry the writer and snapshot index
+WRITER = textwrap.dedent('''
+    import sys
+    from pathlib import Path
+    sys.path.insert(0, sys.argv[1])
+    from psdiff import Psdiff
+    writer, count = int(sys.argv[3]), int(sys.argv[4])
+    psdiff = Psdiff(Path(sys.argv[2]), '.psdiff', 'ps_test', snapshot_format=('text', 'binary')[writer % 2],
+                    keyframe_every=3 if writer % 4 == 0 else 0)
+    for i in range(count):
+        psdiff._Psdiff__save_snapshot([{'pid': pid, 'ppid': 1, 'username': f'w{writer}', 'name': f's{i}', 'cmdline': 'x ' * 100}
+                                       for pid in range(1, 51)])
+''')
+
+@weave_aspect
+class TestAtomicIO:
+
+    def _check(self, psdiff, num):
+        '''A snapshot must always be complete and written by a single writer.'''
+        rows = list(psdiff._Psdiff__load_saved_snapshot(num))
+        assert len(rows) == 50
+        assert len({(row['username'], row['name']) for row in rows}) == 1
+        return rows[0]['username'], rows[0]['name']
+
+    ###############################################
+    '''
+    Stress test: many writer processes save text, binary and delta snapshots into one directory at the
+    same time while a reader keeps loading them. Every save must get its own number, no file may be seen
+    half written or mixed, and no temp files may be left behind.
+    '''
+    ###############################################
+    def test_concurrent_writers(self, tmp_path):
+        #arrange
+        writers, count = 8, 15
+        reader = Psdiff(tmp_path, '.psdiff', 'ps_test')
+
+        #act
+        procs = [subprocess.Popen([sys.executable, "-c", WRITER, str(SRC), str(tmp_path), str(writer), str(count)],
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE) for writer in range(writers)]
+        reads = 0
+        while any(proc.poll() is None for proc in procs):
+            reader.catalog.refresh()
+            for num in reader.catalog.nums()[-5:]:
+                self._check(reader, num)
+                reads += 1
+        outputs = [proc.communicate() for proc in procs]
+        reader.catalog.refresh()
+        saved = {num: self._check(reader, num) for num in reader.catalog.nums()}
+
+        #assert
+        assert [proc.returncode for proc in procs] == [0] * writers, outputs
+        assert all(b"Error in snapshot file" not in out for out, _ in outputs)
+        assert sorted(saved) == list(range(writers * count))
+        assert sorted(saved.values()) == sorted((f"w{writer}", f"s{i}") for writer in range(writers) for i in range(count))
+        assert list(reader.snapshot_dir.glob("*.tmp")) == []
+        assert reads > 0
+
+    ###############################################
+    '''
+    Tests that an explicit snapshot number is replaced in place and that fsync_every syncs in batches.
+    '''
+    ###############################################
+    def test_replace_and_batched_fsync(self, mocker, tmp_path):
+        #arrange
+        fsync = mocker.spy(os, "fsync")
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', fsync_every=2)
+        rows = [{'pid': 1, 'ppid': 0, 'username': 'root', 'name': 'init', 'cmdline': '/sbin/init'}]
+
+        #act
+        psdiff._Psdiff__save_snapshot(rows)
+        after_one = fsync.call_count
+        psdiff._Psdiff__save_snapshot(rows)
+        after_two = fsync.call_count
+        psdiff._Psdiff__save_snapshot([dict(rows[0], name='systemd')], 0)
+        psdiff.sync.flush()
+
+        #assert
+        assert after_one == 0
+        assert after_two == 4    # ps_test.0, the catalog, ps_test.1 and the directory
+        assert fsync.call_count == 7
+        assert psdiff._Psdiff__load_saved_snapshot(0)[0]['name'] == 'systemd'
+        assert psdiff.catalog.nums() == [0, 1]
@@ -0,0 +1,34 @@
+import pytest
+from benchmarks.run import bench_size, compare
+from benchmarks.synth import generate_series
+from tests.aspect_helper import weave_aspect
+
+@weave_aspect
+class TestBenchmarks:
+
+    ###############################################
+    '''
+    Smoke test of the benchmark suite: synthetic series churn, every stage runs, and compare flags regressions.
+    '''
+    ###############################################
+    def test_synthetic_series(self):
+        #act
+        series = generate_series(1000, 3, churn=0.02, cmdline_len=120)
+
+        #assert
+        assert all(len(ps_list) == 1000 for ps_list in series)
+        assert all([proc['pid'] for proc in ps_list] == sorted(proc['pid'] for proc in ps_list) for ps_list in series)
+        assert len({proc['pid'] for proc in series[0]} - {proc['pid'] for proc in series[1]}) == 20
+        assert min(len(proc['cmdline']) for proc in series[0] if proc['cmdline']) >= 120
+
+    def test_bench_and_compare(self):
+        #act
+        results = bench_size(200, repeat=1)
+        current = {'results': {'200': results}}
+        baseline = {'results': {'200': {stage: seconds / 10 for stage, seconds in results.items()}}}
+
+        #assert
+        assert set(results) == {'capture', 'write_text', 'write_binary', 'read_text', 'read_binary',
+                                'diff', 'render_text', 'render_ndjson'}
+        assert compare(current, current) == []
+        assert len(compare(baseline, current, threshold=0.5)) == len(results)
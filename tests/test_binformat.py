@@ -0,0 +1,109 @@
+import contextlib
+import io
+import pytest
+from psdiff import Psdiff
+from binformat import BinarySnapshot, is_binary_snapshot, write_binary_snapshot
+from tests.aspect_helper import weave_aspect
+
+@weave_aspect
+class TestBinformat:
+
+    proc_rows = [
+        {'pid': 7, 'ppid': 1, 'gid': 0, 'username': 'root', 'name': 'b', 'cmdline': 'more "quotes" \'here\''},
+        {'pid': 3, 'ppid': 1, 'gid': 0, 'username': 'root', 'name': 'a', 'cmdline': ''},
+        {'pid': 9, 'ppid': 7, 'gid': 5, 'username': 'user', 'name': 'ünï', 'cmdline': 'bad \udcff bytes'},
+    ]
+
+    ###############################################
+    '''
+    Tests that the binary format round trips rows (sorted by pid) and supports pid lookup.
+    '''
+    ###############################################
+    def test_round_trip_and_find(self, tmp_path):
+        #arrange
+        path = tmp_path / "ps.0"
+
+        #act
+        write_binary_snapshot(self.proc_rows, path)
+        with BinarySnapshot(path) as snapshot:
+            rows = list(snapshot)
+            found = snapshot.find(7)
+            missing = snapshot.find(4)
+
+        #assert
+        assert is_binary_snapshot(path)
+        assert rows == sorted(self.proc_rows, key=lambda proc: proc['pid'])
+        assert found['pid'] == 7
+        assert missing is None
+
+    ###############################################
+    '''
+    Tests that legacy text snapshots and binary snapshots print the same, and that convert keeps the content.
+    '''
+    ###############################################
+    def test_convert_legacy_snapshot(self, mocker, tmp_path):
+        #arrange
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", return_value=[dict(row) for row in self.proc_rows])
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        psdiff.create_snapshot(1)
+
+        #act
+        text_output = io.StringIO()
+        with contextlib.redirect_stdout(text_output): psdiff.print_snapshot(1)
+        psdiff.convert_snapshot(1, 'binary')
+        binary_output = io.StringIO()
+        with contextlib.redirect_stdout(binary_output): psdiff.print_snapshot(1)
+
+        #assert
+        assert is_binary_snapshot(psdiff.snapshot_dir / 'ps_test.1')
+        assert text_output.getvalue() == binary_output.getvalue()
+        assert psdiff.find_process(1, 9)['username'] == 'user'
+
+    ###############################################
+    '''
+    Tests that text snapshots (plain and with the cmdline store) read back the same escaped strings as
+    binary snapshots, so diffs across formats report no changes.
+    '''
+    ###############################################
+    def test_text_escapes_match_binary(self, tmp_path):
+        #arrange
+        rows = sorted(self.proc_rows + [{'pid': 123, 'ppid': 1, 'gid': 0, 'username': 'root', 'name': 'py\tthon',
+                                         'cmdline': 'python -c "import os\nimport sys" é \\n'}], key=lambda proc: proc['pid'])
+        Psdiff(tmp_path, '.psdiff', 'ps_test')._Psdiff__save_snapshot(rows)
+        Psdiff(tmp_path, '.psdiff', 'ps_test', snapshot_format='binary')._Psdiff__save_snapshot(rows)
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', cmdline_store=True)
+        psdiff._Psdiff__save_snapshot(rows)
+
+        #act
+        loaded = [list(psdiff._Psdiff__load_saved_snapshot(num)) for num in range(3)]
+        diffs = [list(psdiff._Psdiff__get_saved_diff(0, num)) for num in (1, 2)]
+
+        #assert
+        assert loaded == [rows] * 3
+        assert diffs == [[], []]
+
+    ###############################################
+    '''
+    Tests that printing, diffing and looking up binary snapshots close every mmap they open.
+    '''
+    ###############################################
+    def test_snapshots_closed(self, mocker, tmp_path):
+        #arrange
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', snapshot_format='binary')
+        psdiff._Psdiff__save_snapshot(self.proc_rows)
+        psdiff._Psdiff__save_snapshot(self.proc_rows[:2])
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", return_value=self.proc_rows)
+        opened = mocker.spy(BinarySnapshot, '__init__')
+        closed = mocker.spy(BinarySnapshot, 'close')
+
+        #act
+        with contextlib.redirect_stdout(io.StringIO()):
+            psdiff.print_snapshot(0)
+            psdiff.print_diff(0, 1)
+            psdiff.print_diff(1)
+            psdiff.print_diff(0, 1, tree=True)
+        found = psdiff.find_process(1, 7)
+
+        #assert
+        assert found['pid'] == 7
+        assert opened.call_count == 7 and closed.call_count == 7
@@ -0,0 +1,57 @@
+import os
+import pytest
+from capture import ProcfsBackend, PsutilBackend, get_backend
+from tests.aspect_helper import weave_aspect
+from tests.proc_helper import build_proc
+
+@weave_aspect
+class TestCapture:
+
+    ###############################################
+    '''
+    Tests that the procfs backend parses a fake /proc tree and skips entries that vanished mid-scan.
+    '''
+    ###############################################
+    def test_procfs_backend_fake_tree(self, tmp_path):
+        #arrange
+        build_proc(tmp_path, 1, 0, "init", b"/sbin/init\0splash\0")
+        build_proc(tmp_path, 2, 0, "kthreadd", b"")
+        build_proc(tmp_path, 30, 1, "averyverylongna", b"/usr/bin/averyverylongname\0-x\0")
+        build_proc(tmp_path, 40, 1, "chrome", b"chrome --type=renderer\0")
+        (tmp_path / "50").mkdir()       # process exited between scandir and open
+        (tmp_path / "self").mkdir()     # non pid entries are ignored
+
+        #act
+        result = sorted(ProcfsBackend(str(tmp_path)).process_iter(['pid', 'ppid', 'username', 'name', 'cmdline']),
+                        key=lambda info: info['pid'])
+
+        #assert
+        assert [info['pid'] for info in result] == [1, 2, 30, 40]
+        assert result[0] == {'pid': 1, 'ppid': 0, 'username': 'root', 'name': 'init', 'cmdline': ['/sbin/init', 'splash']}
+        assert result[1]['cmdline'] == []
+        assert result[2]['name'] == 'averyverylongname'
+        assert result[3]['cmdline'] == ['chrome', '--type=renderer']
+
+    def test_procfs_backend_reads_only_requested(self, tmp_path):
+        #arrange
+        build_proc(tmp_path, 7, 1, "sh", b"sh\0")
+        (tmp_path / "7" / "cmdline").unlink()
+
+        #act
+        result = list(ProcfsBackend(str(tmp_path)).process_iter(['pid', 'ppid']))
+
+        #assert
+        assert result == [{'pid': 7, 'ppid': 1}]
+
+    @pytest.mark.skipif(not os.path.isdir('/proc/self'), reason="requires linux /proc")
+    def test_procfs_matches_psutil(self):
+        #arrange
+        attrs = ['pid', 'ppid', 'username', 'name', 'cmdline']
+        pid = os.getpid()
+
+        #act
+        procfs = next(info for info in get_backend('procfs').process_iter(attrs) if info['pid'] == pid)
+        psutil_info = next(info for info in PsutilBackend().process_iter(attrs) if info['pid'] == pid)
+
+        #assert
+        assert procfs == psutil_info
@@ -0,0 +1,95 @@
+import pytest
+from psdiff import Psdiff
+from catalog import Catalog
+from tests.aspect_helper import weave_aspect
+
+@weave_aspect
+class TestCatalog:
+
+    proc_rows = [{'pid': 1, 'ppid': 0, 'gid': 0, 'username': 'root', 'name': 'init', 'cmdline': '/sbin/init'},
+                 {'pid': 2, 'ppid': 0, 'gid': 0, 'username': 'root', 'name': 'kthreadd', 'cmdline': ''}]
+
+    ###############################################
+    '''
+    Tests that saving snapshots maintains latest, size and record counts without scanning the directory.
+    '''
+    ###############################################
+    def test_catalog_tracks_snapshots(self, mocker, tmp_path):
+        #arrange
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", return_value=self.proc_rows)
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test')
+
+        #act
+        psdiff.create_snapshot()
+        psdiff.create_snapshot(7)
+        glob = mocker.spy(type(psdiff.snapshot_dir), "glob")
+        psdiff.create_snapshot()
+        reloaded = Catalog(psdiff.snapshot_dir, 'ps_test')
+
+        #assert
+        assert glob.call_count == 0
+        assert psdiff.list_snapshots() == [0, 7, 8]
+        assert reloaded.latest() == 8
+        assert reloaded.get(7)['records'] == 2 and reloaded.get(7)['format'] == 'text'
+        assert reloaded.total_size() == sum(f.stat().st_size for f in psdiff.snapshot_dir.glob('ps_test.*'))
+
+    ###############################################
+    '''
+    Tests that reindex recovers from files removed behind the catalog's back and that existing
+    directories without a catalog are indexed on first use.
+    '''
+    ###############################################
+    def test_reindex(self, mocker, tmp_path):
+        #arrange
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", return_value=self.proc_rows)
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', snapshot_format='binary')
+        for num in range(3): psdiff.create_snapshot(num)
+        (psdiff.snapshot_dir / 'ps_test.2').unlink()
+        psdiff.catalog.path.unlink()
+
+        #act
+        fresh = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        latest = fresh.catalog.latest()
+        (psdiff.snapshot_dir / 'ps_test.1').unlink()
+        count = fresh.reindex()
+
+        #assert
+        assert latest == 1
+        assert count == 1 and fresh.list_snapshots() == [0]
+        assert fresh.catalog.get(0)['format'] == 'binary' and fresh.catalog.get(0)['records'] == 2
+
+    ###############################################
+    '''
+    Tests that latest, total size, saving a new number and reading snapshot N do not replay the catalog,
+    and that the summary agrees with a full replay after other writers appended, rewrote and removed.
+    '''
+    ###############################################
+    def test_summary(self, mocker, tmp_path):
+        #arrange
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", return_value=self.proc_rows)
+        writer = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        for num in range(3): writer.create_snapshot(num)
+        other = Catalog(writer.snapshot_dir, 'ps_test')
+        other.add(5, 10, 1, 'text')
+        fresh = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        replay = mocker.spy(Catalog, "_Catalog__apply")
+
+        #act
+        latest, size = fresh.catalog.latest(), fresh.catalog.total_size()
+        fresh.create_snapshot()
+        printed = list(Psdiff(tmp_path, '.psdiff', 'ps_test')._Psdiff__load_saved_snapshot(1))
+        replays = replay.call_count
+        listed = fresh.list_snapshots()
+        other.add(1, 20, 1, 'text')
+        other.remove(0)
+        summarized = Catalog(writer.snapshot_dir, 'ps_test')
+        totals = (summarized.latest(), summarized.total_size())
+        summarized.refresh()
+        full = Catalog(writer.snapshot_dir, 'ps_test')
+
+        #assert
+        assert replays == 0
+        assert latest == 5 and size == writer.catalog.total_size() + 10
+        assert listed == [0, 1, 2, 5, 6] and printed == self.proc_rows
+        assert totals == (full.latest(), full.total_size()) == (6, sum(full.get(num)['size'] for num in full.nums()))
+        assert summarized.nums() == [1, 2, 5, 6] and summarized.get(1)['size'] == 20
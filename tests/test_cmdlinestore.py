@@ -0,0 +1,140 @@
+import pytest
+from psdiff import Psdiff
+from tests.aspect_helper import weave_aspect
+
+@weave_aspect
+class TestCmdlineStore:
+
+    def _rows(self, pids, tag=''):
+        return [{'pid': pid, 'ppid': 1, 'username': 'root', 'name': 'worker', 'cmdline': f'/usr/bin/worker --id "{pid % 3}"{tag}'}
+                for pid in pids]
+
+    def _stored(self, psdiff):
+        return psdiff.cmdlines.path.read_text().splitlines()
+
+    ###############################################
+    '''
+    Tests that text and delta snapshots saved with the store reference their cmdlines by hash, read back
+    unchanged, store each distinct cmdline once and share one string object per cmdline.
+    '''
+    ###############################################
+    def test_round_trip(self, tmp_path):
+        #arrange
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', keyframe_every=3, cmdline_store=True)
+        first, second = self._rows(range(1, 30)), self._rows(range(5, 40))
+
+        #act
+        psdiff._Psdiff__save_snapshot(first)
+        psdiff._Psdiff__save_snapshot(second)
+        reader = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        loaded = [list(reader._Psdiff__load_saved_snapshot(num)) for num in (0, 1)]
+        entries = list(reader._Psdiff__get_saved_diff(0, 1))
+
+        #assert
+        assert psdiff.catalog.get(1)['format'] == 'delta'
+        assert 'worker --id' not in (psdiff.snapshot_dir / 'ps_test.0').read_text()
+        assert len(self._stored(psdiff)) == 3
+        assert loaded == [first, second]
+        assert loaded[0][6]['cmdline'] is loaded[1][2]['cmdline']
+        assert [entry.kind for entry in entries] == ['-'] * 4 + ['+'] * 10
+        assert reader.catalog.reindex() == 2 and reader.catalog.get(0)['records'] == 29
+
+    ###############################################
+    '''
+    Tests that removing a snapshot drops the cmdlines only it used, keeps delta bases, and that
+    delete_snapshots removes the store.
+    '''
+    ###############################################
+    def test_gc(self, tmp_path):
+        #arrange
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', cmdline_store=True)
+        psdiff._Psdiff__save_snapshot(self._rows(range(1, 10), ' old'))
+        psdiff._Psdiff__save_snapshot(self._rows(range(1, 10)))
+        psdiff._Psdiff__save_snapshot(self._rows(range(1, 5)))
+        before = len(self._stored(psdiff))
+
+        #act
+        psdiff.remove_snapshot(0)
+        after = self._stored(psdiff)
+        psdiff.remove_snapshot(2)
+        kept = list(psdiff._Psdiff__load_saved_snapshot(1))
+        psdiff.delete_snapshots()
+
+        #assert
+        assert before == 6
+        assert len(after) == 3 and not any(' old' in line for line in after)
+        assert kept == self._rows(range(1, 10))
+        assert not psdiff.cmdlines.path.exists()
+
+    def test_keeps_delta_base(self, tmp_path):
+        #arrange
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', keyframe_every=3, cmdline_store=True)
+        psdiff._Psdiff__save_snapshot(self._rows(range(1, 10)))
+        psdiff._Psdiff__save_snapshot(self._rows(range(2, 10)))
+
+        #act
+        with pytest.raises(SystemExit):
+            psdiff.remove_snapshot(0)
+
+        #assert
+        assert psdiff.list_snapshots() == [0, 1]
+        with pytest.raises(ValueError):
+            Psdiff(tmp_path, '.psdiff', 'ps_test', snapshot_format='binary', cmdline_store=True)
+
+    ###############################################
+    '''
+    Tests that a writer reusing cmdlines keeps them in the store when another process's gc drops them
+    before or after the snapshot is published, and that reading a cmdline missing from the store is an error.
+    '''
+    ###############################################
+    @pytest.mark.parametrize('step', ['refresh', 'flush'])
+    def test_concurrent_gc(self, tmp_path, mocker, step):
+        #arrange
+        writer = Psdiff(tmp_path, '.psdiff', 'ps_test', cmdline_store=True)
+        other = Psdiff(tmp_path, '.psdiff', 'ps_test', cmdline_store=True)
+        writer._Psdiff__save_snapshot(self._rows(range(1, 10)))
+        original = getattr(writer.cmdlines, step)
+        def gc_meanwhile():
+            original()
+            if other.catalog.latest() == 0: other.remove_snapshot(0)   # snapshot 1 is not cataloged yet
+        mocker.patch.object(writer.cmdlines, step, side_effect=gc_meanwhile)
+
+        #act
+        writer._Psdiff__save_snapshot(self._rows(range(1, 5)))
+        loaded = list(Psdiff(tmp_path, '.psdiff', 'ps_test')._Psdiff__load_saved_snapshot(1))
+        writer.cmdlines.path.write_text("")
+        reader = Psdiff(tmp_path, '.psdiff', 'ps_test')
+
+        #assert
+        assert reader.list_snapshots() == [1]
+        assert loaded == self._rows(range(1, 5))
+        with pytest.raises(SystemExit, match='cmdline store'):
+            reader._Psdiff__load_saved_snapshot(1)
+
+    ###############################################
+    '''
+    Tests that the history index references stored cmdlines instead of repeating them, that gc keeps
+    the cmdlines only the history references, and that the store and history count toward the size warning.
+    '''
+    ###############################################
+    def test_history_and_size(self, tmp_path, capsys):
+        #arrange
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', cmdline_store=True, max_bytes=0)
+        psdiff._Psdiff__save_snapshot(self._rows(range(1, 10), ' old'))
+        psdiff._Psdiff__save_snapshot(self._rows(range(1, 10)))
+        psdiff._Psdiff__update_history()
+        for num in (0, 1): psdiff.convert_snapshot(num, 'binary')   # only the history references the stored cmdlines
+        psdiff._Psdiff__save_snapshot(self._rows(range(1, 10), ' new'))
+        capsys.readouterr()
+
+        #act
+        history = psdiff.history.path.read_text()
+        psdiff.remove_snapshot(2)
+        lifetimes = Psdiff(tmp_path, '.psdiff', 'ps_test').history.lifetimes(pid=3)
+        psdiff.catalog.total_size = lambda: 0
+        psdiff._Psdiff__maintenance_check()
+
+        #assert
+        assert 'worker --id' not in history and '"ref": "@' in history
+        assert lifetimes == [(3, '/usr/bin/worker --id "0"', [(1, None)]), (3, '/usr/bin/worker --id "0" old', [(0, 0)])]
+        assert 'exceeds' in capsys.readouterr().err
@@ -0,0 +1,118 @@
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+import pytest
+from psdiff import Psdiff
+from catalog import Catalog
+from daemon import PsdiffDaemon, SnapshotCache, request, socket_path
+from tests.aspect_helper import weave_aspect
+
+@weave_aspect
+class TestDaemon:
+
+    def _rows(self, *pids):
+        return [{'pid': pid, 'ppid': 1, 'username': 'root', 'name': f'p{pid}', 'cmdline': f'bin {pid}'} for pid in pids]
+
+    def _start(self, daemon, count):
+        thread = threading.Thread(target=daemon.serve, args=(count,), daemon=True)
+        thread.start()
+        for _ in range(200):
+            if os.path.exists(daemon.path): break
+            time.sleep(0.01)
+        return thread
+
+    ###############################################
+    '''
+    Tests that the daemon answers print, diff and save requests like a direct run, serves repeated reads from
+    its cache, leaves the client pid out of live captures and removes its socket on exit.
+    '''
+    ###############################################
+    def test_print_diff_save(self, mocker, tmp_path):
+        #arrange
+        live = self._rows(1, 2, os.getpid())
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", side_effect=lambda: [dict(proc) for proc in live])
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        psdiff._Psdiff__save_snapshot(self._rows(1, 2, 3))
+        psdiff._Psdiff__save_snapshot(self._rows(1, 4))
+        direct = io.StringIO()
+        with contextlib.redirect_stdout(direct):
+            psdiff.print_snapshot(0)
+            psdiff.print_diff(0, 1)
+        daemon = PsdiffDaemon(Psdiff(tmp_path, '.psdiff', 'ps_test'), interval=0)
+        thread = self._start(daemon, 6)
+
+        #act
+        printed = request(daemon.path, 'print', [0])
+        diffed = request(daemon.path, 'diff', [0, 1])
+        again = request(daemon.path, 'print', [0])
+        saved = request(daemon.path, 'save', [])
+        ndjson = request(daemon.path, 'diff', [1], 'ndjson')
+        missing = request(daemon.path, 'print', [9])
+        thread.join(5)
+
+        #assert
+        assert printed[0] == diffed[0] == saved[0] == 0
+        assert (printed[2] + diffed[2]).decode() == direct.getvalue()
+        assert again == printed
+        assert daemon.cache.hits >= 1
+        assert [proc['pid'] for proc in psdiff.capture()] == [1, 2, os.getpid()]
+        psdiff.catalog.refresh()
+        assert [proc['pid'] for proc in psdiff._Psdiff__load_saved_snapshot(2)] == [1, 2]
+        assert [json.loads(line)['kind'] for line in ndjson[2].decode().splitlines()] == ['added', 'removed']
+        assert missing[0] == 1 and "does not exist" in missing[1]
+        assert not os.path.exists(daemon.path)
+        assert request(daemon.path, 'print', [0]) is None
+
+    ###############################################
+    '''
+    Tests that an error while answering is returned as status 1 with its message, and that a daemon that
+    answers without a status line counts as no daemon.
+    '''
+    ###############################################
+    def test_errors(self, mocker, tmp_path):
+        #arrange
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', snapshot_format='binary')
+        psdiff._Psdiff__save_snapshot(self._rows(1, 2, 3))
+        path = psdiff.snapshot_dir / 'ps_test.0'
+        path.write_bytes(path.read_bytes()[:40])
+        daemon = PsdiffDaemon(Psdiff(tmp_path, '.psdiff', 'ps_test'), interval=0)
+        thread = self._start(daemon, 1)
+
+        #act
+        truncated = request(daemon.path, 'print', [0])
+        thread.join(5)
+        mocker.patch("socket.socket.recv", return_value=b"")
+        mocker.patch("socket.socket.connect")
+        mocker.patch("socket.socket.sendall")
+        open(daemon.path, 'w').close()
+        silent = request(daemon.path, 'print', [0])
+
+        #assert
+        assert truncated[0] == 1 and "psdiff daemon:" in truncated[1]
+        assert silent is None
+
+    ###############################################
+    '''
+    Tests that the cache always keeps the newest snapshots, evicts older ones least recently used first and
+    drops entries whose snapshot was rewritten.
+    '''
+    ###############################################
+    def test_cache_eviction(self, tmp_path):
+        #arrange
+        catalog = Catalog(tmp_path, 'ps')
+        for num in range(6): catalog.add(num, 10, 1, 'text', timestamp=num)
+        cache = SnapshotCache(catalog, capacity=2, recent=2)
+
+        #act
+        for num in (5, 4, 0, 1): cache.put(num, [num])
+        cache.get(0)
+        cache.put(2, [2])
+        kept = sorted(num for num in range(6) if cache.get(num) is not None)
+        catalog.add(4, 20, 1, 'text', timestamp=9)
+
+        #assert
+        assert kept == [0, 2, 4, 5]
+        assert cache.get(4) is None
@@ -0,0 +1,105 @@
+import contextlib
+import io
+import random
+import pytest
+from psdiff import Psdiff
+from diffengine import merge_diff
+from tests.aspect_helper import weave_aspect
+
+def _generate_snapshots(count, seed=1):
+    '''Random walk of process lists with removals, additions and cmdline changes.'''
+    rand = random.Random(seed)
+    procs = {pid: {'pid': pid, 'ppid': 1, 'gid': 0, 'username': 'root', 'name': f'p{pid}', 'cmdline': f'bin {pid}'}
+             for pid in range(1, 40)}
+    snapshots = []
+    for _ in range(count):
+        for pid in rand.sample(sorted(procs), 3): del procs[pid]
+        for _ in range(3):
+            pid = rand.randrange(40, 10000)
+            procs[pid] = {'pid': pid, 'ppid': 1, 'gid': 0, 'username': 'user', 'name': 'new', 'cmdline': f'new "{pid}"'}
+        changed = rand.choice(sorted(procs))
+        procs[changed] = dict(procs[changed], cmdline=procs[changed]['cmdline'] + ' --reload')
+        snapshots.append([dict(procs[pid]) for pid in sorted(procs)])
+    return snapshots
+
+@weave_aspect
+class TestDeltaStore:
+
+    def _create(self, mocker, tmp_path, directory, snapshots, keyframe_every):
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", side_effect=[list(s) for s in snapshots])
+        psdiff = Psdiff(tmp_path, directory, 'ps_test', keyframe_every=keyframe_every)
+        for _ in snapshots: psdiff.create_snapshot()
+        return psdiff
+
+    def _print(self, func, *args):
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream): func(*args)
+        return stream.getvalue()
+
+    ###############################################
+    '''
+    Tests that keyframe + delta storage reconstructs every snapshot and diffs match full merge diffs.
+    '''
+    ###############################################
+    def test_delta_snapshots_reconstruct_and_diff(self, mocker, tmp_path):
+        #arrange
+        snapshots = _generate_snapshots(8)
+        full = self._create(mocker, tmp_path, 'full', snapshots, 0)
+        delta = self._create(mocker, tmp_path, 'delta', snapshots, 3)
+
+        #act
+        formats = [delta.catalog.get(num)['format'] for num in range(8)]
+        records = [delta.catalog.get(num)['records'] for num in range(8)]
+        delta.catalog.reindex()
+
+        #assert
+        assert formats == ['text', 'delta', 'delta', 'text', 'delta', 'delta', 'text', 'delta']
+        assert records == [delta.catalog.get(num)['records'] for num in range(8)] and records[1] == 7
+        assert delta.catalog.total_size() < full.catalog.total_size()
+        for num in range(8):
+            assert self._print(delta.print_snapshot, num) == self._print(full.print_snapshot, num)
+        for num1, num2 in [(1, 2), (2, 1), (0, 2), (4, 5), (2, 7), (0, 0)]:
+            assert self._print(delta.print_diff, num1, num2) == self._print(full.print_diff, num1, num2)
+
+    def test_compact(self, mocker, tmp_path):
+        #arrange
+        snapshots = _generate_snapshots(6, seed=2)
+        psdiff = self._create(mocker, tmp_path, '.psdiff', snapshots, 10)
+        before = [self._print(psdiff.print_snapshot, num) for num in range(6)]
+
+        #act
+        rebased, merged = psdiff.compact()
+
+        #assert
+        assert rebased >= 1 and merged >= 1
+        for num in range(6):
+            entry = psdiff.catalog.get(num)
+            assert entry['format'] == 'text' or psdiff.catalog.get(entry['base'])['format'] == 'text'
+        assert [self._print(psdiff.print_snapshot, num) for num in range(6)] == before
+
+    ###############################################
+    '''
+    Tests that saving to an explicit number writes a keyframe, refuses to overwrite a delta base, and
+    that a delta base cycle in the catalog is reported instead of looping.
+    '''
+    ###############################################
+    def test_explicit_numbers_and_cycles(self, mocker, tmp_path):
+        #arrange
+        snapshots = _generate_snapshots(4, seed=3)
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', keyframe_every=5)
+        for ps_list in snapshots[:3]: psdiff._Psdiff__save_snapshot(ps_list)
+
+        #act
+        with pytest.raises(SystemExit): psdiff._Psdiff__save_snapshot(snapshots[3], 1)
+        with pytest.raises(SystemExit): psdiff._Psdiff__save_snapshot(snapshots[3], 0)
+        psdiff._Psdiff__save_snapshot(snapshots[3], 2)
+        psdiff._Psdiff__save_snapshot(snapshots[3], 7)
+        formats = {num: psdiff.catalog.get(num)['format'] for num in psdiff.list_snapshots()}
+        loaded = [list(psdiff._Psdiff__load_saved_snapshot(num)) for num in (1, 2, 7)]
+        psdiff.catalog.add(1, 0, 0, 'delta', base=2)
+        psdiff.catalog.add(2, 0, 0, 'delta', base=1)
+
+        #assert
+        assert formats == {0: 'text', 1: 'delta', 2: 'text', 7: 'text'}
+        assert loaded == [snapshots[1], snapshots[3], snapshots[3]]
+        with pytest.raises(SystemExit): psdiff.print_snapshot(1)
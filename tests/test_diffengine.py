@@ -0,0 +1,62 @@
+import contextlib
+import io
+import pytest
+from psdiff import Psdiff
+from diffengine import merge_diff, REMOVED, ADDED, CHANGED
+from tests.aspect_helper import weave_aspect
+
+def _row(pid, name='a', cmdline='bin'):
+    return {'pid': pid, 'ppid': 1, 'gid': 0, 'username': 'root', 'name': name, 'cmdline': cmdline}
+
+@weave_aspect
+class TestDiffEngine:
+
+    ###############################################
+    '''
+    Tests that the merge diff classifies removed, added and changed rows with per-field deltas.
+    '''
+    ###############################################
+    def test_merge_diff_classification(self):
+        #arrange
+        old = [_row(1), _row(2, cmdline='cmd 1'), _row(4), _row(6)]
+        new = [_row(1), _row(2, cmdline='cmd 2'), _row(5), _row(6, name='b')]
+
+        #act
+        result = list(merge_diff(iter(old), iter(new)))
+
+        #assert
+        assert [(entry.kind, (entry.new or entry.old)['pid']) for entry in result] == \
+            [(CHANGED, 2), (REMOVED, 4), (ADDED, 5), (CHANGED, 6)]
+        assert result[0].deltas == {'cmdline': ('cmd 1', 'cmd 2')}
+        assert result[3].deltas == {'name': ('a', 'b')}
+
+    def test_merge_diff_is_lazy_and_checks_order(self):
+        #arrange
+        def _generate(pids):
+            for pid in pids: yield _row(pid)
+
+        #act
+        entries = merge_diff(_generate(range(0, 10**9, 2)), _generate(range(1, 10**9, 2)))
+        first = [next(entries) for _ in range(3)]
+
+        #assert
+        assert [entry.kind for entry in first] == [REMOVED, ADDED, REMOVED]
+        with pytest.raises(ValueError):
+            list(merge_diff([_row(2), _row(1)], []))
+
+    def test_print_diff_changed_line(self, mocker, tmp_path):
+        #arrange
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", return_value=[_row(1), _row(2, cmdline='cmd 1')])
+        psdiff.create_snapshot(0)
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", return_value=[_row(1), _row(2, cmdline='cmd 2'), _row(3)])
+
+        #act
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream): psdiff.print_diff(0)
+        lines = stream.getvalue().splitlines()
+
+        #assert
+        assert lines[0].startswith("~") and lines[0].endswith("cmd 2")
+        assert lines[1].strip() == "cmdline: 'cmd 1' -> 'cmd 2'"
+        assert lines[2].startswith("+")
@@ -0,0 +1,87 @@
+import pytest
+from pathlib import Path
+from capture import ProcfsBackend
+from fields import DEFAULT_FIELDS, cost, resolve
+from psdiff import Psdiff
+from binformat import BinarySnapshot
+from tests.aspect_helper import weave_aspect
+from tests.proc_helper import build_proc
+
+@weave_aspect
+class TestFields:
+
+    def _build_proc(self, root: Path, pid):
+        build_proc(root, pid, cmdline=b"worker\0--x\0", gid=7, rss_kb=2048, threads=3, fds=4,
+                   stat=f"{pid} (a b) worker) S 1 1 1 0 -1 0 0 0 0 0 150 50 0 0 20 0 3 0 0\n")
+
+    def _rows(self, extra=None):
+        rows = [{'pid': 1, 'ppid': 0, 'username': 'root', 'name': 'init', 'cmdline': '/sbin/init'},
+                {'pid': 5, 'ppid': 1, 'username': 'www', 'name': 'nginx', 'cmdline': 'nginx: worker'}]
+        return [dict(row, **(extra or {})) for row in rows]
+
+    ###############################################
+    '''
+    Tests field resolution and that each /proc source is costed once however many fields it provides.
+    '''
+    ###############################################
+    def test_resolve_and_cost(self):
+        #act/assert
+        assert resolve() == DEFAULT_FIELDS
+        assert resolve(['fds', 'rss']) == DEFAULT_FIELDS + ['rss', 'fds']
+        assert cost(resolve(['rss', 'threads', 'gid'])) == cost(DEFAULT_FIELDS)
+        assert cost(resolve(['cpu', 'fds'])) > cost(resolve(['cpu']))
+        with pytest.raises(ValueError): resolve(['rss', 'nope'])
+
+    ###############################################
+    '''
+    Tests that procfs reads the extra fields and only opens the sources the requested fields need.
+    '''
+    ###############################################
+    def test_procfs_extra_fields(self, tmp_path):
+        #arrange
+        self._build_proc(tmp_path, 10)
+        self._build_proc(tmp_path, 11)
+        (tmp_path / "11" / "stat").unlink()
+        (tmp_path / "11" / "cmdline").unlink()
+        backend = ProcfsBackend(str(tmp_path))
+        backend._clock_ticks = 100
+
+        #act
+        full = backend.read(10, resolve(['gid', 'rss', 'cpu', 'threads', 'fds']))
+        status_only = backend.read(11, ['pid', 'gid', 'rss', 'threads'])
+
+        #assert
+        assert full == {'pid': 10, 'ppid': 1, 'gid': 7, 'username': 'root', 'name': 'worker', 'cmdline': ['worker', '--x'],
+                        'rss': 2048 * 1024, 'cpu': 2.0, 'threads': 3, 'fds': 4}
+        assert status_only == {'pid': 11, 'gid': 7, 'rss': 2048 * 1024, 'threads': 3}
+
+    ###############################################
+    '''
+    Tests that snapshots record their field set in text, binary and delta files, and that diffs between
+    snapshots with different field sets only compare the fields both have.
+    '''
+    ###############################################
+    @pytest.mark.parametrize('snapshot_format', ['text', 'binary'])
+    def test_field_sets_round_trip_and_diff(self, mocker, tmp_path, snapshot_format):
+        #arrange
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', snapshot_format=snapshot_format, keyframe_every=5)
+        save = psdiff._Psdiff__save_snapshot
+        save(self._rows())
+        save(self._rows({'gid': 3, 'rss': 100, 'cpu': 1.5}))
+        save(self._rows({'gid': 3, 'rss': 200, 'cpu': 1.5}))
+
+        #act
+        loaded = [list(psdiff._Psdiff__load_saved_snapshot(num)) for num in (0, 1, 2)]
+        mixed = list(psdiff._Psdiff__get_saved_diff(0, 1))
+        deltas = [entry.deltas for entry in psdiff._Psdiff__get_saved_diff(1, 2)]
+        psdiff.catalog.reindex()
+
+        #assert
+        assert loaded[0] == self._rows()
+        assert loaded[1] == self._rows({'gid': 3, 'rss': 100, 'cpu': 1.5})
+        assert loaded[2] == self._rows({'gid': 3, 'rss': 200, 'cpu': 1.5})
+        assert mixed == []
+        assert deltas == [{'rss': (100, 200)}, {'rss': (100, 200)}]
+        assert [psdiff.catalog.get(num)['format'] for num in (0, 1, 2)] == [snapshot_format, snapshot_format, 'delta']
+        assert psdiff.catalog.get(2)['fields'] == ['pid', 'ppid', 'gid', 'username', 'name', 'cmdline', 'rss', 'cpu']
+        assert 'fields' not in psdiff.catalog.get(0)
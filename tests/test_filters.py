@@ -0,0 +1,72 @@
+import os
+import pytest
+from capture import ProcfsBackend
+from filters import ProcessFilter
+from tests.aspect_helper import weave_aspect
+from tests.proc_helper import build_proc
+
+@weave_aspect
+class TestFilters:
+
+    def _proc(self, pid, ppid, username, name, cmdline=''):
+        return {'pid': pid, 'ppid': ppid, 'gid': 0, 'username': username, 'name': name, 'cmdline': cmdline}
+
+    ###############################################
+    '''
+    Tests that the default rules drop root kworker threads and psdiff itself, like the old hardcoded filter.
+    '''
+    ###############################################
+    def test_default_rules(self):
+        #arrange
+        ps_list = [self._proc(1, 0, 'root', 'init', '/sbin/init'), self._proc(5, 2, 'root', 'kworker/0:1'),
+                   self._proc(6, 2, 'alice', 'kworker/0:2'), self._proc(os.getpid(), 1, 'root', 'python3')]
+
+        #act
+        result = ProcessFilter().filter(ps_list)
+
+        #assert
+        assert [proc['pid'] for proc in result] == [1, 6]
+
+    def test_include_exclude_subtree_and_cmdline(self):
+        #arrange
+        config = {'include': [{'user': ['www-data', 'root']}],
+                  'exclude': [{'subtree': 10}, {'kernel_thread': True}, {'cmdline_regex': r'--type=renderer'}]}
+        ps_list = [self._proc(1, 0, 'root', 'init', '/sbin/init'), self._proc(2, 0, 'root', 'kthreadd'),
+                   self._proc(3, 2, 'root', 'kworker/0:0'), self._proc(10, 1, 'root', 'nginx', 'nginx: master'),
+                   self._proc(11, 10, 'www-data', 'nginx', 'nginx: worker'), self._proc(12, 11, 'www-data', 'sh', 'sh -c x'),
+                   self._proc(20, 1, 'www-data', 'chrome', 'chrome --type=renderer'), self._proc(21, 1, 'bob', 'bash', '-bash'),
+                   self._proc(22, 1, 'www-data', 'gunicorn', 'gunicorn app')]
+
+        #act
+        result = ProcessFilter(config).filter(ps_list)
+
+        #assert
+        assert [proc['pid'] for proc in result] == [1, 22]
+
+    def test_unknown_condition(self):
+        #act/assert
+        with pytest.raises(ValueError): ProcessFilter({'exclude': [{'nmae': 'sshd'}]})
+
+    ###############################################
+    '''
+    Tests that procfs capture applies the filter before reading cmdlines: excluded processes with unreadable
+    cmdline files are never opened, while cmdline rules still see the full cmdline.
+    '''
+    ###############################################
+    def test_procfs_filters_before_cmdline(self, tmp_path):
+        #arrange
+        build_proc(tmp_path, 1, 0, "init", b"/sbin/init\0")
+        build_proc(tmp_path, 2, 0, "kthreadd", b"")
+        build_proc(tmp_path, 3, 2, "kworker/0:1", b"")
+        build_proc(tmp_path, 4, 1, "chrome", b"chrome\0--type=renderer\0")
+        build_proc(tmp_path, 5, 4, "chrome", b"chrome\0--type=gpu\0")
+        for pid in (2, 3):
+            (tmp_path / str(pid) / "cmdline").unlink()
+            (tmp_path / str(pid) / "cmdline").mkdir()   # opening it would raise IsADirectoryError
+        config = {'exclude': [{'kernel_thread': True}, {'cmdline_regex': 'renderer'}]}
+
+        #act
+        result = list(ProcfsBackend(str(tmp_path)).process_iter(['pid', 'cmdline'], ProcessFilter(config)))
+
+        #assert
+        assert sorted(info['pid'] for info in result) == [1, 5]
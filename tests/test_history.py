@@ -0,0 +1,96 @@
+import contextlib
+import io
+import pytest
+from psdiff import Psdiff
+from tests.aspect_helper import weave_aspect
+
+def _row(pid, cmdline):
+    return {'pid': pid, 'ppid': 1, 'gid': 0, 'username': 'root', 'name': 'p', 'cmdline': cmdline}
+
+@weave_aspect
+class TestHistory:
+
+    snapshots = [
+        [_row(1, 'init'), _row(10, 'nginx master')],
+        [_row(1, 'init'), _row(10, 'nginx master'), _row(20, 'worker')],
+        [_row(1, 'init'), _row(10, 'nginx master -s reload')],
+        [_row(1, 'init'), _row(10, 'nginx master -s reload'), _row(20, 'worker'), _row(30, 'cron')],
+    ]
+
+    def _create(self, mocker, tmp_path):
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", side_effect=[list(s) for s in self.snapshots])
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', keyframe_every=2)
+        for _ in self.snapshots: psdiff.create_snapshot()
+        return psdiff
+
+    ###############################################
+    '''
+    Tests lifetime, range and churn queries, and that queries do not reload indexed snapshots.
+    '''
+    ###############################################
+    def test_history_queries(self, mocker, tmp_path):
+        #arrange
+        psdiff = self._create(mocker, tmp_path)
+
+        #act
+        psdiff.print_churn()
+        churn = psdiff.history.churn()
+        load = mocker.spy(psdiff, "_Psdiff__load_saved_snapshot")
+        lifetimes = psdiff.history.lifetimes(text='nginx')
+        workers = psdiff.history.lifetimes(pid=20)
+        changes = psdiff.history.changes(0, 3)
+        reverse = psdiff.history.changes(3, 0)
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream): psdiff.print_range(1, 2)
+
+        #assert
+        assert churn == [(0, 2, 0), (1, 1, 0), (2, 1, 2), (3, 2, 0)]
+        assert lifetimes == [(10, 'nginx master', [(0, 1)]), (10, 'nginx master -s reload', [(2, None)])]
+        assert workers == [(20, 'worker', [(1, 1), (3, None)])]
+        assert changes == [('-', 10, 'nginx master', 2), ('+', 10, 'nginx master -s reload', 2),
+                           ('+', 20, 'worker', 3), ('+', 30, 'cron', 3)]
+        assert [change[0] for change in reverse] == ['+', '-', '-', '-']
+        assert stream.getvalue().splitlines()[0].split() == ['-', '10', '2', 'nginx', 'master']
+        assert load.call_count == 0
+
+    def test_history_persisted_incrementally(self, mocker, tmp_path):
+        #arrange
+        psdiff = self._create(mocker, tmp_path)
+        psdiff.print_churn()
+        reopened = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", return_value=[_row(1, 'init')])
+        reopened.create_snapshot()
+        diff = mocker.spy(reopened, "_Psdiff__get_saved_diff")
+
+        #act
+        reopened.print_churn()
+        churn = reopened.history.churn(4)
+
+        #assert
+        assert churn == [(4, 0, 3)]
+        assert [call.args for call in diff.call_args_list] == [(3, 4)]
+
+    ###############################################
+    '''
+    Tests that a snapshot saved with an explicit number below the last indexed one, or over an indexed
+    one, is reflected by the next query.
+    '''
+    ###############################################
+    def test_history_explicit_numbers(self, tmp_path):
+        #arrange
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        psdiff._Psdiff__save_snapshot([_row(1, 'init')], 0)
+        psdiff._Psdiff__save_snapshot([_row(1, 'init'), _row(5, 'cron')], 5)
+        psdiff._Psdiff__update_history()
+
+        #act
+        psdiff._Psdiff__save_snapshot([_row(1, 'init'), _row(9, 'sshd')], 3)
+        psdiff._Psdiff__update_history()
+        lower = psdiff.history.lifetimes(pid=9)
+        psdiff._Psdiff__save_snapshot([_row(1, 'init'), _row(7, 'atd')], 5)
+        psdiff._Psdiff__update_history()
+
+        #assert
+        assert lower == [(9, 'sshd', [(3, 3)])]
+        assert psdiff.history.churn() == [(0, 1, 0), (3, 1, 0), (5, 1, 1)]
+        assert psdiff.history.lifetimes(pid=5) == [] and psdiff.history.lifetimes(pid=7) == [(7, 'atd', [(5, None)])]
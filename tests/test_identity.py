@@ -0,0 +1,92 @@
+import json
+import pytest
+from psdiff import Psdiff
+from diffengine import merge_diff, REMOVED, ADDED
+from identity import IdentityMatcher, RESTARTED
+from tests.aspect_helper import weave_aspect
+
+@weave_aspect
+class TestIdentity:
+
+    def _proc(self, pid, name, cmdline, username='www', ppid=1):
+        return {'pid': pid, 'ppid': ppid, 'username': username, 'name': name, 'cmdline': cmdline}
+
+    def _snapshots(self):
+        old = [self._proc(100, 'redis', 'redis-server --port 6379'), self._proc(101, 'app', 'app --sock /tmp/app-x1'),
+               self._proc(102, 'app', 'app --sock /tmp/app-x2'), self._proc(103, 'cron', 'cron -f'),
+               self._proc(104, 'sshd', 'sshd -D', username='root')]
+        new = [self._proc(200, 'redis', 'redis-server --port 6380'), self._proc(201, 'app', 'app --sock /tmp/app-y1'),
+               self._proc(202, 'sshd', 'sshd -D', username='nobody'), self._proc(203, 'cron', 'cron -f', ppid=7)]
+        return old, new
+
+    ###############################################
+    '''
+    Tests that removals and additions with the same identity are paired (first removal first), that the
+    default rules ignore temp paths and ports, and that processes with another user stay unmatched.
+    '''
+    ###############################################
+    def test_match(self):
+        #arrange
+        old, new = self._snapshots()
+
+        #act
+        entries = IdentityMatcher().match(merge_diff(old, new))
+        strict = IdentityMatcher({'normalize': []}).match(merge_diff(old, new))
+
+        #assert
+        assert [(entry.kind, (entry.old or {}).get('pid'), (entry.new or {}).get('pid')) for entry in entries] == \
+               [(REMOVED, 102, None), (REMOVED, 104, None),
+                (RESTARTED, 100, 200), (RESTARTED, 101, 201), (ADDED, None, 202), (RESTARTED, 103, 203)]
+        assert entries[-1].deltas == {'pid': (103, 203), 'ppid': (1, 7)}
+        assert [entry.kind for entry in strict].count(RESTARTED) == 1
+        assert [IdentityMatcher().normalize(cmdline) for cmdline in ('sshd -p2222', 'sshd -p 2222', 'app --port=1', 'cp -pr a1 b')] == \
+               ['sshd -p*', 'sshd -p *', 'app --port=*', 'cp -pr a1 b']
+        with pytest.raises(ValueError): IdentityMatcher({'normalize': [{'pattern': '('}]})
+        with pytest.raises(ValueError): IdentityMatcher({'rules': []})
+
+    ###############################################
+    '''
+    Tests the restarted output of print_diff and that rules are read from <snapshot_dir>/identity.json.
+    '''
+    ###############################################
+    def test_print_restarts(self, tmp_path, capsys):
+        #arrange
+        old, new = self._snapshots()
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        psdiff._Psdiff__save_snapshot(old)
+        psdiff._Psdiff__save_snapshot(new)
+        (psdiff.snapshot_dir / "identity.json").write_text(json.dumps({'normalize': [{'pattern': r'\d+', 'replace': 'N'}]}))
+
+        #act
+        psdiff.print_diff(0, 1, restarts=True)
+        text = capsys.readouterr().out
+        psdiff.output_format = 'ndjson'
+        psdiff.print_diff(0, 1, restarts=True)
+        kinds = [json.loads(line)['kind'] for line in capsys.readouterr().out.splitlines() if line.startswith('{')]
+
+        #assert
+        assert "restarted (100 -> 200)" in text
+        assert "cmdline: 'redis-server --port 6379' -> 'redis-server --port 6380'" in text
+        assert " pid: " not in text
+        assert kinds == ['removed', 'removed', 'removed', 'restarted', 'added', 'added', 'restarted']   # /tmp rule replaced
+
+    ###############################################
+    '''
+    Tests that matching scales linearly when every process restarted under the same identity: each entry
+    is normalized once, however many candidates share its identity.
+    '''
+    ###############################################
+    def test_linear_scaling(self, mocker):
+        #arrange
+        n = 5000
+        old = [self._proc(pid, 'worker', 'worker') for pid in range(n)]
+        new = [self._proc(pid, 'worker', 'worker') for pid in range(n, 2 * n)]
+        entries = list(merge_diff(old, new))
+        normalize = mocker.spy(IdentityMatcher, 'normalize')
+
+        #act
+        matched = IdentityMatcher().match(entries)
+
+        #assert
+        assert len(matched) == n and all(entry.kind == RESTARTED for entry in matched)
+        assert normalize.call_count == 2 * n
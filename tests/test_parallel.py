@@ -0,0 +1,37 @@
+import contextlib
+import io
+import pytest
+from psdiff import Psdiff
+from tests.test_deltastore import _generate_snapshots
+from tests.aspect_helper import weave_aspect
+
+@weave_aspect
+class TestParallel:
+
+    ###############################################
+    '''
+    Tests that the process pool loads and diffs snapshots in snapshot order with the same results
+    as the sequential path.
+    '''
+    ###############################################
+    def test_load_many_and_diff_series(self, mocker, tmp_path):
+        #arrange
+        snapshots = _generate_snapshots(7, seed=3)
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", side_effect=[list(s) for s in snapshots])
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', keyframe_every=3)
+        for _ in snapshots: psdiff.create_snapshot()
+        nums = [6, 0, 3, 5, 1]
+
+        #act
+        loaded = psdiff.load_many(nums, workers=3, chunksize=2)
+        series = list(psdiff.diff_series(range(7), workers=2))
+        sequential = list(psdiff.diff_series(range(7), workers=1))
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream): psdiff.print_series(2, 4, workers=2)
+
+        #assert
+        assert loaded == [snapshots[num] for num in nums]
+        assert [pair for pair, _ in series] == [(n, n + 1) for n in range(6)]
+        assert series == sequential
+        assert all(entries for _, entries in series)
+        assert [line for line in stream.getvalue().splitlines() if line.startswith("===")] == ["=== 2 -> 3 ===", "=== 3 -> 4 ==="]
@@ -1,4 +1,5 @@
 import contextlib
+import json
 import inspect
 import io
 import re
@@ -180,3 +181,89 @@ class TestPsDiff:
         assert (output1 == output2), f"Results from calling live ps:\n{output1} differ from results of saved ps:\n{output2}."
         pass
 
+
+    ########################################
+    '''
+    TEST:
+    Tests that watch() only reads processes that appeared and emits the removed/added deltas of each tick.
+    '''
+    ###########################################
+    def test_watch_incremental(self, mocker, tmp_path):
+        #arrange
+        rows = {pid: {'pid': pid, 'ppid': 1, 'username': 'root', 'name': f'p{pid}', 'cmdline': ['bin', str(pid)]}
+                for pid in (1, 2, 3)}
+        backend = mocker.MagicMock()
+        backend.process_iter.side_effect = lambda attrs: [dict(rows[pid]) for pid in (1, 2)]
+        backend.pids.side_effect = [[1, 2], [1, 3], [1, 3]]
+        backend.read.side_effect = lambda pid, attrs: dict(rows[pid])
+        mocker.patch("time.sleep")
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', backend=backend)
+
+        #act
+        ticks = list(psdiff.watch(0.1, count=3, persist_every=3))
+
+        #assert
+        assert [[(entry.kind, (entry.old or entry.new)['pid']) for entry in tick] for tick in ticks] == \
+            [[], [('-', 2), ('+', 3)], []]
+        assert backend.process_iter.call_count == 1
+        assert [call.args[0] for call in backend.read.call_args_list] == [3, 3]    # filter fields, then the rest
+        assert (psdiff.snapshot_dir / 'ps_test.0').exists()
+
+    ########################################
+    '''
+    TEST:
+    Tests that watch() reads a process the filter excludes once, not again on every tick.
+    '''
+    ###########################################
+    def test_watch_skips_filtered(self, mocker, tmp_path):
+        #arrange
+        rows = {pid: {'pid': pid, 'ppid': 2, 'username': 'root', 'name': f'kworker/{pid}', 'cmdline': []} for pid in range(10, 20)}
+        rows[1] = {'pid': 1, 'ppid': 0, 'username': 'root', 'name': 'init', 'cmdline': ['init']}
+        rows[5] = {'pid': 5, 'ppid': 1, 'username': 'root', 'name': 'agent', 'cmdline': ['agent', '--secret']}
+        backend = mocker.MagicMock()
+        backend.process_iter.side_effect = lambda attrs: [dict(rows[1])]
+        backend.pids.side_effect = [list(rows)] * 4 + [[1, 5, 10]]
+        backend.read.side_effect = lambda pid, attrs: dict(rows[pid])
+        mocker.patch("time.sleep")
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', backend=backend,
+                        filter_config={'exclude': [{'name': 'kworker/*'}, {'cmdline_regex': '--secret'}]})
+
+        #act
+        ticks = list(psdiff.watch(0.1, count=5, full_every=0))
+
+        #assert
+        reads = [call.args[0] for call in backend.read.call_args_list]
+        assert all(tick == [] for tick in ticks)
+        assert sorted(reads) == [5, 5] + list(range(10, 20))    # kworkers rejected before their cmdline is read
+        assert all(call.args[1] == ('pid', 'ppid', 'username', 'name') for call in backend.read.call_args_list if call.args[0] >= 10)
+
+    ########################################
+    '''
+    TEST:
+    Tests the ndjson and tsv output formats and that output is written in chunks, not per line.
+    '''
+    ###########################################
+    def test_output_formats_and_chunked_writes(self, mocker, tmp_path):
+        #arrange
+        rows = [{'pid': pid, 'ppid': 1, 'gid': 0, 'username': 'root', 'name': 'w', 'cmdline': f"run\t{pid}"} for pid in range(1, 3001)]
+        changed = [dict(row, name='x') if row['pid'] == 2 else row for row in rows[1:]] + [dict(rows[0], pid=5000)]
+        mocker.patch.object(Psdiff, "_Psdiff__get_ps", side_effect=[rows, changed, changed])
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', snapshot_format='binary', output_format='ndjson')
+        psdiff.create_snapshot(0)
+
+        #act
+        stream = io.StringIO()
+        write = mocker.spy(stream, "write")
+        with contextlib.redirect_stdout(stream): psdiff.print_diff(0)
+        ndjson = [json.loads(line) for line in stream.getvalue().splitlines()]
+        psdiff.output_format = 'tsv'
+        tsv = io.StringIO()
+        with contextlib.redirect_stdout(tsv): psdiff.print_snapshot()
+
+        #assert
+        assert [(entry['kind'], (entry['new'] or entry['old'])['pid']) for entry in ndjson] == \
+            [('removed', 1), ('changed', 2), ('added', 5000)]
+        assert ndjson[1]['deltas'] == {'name': ['w', 'x']}
+        lines = tsv.getvalue().splitlines()
+        assert len(lines) == 3000 and lines[0].split("\t") == ['2', '1', '0', 'root', 'x', 'run\\t2']
+        assert write.call_count < 5
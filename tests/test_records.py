@@ -0,0 +1,79 @@
+import pickle
+import sys
+import pytest
+from psdiff import Psdiff
+from filters import ProcessFilter
+from records import Process, record_type
+from tests.aspect_helper import weave_aspect
+
+@weave_aspect
+class TestRecords:
+
+    def _row(self, pid=1, **extra):
+        return dict({'pid': pid, 'ppid': 0, 'username': 'root', 'name': 'init', 'cmdline': '/sbin/init'}, **extra)
+
+    ###############################################
+    '''
+    Tests that a record reads, compares and copies like the dict it replaces, pickles, and takes less
+    memory than that dict.
+    '''
+    ###############################################
+    def test_mapping_view(self):
+        #arrange
+        row = self._row(rss=4096)
+        record = record_type(row)(*row.values())
+
+        #act
+        record['cmdline'] = '/sbin/init splash'
+        row['cmdline'] = '/sbin/init splash'
+
+        #assert
+        assert isinstance(record, Process)
+        assert record == row and row == record and [row] == [record]
+        assert record['rss'] == 4096 and record.get('gid', 0) == 0 and 'gid' not in record and 'rss' in record
+        assert list(record) == list(row) and dict(record) == record.as_dict() == row
+        assert pickle.loads(pickle.dumps(record)) == record
+        assert record != self._row(rss=4096)
+        with pytest.raises(KeyError): record['gid']
+        with pytest.raises(KeyError): record['gid'] = 5
+        assert sys.getsizeof(record) < sys.getsizeof(row) / 2
+
+    ###############################################
+    '''
+    Tests that loaded text and binary snapshots are made of records sharing one interned username/name
+    string per distinct value.
+    '''
+    ###############################################
+    @pytest.mark.parametrize('snapshot_format', ['text', 'binary'])
+    def test_loaded_snapshots_are_interned_records(self, tmp_path, snapshot_format):
+        #arrange
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', snapshot_format=snapshot_format)
+        psdiff._Psdiff__save_snapshot([self._row(pid, name='nginx', cmdline=f'nginx {pid}') for pid in range(1, 20)])
+
+        #act
+        loaded = list(psdiff._Psdiff__load_saved_snapshot(0))
+
+        #assert
+        assert all(isinstance(proc, Process) for proc in loaded)
+        assert len({id(proc['username']) for proc in loaded}) == 1
+        assert len({id(proc['name']) for proc in loaded}) == 1
+        assert loaded[4] == self._row(5, name='nginx', cmdline='nginx 5')
+
+    ###############################################
+    '''
+    Tests that the capture filter reads records by attribute, not through the per-field Mapping lookup.
+    '''
+    ###############################################
+    def test_filter_reads_attributes(self, mocker):
+        #arrange
+        rows = [self._row(pid, name='kworker/0' if pid % 2 else 'nginx') for pid in range(1, 11)]
+        records = [record_type(row)(*row.values()) for row in rows]
+        getitem = mocker.spy(Process, '__getitem__')
+
+        #act
+        kept = ProcessFilter({'exclude': [{'name': 'kworker/*'}]}).filter(records)
+        reads = getitem.call_count
+
+        #assert
+        assert reads == 0
+        assert kept == [row for row in rows if row['name'] == 'nginx']
@@ -0,0 +1,68 @@
+import os
+import shutil
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+from tests.aspect_helper import weave_aspect
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# Modules that file-only operations (-p N, -c N M) must never import.
+FORBIDDEN = ('psutil', 'capture', 'multiprocessing', 'concurrent.futures', 'logging')
+# Cumulative import time budget for the psdiff module, in microseconds: the fastest of a few runs of a
+# fresh copy of src with its bytecode cached by a warm-up run. That import takes about 4-5ms; the eager
+# imports it replaced took 6-8ms cached and about 45ms uncompiled.
+PSDIFF_IMPORT_BUDGET_US = 15000
+RUNS = 3
+
+def _importtime(args, cwd, src=SRC):
+    '''Run cmdline.py under -X importtime and return {module: cumulative us}.'''
+    env = {key: value for key, value in os.environ.items() if key != 'PYTHONDONTWRITEBYTECODE'}
+    result = subprocess.run([sys.executable, "-X", "importtime", str(src / "cmdline.py"), *args],
+                            cwd=cwd, capture_output=True, text=True, env=env)
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line: continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        imports[module.strip()] = int(cumulative)
+    return imports
+
+def _fresh_src(tmp_path):
+    '''A copy of src without bytecode or snapshots, so every run starts from the same state.'''
+    src = tmp_path / "src"
+    shutil.copytree(SRC, src, ignore=shutil.ignore_patterns("__pycache__", ".psdiff"))
+    return src
+
+@weave_aspect
+class TestStartup:
+
+    ###############################################
+    '''
+    Tests that file-only operations import no capture or pool modules, stay within the import budget
+    and do not create the snapshot directory.
+    '''
+    ###############################################
+    @pytest.mark.parametrize('args', [["-p", "5"], ["-c", "5", "6"]])
+    def test_file_only_startup(self, tmp_path, args):
+        #arrange
+        src = _fresh_src(tmp_path)
+        _importtime(args, tmp_path, src)   # warm-up: writes the bytecode
+
+        #act
+        runs = [_importtime(args, tmp_path, src) for _ in range(RUNS)]
+        imports = runs[0]
+        fastest = min(run['psdiff'] for run in runs)
+
+        #assert
+        assert 'psdiff' in imports
+        assert [module for module in FORBIDDEN if module in imports] == []
+        assert fastest < PSDIFF_IMPORT_BUDGET_US, f"psdiff import took {fastest}us"
+        assert not (src / ".psdiff").exists()
+
+    def test_help_does_not_import_psdiff(self, tmp_path):
+        #act
+        imports = _importtime(["--help"], tmp_path)
+
+        #assert
+        assert 'psdiff' not in imports
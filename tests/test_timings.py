@@ -0,0 +1,47 @@
+import io
+import pytest
+from psdiff import Psdiff
+from timings import Timings
+from tests.aspect_helper import weave_aspect
+
+@weave_aspect
+class TestTimings:
+
+    proc_rows = [{'pid': 1, 'ppid': 0, 'gid': 0, 'username': 'root', 'name': 'init', 'cmdline': '/sbin/init'},
+                 {'pid': 2, 'ppid': 0, 'gid': 0, 'username': 'root', 'name': 'kworker/0:1', 'cmdline': ''}]
+
+    ###############################################
+    '''
+    Tests that hooks receive every stage of create_snapshot with record counts, and that the report lists them.
+    '''
+    ###############################################
+    def test_stage_hooks_and_report(self, mocker, tmp_path):
+        #arrange
+        backend = mocker.MagicMock()   # a backend without filters_capture, so psdiff filters after capture
+        backend.process_iter.side_effect = lambda attrs: [dict(row, cmdline=row['cmdline'].split()) for row in self.proc_rows]
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test', backend=backend)
+        received = []
+        psdiff.timings.add_hook(received.append)
+
+        #act
+        psdiff.create_snapshot()
+        report = io.StringIO()
+        psdiff.timings.report(report)
+
+        #assert
+        assert [record['stage'] for record in received] == ['maintenance', 'capture', 'filter', 'sort', 'write']
+        assert [record['records'] for record in received] == [None, 2, 1, None, 1]
+        assert all(record['wall'] >= 0 and record['cpu'] >= 0 for record in received)
+        assert report.getvalue().splitlines()[2].split()[0] == 'capture'
+
+    def test_disabled_stage_is_shared_noop(self):
+        #arrange
+        timings = Timings()
+
+        #act
+        with timings.stage('a') as first: first.records = 10
+        with timings.stage('b') as second: pass
+
+        #assert
+        assert first is second and first.records is None
+        assert timings.records == []
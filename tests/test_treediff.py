@@ -0,0 +1,118 @@
+import json
+import pytest
+from psdiff import Psdiff
+from diffengine import merge_diff
+from treediff import children_index, subtree_anchors, tree_diff, summarize
+from tests.aspect_helper import weave_aspect
+
+@weave_aspect
+class TestTreeDiff:
+
+    def _proc(self, pid, ppid, name, cmdline=None):
+        return {'pid': pid, 'ppid': ppid, 'username': 'www', 'name': name, 'cmdline': cmdline or name}
+
+    def _snapshots(self):
+        '''An nginx master that replaced 3 of its workers (one with a helper child), and an unrelated change under init.'''
+        common = [self._proc(1, 0, 'init'), self._proc(100, 1, 'nginx'), self._proc(200, 1, 'sshd')]
+        old = common + [self._proc(101, 100, 'nginx'), self._proc(102, 100, 'nginx'), self._proc(103, 100, 'nginx'),
+                        self._proc(104, 101, 'helper'), self._proc(300, 1, 'cron')]
+        new = [dict(proc) for proc in common] + [self._proc(110, 100, 'nginx'), self._proc(111, 100, 'nginx'),
+                                                 self._proc(112, 100, 'nginx'), self._proc(113, 100, 'nginx')]
+        new[2]['cmdline'] = 'sshd -D'
+        return sorted(old, key=lambda proc: proc['pid']), sorted(new, key=lambda proc: proc['pid'])
+
+    ###############################################
+    '''
+    Tests that new and gone processes are attached to their nearest ancestor present in both snapshots,
+    even through intermediate processes that are gone themselves.
+    '''
+    ###############################################
+    def test_anchors(self):
+        #arrange
+        old, new = self._snapshots()
+        old_procs = {proc['pid']: proc for proc in old}
+
+        #act
+        children = children_index(old_procs)
+        anchors = subtree_anchors(old_procs, old_procs.keys() & {proc['pid'] for proc in new})
+
+        #assert
+        assert sorted(children[100]) == [101, 102, 103]
+        assert children[0] == [1]
+        assert anchors == {101: 100, 102: 100, 103: 100, 104: 100, 300: 1}
+
+    ###############################################
+    '''
+    Tests that churn is grouped per (anchor, name) and summarized as replaced/added/removed/changed counts.
+    '''
+    ###############################################
+    def test_tree_diff_summaries(self):
+        #arrange
+        old, new = self._snapshots()
+
+        #act
+        changes = tree_diff(merge_diff(old, new), {proc['pid']: proc for proc in old}, {proc['pid']: proc for proc in new})
+        lines = [summarize(change) for change in changes]
+
+        #assert
+        assert lines == ["init[1]: 1 cron removed", "init[1]: 1 sshd changed",
+                         "nginx[100]: 1 helper removed", "nginx[100]: 3 workers replaced, 1 added"]
+        assert [proc.old['pid'] for proc in changes[3].removed] == [101, 102, 103]
+
+    ###############################################
+    '''
+    Tests the --tree output of print_diff in text (with and without details) and ndjson.
+    '''
+    ###############################################
+    def test_print_tree(self, tmp_path, capsys):
+        #arrange
+        old, new = self._snapshots()
+        psdiff = Psdiff(tmp_path, '.psdiff', 'ps_test')
+        psdiff._Psdiff__save_snapshot(old)
+        psdiff._Psdiff__save_snapshot(new)
+
+        #act
+        psdiff.print_diff(0, 1, tree=True)
+        summary = capsys.readouterr().out
+        psdiff.print_diff(0, 1, tree=True, details=True)
+        details = capsys.readouterr().out
+        psdiff.output_format = 'ndjson'
+        psdiff.print_diff(0, 1, tree=True)
+        records = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{')]
+
+        #assert
+        assert "nginx[100]: 3 workers replaced, 1 added" in summary
+        assert "    -" not in summary
+        assert [line for line in details.splitlines() if line.startswith("    +")][0].split()[:3] == ['+', '110', '100']
+        assert records[-1] == {'anchor': {'pid': 100, 'name': 'nginx'}, 'name': 'nginx', 'replaced': 3,
+                               'added': 1, 'removed': 0, 'changed': 0}
+
+    ###############################################
+    '''
+    Tests that building the index and grouping scale linearly: for a deep chain of gone processes and a wide
+    fan of replaced workers, the number of process field reads grows with the process count, not faster.
+    '''
+    ###############################################
+    def test_linear_scaling(self):
+        reads = [0]
+        class _CountingProc(dict):
+            def __getitem__(self, key):
+                reads[0] += 1
+                return dict.__getitem__(self, key)
+
+        def _run(n):
+            old = [self._proc(1, 0, 'init')] + [self._proc(pid, pid - 1, 'chain') for pid in range(2, n)]
+            new = [self._proc(1, 0, 'init')] + [self._proc(pid, 1, 'worker') for pid in range(n, 2 * n)]
+            old, new = [_CountingProc(proc) for proc in old], [_CountingProc(proc) for proc in new]
+            entries = list(merge_diff(old, new))
+            reads[0] = 0
+            changes = tree_diff(entries, {proc['pid']: proc for proc in old}, {proc['pid']: proc for proc in new})
+            return reads[0], changes
+
+        #act
+        small, _ = _run(1000)
+        large, changes = _run(10000)
+
+        #assert
+        assert [summarize(change) for change in changes] == ["init[1]: 9998 chain removed", "init[1]: 10000 worker added"]
+        assert large <= small * 10 + 100